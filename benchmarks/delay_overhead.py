@@ -0,0 +1,81 @@
+"""
+measures the per-call overhead of `wiji.task.Task.delay` and `wiji.task.Task.delay_many`.
+
+The broker used here does no work, so the numbers are wiji's own cost of
+type-checking, building and serializing a task and notifying hooks.
+
+usage:
+    python -m benchmarks.delay_overhead
+    python -m benchmarks.delay_overhead --calls 100000
+"""
+import time
+import asyncio
+import logging
+import argparse
+
+import wiji
+
+
+class NullBroker(wiji.broker.BaseBroker):
+    async def check(self, queue_name: str) -> None:
+        pass
+
+    async def enqueue(self, queue_name: str, item: str) -> None:
+        pass
+
+    async def enqueue_many(self, queue_name, items, etas=None) -> None:
+        pass
+
+    async def dequeue(self, queue_name: str) -> str:
+        raise NotImplementedError("the benchmark does not dequeue.")
+
+    async def done(self, queue_name: str, item: str, state: wiji.task.TaskState) -> None:
+        pass
+
+    async def shutdown(self, queue_name: str, duration: float) -> None:
+        pass
+
+
+class AdderTask(wiji.task.Task):
+    the_broker = NullBroker()
+    queue_name = "BenchmarkAdderTaskQueue"
+    loglevel = "ERROR"
+
+    async def run(self, a, b, *, c=0):
+        return a + b + c
+
+
+async def bench_delay(task: wiji.task.Task, calls: int) -> float:
+    start = time.perf_counter()
+    for i in range(calls):
+        await task.delay(i, 2, c=3)
+    return time.perf_counter() - start
+
+
+async def bench_delay_many(task: wiji.task.Task, calls: int) -> float:
+    start = time.perf_counter()
+    await task.delay_many(((i, 2), {"c": 3}) for i in range(calls))
+    return time.perf_counter() - start
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="benchmark the per-call overhead of delay.")
+    parser.add_argument("--calls", type=int, default=20_000, help="number of tasks to queue.")
+    args = parser.parse_args()
+    logging.disable(logging.CRITICAL)
+
+    task = AdderTask()
+    loop = asyncio.get_event_loop()
+    loop.run_until_complete(bench_delay(task, 100))  # warm up
+
+    for name, bench in [("delay", bench_delay), ("delay_many", bench_delay_many)]:
+        duration = loop.run_until_complete(bench(task, args.calls))
+        print(
+            "{0:<12} calls: {1:>8}  total: {2:>8.3f}s  per call: {3:>8.2f}us".format(
+                name, args.calls, duration, duration / args.calls * 1_000_000
+            )
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+"""
+compares the serializers in `wiji.serializer` on encode time, decode time and encoded size.
+
+The payloads are the `[args, kwargs]` of representative tasks; use the numbers
+to pick a serializer per task class.
+
+usage:
+    python -m benchmarks.serializers
+    python -m benchmarks.serializers --rounds 2000
+"""
+
+import time
+import random
+import argparse
+
+import wiji
+
+
+def payloads():
+    rand = random.Random(7)
+    return {
+        "small": [[33, 14], {}],
+        "numbers": [[[rand.random() for _ in range(10_000)]], {}],
+        "nested": [
+            [],
+            {
+                "users": [
+                    {
+                        "id": i,
+                        "name": "user-{0}".format(i),
+                        "tags": ["a", "b", "c"],
+                        "scores": {"x": i * 1.5, "y": None, "active": i % 2 == 0},
+                    }
+                    for i in range(500)
+                ]
+            },
+        ],
+    }
+
+
+def bench(the_serializer: wiji.serializer.BaseSerializer, payload, rounds: int):
+    start = time.perf_counter()
+    for _ in range(rounds):
+        data = the_serializer.dumps(payload)
+    encode = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for _ in range(rounds):
+        the_serializer.loads(data)
+    decode = time.perf_counter() - start
+    return encode / rounds, decode / rounds, len(data)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="benchmark the serializers.")
+    parser.add_argument("--rounds", type=int, default=200, help="encodes/decodes per payload.")
+    args = parser.parse_args()
+
+    serializers = [
+        wiji.serializer.JsonSerializer(),
+        wiji.serializer.PickleSerializer(),
+        wiji.serializer.MarshalSerializer(),
+    ]
+    for payload_name, payload in payloads().items():
+        for the_serializer in serializers:
+            encode, decode, size = bench(the_serializer, payload, args.rounds)
+            print(
+                "{0:<8} {1:<8} encode: {2:>10.2f}us  decode: {3:>10.2f}us  size: {4:>9} bytes".format(
+                    payload_name, the_serializer.name, encode * 1_000_000, decode * 1_000_000, size
+                )
+            )
+
+
+if __name__ == "__main__":
+    main()
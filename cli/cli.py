@@ -6,6 +6,7 @@ import random
 import asyncio
 import logging
 import argparse
+import functools
 
 import wiji
 from cli import utils
@@ -38,6 +39,31 @@ def make_parser() -> argparse.ArgumentParser:
         help="The dotted path to a python file conatining a `wiji.app.App` instance. \
         eg: --app dotted.path.to.a.wiji.app.App.class.instance",
     )
+    parser.add_argument(
+        "--concurrency",
+        type=int,
+        required=False,
+        default=1,
+        help="""The maximum number of tasks that each worker should execute concurrently.
+        eg: --concurrency 8""",
+    )
+    parser.add_argument(
+        "--processes",
+        type=int,
+        required=False,
+        default=1,
+        help="""The number of worker processes to run. Each process runs all the app's tasks in its own eventloop.
+        When greater than 1, wiji-cli forks that many supervised child processes after loading the app.
+        eg: --processes 4""",
+    )
+    parser.add_argument(
+        "--cpu-affinity",
+        action="store_true",
+        required=False,
+        default=False,
+        help="""Whether to pin each worker process to a cpu. Only used together with --processes
+        eg: --cpu-affinity""",
+    )
     parser.add_argument(
         "--dry-run",
         action="store_true",
@@ -64,6 +90,9 @@ def main():
 
         app = args.app
         dry_run = args.dry_run
+        concurrency = args.concurrency
+        processes = args.processes
+        cpu_affinity = args.cpu_affinity
         if dry_run:
             logger.log(
                 logging.WARNING,
@@ -81,6 +110,12 @@ def main():
             )
             logger.log(logging.ERROR, {"event": "wiji.cli.main", "stage": "end", "error": str(err)})
             sys.exit(77)
+        if processes < 1:
+            err = ValueError(
+                """`processes` should not be less than 1 You entered: {0}""".format(processes)
+            )
+            logger.log(logging.ERROR, {"event": "wiji.cli.main", "stage": "end", "error": str(err)})
+            sys.exit(77)
 
         if dry_run:
             logger.log(
@@ -91,7 +126,30 @@ def main():
         asyncio_debug = False
         if os.environ.get("WIJI_DEBUG", None):
             asyncio_debug = True
-        asyncio.run(async_main(logger=logger, app_instance=app_instance), debug=asyncio_debug)
+        if processes > 1:
+            # each worker may take upto 1.5 times its task's drain_duration to shutdown.
+            drain_duration = max(
+                [wiji.task.WatchDogTask.drain_duration]
+                + [task_class.drain_duration for task_class in app_instance.task_classes]
+            )
+            utils.prefork.supervise(
+                logger=logger,
+                processes=processes,
+                target=functools.partial(
+                    _run_child,
+                    logger=logger,
+                    app_instance=app_instance,
+                    concurrency=concurrency,
+                    asyncio_debug=asyncio_debug,
+                ),
+                drain_duration=(drain_duration * 1.5) + 5.0,
+                cpu_affinity=cpu_affinity,
+            )
+        else:
+            asyncio.run(
+                async_main(logger=logger, app_instance=app_instance, concurrency=concurrency),
+                debug=asyncio_debug,
+            )
     except Exception as e:
         logger.log(logging.ERROR, {"event": "wiji.cli.main", "stage": "end", "error": str(e)})
         sys.exit(77)
@@ -99,7 +157,30 @@ def main():
         logger.log(logging.INFO, {"event": "wiji.cli.main", "stage": "end"})
 
 
-async def async_main(logger: wiji.logger.BaseLogger, app_instance: wiji.app.App) -> None:
+def _run_child(
+    process_index: int,
+    logger: wiji.logger.BaseLogger,
+    app_instance: wiji.app.App,
+    concurrency: int,
+    asyncio_debug: bool,
+) -> None:
+    """
+    runs inside each child process forked by `wiji-cli --processes N`
+    """
+    logger.log(
+        logging.INFO,
+        {"event": "wiji.cli._run_child", "stage": "start", "process_index": process_index},
+    )
+    # every child gets its own eventloop.
+    asyncio.run(
+        async_main(logger=logger, app_instance=app_instance, concurrency=concurrency),
+        debug=asyncio_debug,
+    )
+
+
+async def async_main(
+    logger: wiji.logger.BaseLogger, app_instance: wiji.app.App, concurrency: int = 1
+) -> None:
     """
     (i)   set signal handlers.
     (ii)  consume tasks.
@@ -127,7 +208,7 @@ async def async_main(logger: wiji.logger.BaseLogger, app_instance: wiji.app.App)
         _queue_names.append(task_class.queue_name)
 
         task = task_class()
-        _worker = wiji.Worker(the_task=task)
+        _worker = wiji.Worker(the_task=task, concurrency=concurrency)
         workers.append(_worker)
 
     del _queue_names
@@ -135,10 +216,22 @@ async def async_main(logger: wiji.logger.BaseLogger, app_instance: wiji.app.App)
     for i in workers:
         consumers.append(i.consume_tasks())
 
-    gather_tasks = asyncio.gather(
-        *consumers, *watch_dog_producer, utils.sig._signal_handling(logger=logger, workers=workers)
-    )
-    await gather_tasks
+    gather_tasks = asyncio.gather(*consumers, *watch_dog_producer)
+    await utils.sig._signal_handling(logger=logger, workers=workers)
+
+    # run until the workers have been told to shutdown and have finished draining.
+    while not all(worker.SUCCESFULLY_SHUT_DOWN for worker in workers):
+        if gather_tasks.done():
+            # the consumers and producers run forever, they can only be done if one of them errored.
+            gather_tasks.result()
+        await asyncio.sleep(0.1)
+
+    # a consumer may still be waiting on its broker for an item it will never execute; stop it.
+    gather_tasks.cancel()
+    try:
+        await gather_tasks
+    except asyncio.CancelledError:
+        pass
 
 
 if __name__ == "__main__":
@@ -1,3 +1,4 @@
 from . import sig  # noqa: F401
 from . import load  # noqa: F401
+from . import prefork  # noqa: F401
 from . import _producer  # noqa: F401
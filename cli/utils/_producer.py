@@ -11,5 +11,10 @@ async def produce_tasks_continously(task: wiji.task.Task, watchdog_duration: flo
     hence the sleep duration chosen in this func.
     """
     while True:
-        await task.delay()
+        the_broker = task.the_broker
+        if isinstance(the_broker, wiji.broker.InMemoryBroker) and the_broker._full(task.queue_name):
+            # the watchdog worker has fallen behind; skip this `WatchDogTask` rather than wait for space in the queue.
+            pass
+        else:
+            await task.delay()
         await asyncio.sleep(watchdog_duration / 20.00)
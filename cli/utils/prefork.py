@@ -0,0 +1,202 @@
+import os
+import time
+import signal
+import typing
+import logging
+
+import wiji
+
+# signals that the parent forwards to its children so that they can drain as one.
+_TERMINATION_SIGNALS = [signal.SIGHUP, signal.SIGQUIT, signal.SIGTERM]
+
+
+def _pin_to_cpu(index: int) -> typing.Union[None, int]:
+    """
+    pin the calling process to one cpu, chosen round-robin using `index`.
+    returns the cpu that the process was pinned to or None if this OS does not support cpu affinity.
+    """
+    if not hasattr(os, "sched_setaffinity"):
+        return None
+    available_cpus = sorted(os.sched_getaffinity(0))
+    cpu = available_cpus[index % len(available_cpus)]
+    os.sched_setaffinity(0, {cpu})
+    return cpu
+
+
+def _unblock_termination_signals() -> None:
+    """
+    deliver any termination signal that a child received, and held back, while it was starting up.
+    A child should call this once it has installed its own signal handlers.
+    """
+    signal.pthread_sigmask(signal.SIG_UNBLOCK, _TERMINATION_SIGNALS)
+
+
+def _spawn(
+    logger: wiji.logger.BaseLogger,
+    index: int,
+    target: typing.Callable[[int], None],
+    cpu_affinity: bool,
+) -> int:
+    """
+    fork a child process that calls `target(index)` and then exits.
+    returns the pid of the child(in the parent).
+    """
+    # the termination signals are blocked across the fork. The child keeps them blocked until its eventloop has
+    # installed its own handlers, so that a signal received in between is held back rather than lost or fatal.
+    previous_mask = signal.pthread_sigmask(signal.SIG_BLOCK, _TERMINATION_SIGNALS)
+    pid = os.fork()
+    if pid != 0:
+        signal.pthread_sigmask(signal.SIG_SETMASK, previous_mask)
+        return pid
+
+    # in child.
+    exit_code = 0
+    try:
+        # the parent's handlers only make sense in the parent;
+        # the child's eventloop installs its own signal handlers and then unblocks the signals.
+        # see: `_unblock_termination_signals`
+        for _signal in _TERMINATION_SIGNALS:
+            signal.signal(_signal, signal.SIG_DFL)
+        cpu = None
+        if cpu_affinity:
+            cpu = _pin_to_cpu(index)
+        logger.log(
+            logging.INFO,
+            {
+                "event": "wiji.cli.prefork",
+                "stage": "start",
+                "state": "child process started",
+                "process_index": index,
+                "process_id": os.getpid(),
+                "cpu": cpu,
+            },
+        )
+        target(index)
+    except BaseException as e:
+        exit_code = 77
+        logger.log(
+            logging.ERROR,
+            {
+                "event": "wiji.cli.prefork",
+                "stage": "end",
+                "state": "child process error",
+                "process_index": index,
+                "error": str(e),
+            },
+        )
+    finally:
+        # never return into the parent's code.
+        os._exit(exit_code)
+
+
+def supervise(
+    logger: wiji.logger.BaseLogger,
+    processes: int,
+    target: typing.Callable[[int], None],
+    drain_duration: float,
+    cpu_affinity: bool = False,
+    restart_delay: float = 1.0,
+) -> None:
+    """
+    forks `processes` child processes that each call `target(process_index)` and supervises them.
+      - a child that exits while the parent is not shutting down is restarted.
+      - a termination signal(SIGTERM, SIGQUIT, SIGHUP) received by the parent is forwarded to every child
+        so that all of them drain at the same time. Children that are still running `drain_duration` seconds
+        later are killed.
+    This function returns once all children have exited after a termination signal.
+
+    Parameters:
+        logger: the logger to use.
+        processes: the number of child processes to run.
+        target: the callable that runs inside each child. It is passed the index of the child.
+        drain_duration: the duration in seconds that children are given to drain after a termination signal.
+        cpu_affinity: whether to pin each child to a cpu.
+        restart_delay: the duration in seconds to wait before restarting a child that crashed soon after starting.
+    """
+    children: typing.Dict[int, typing.Tuple[int, float]] = {}  # pid -> (index, start_time)
+    shutdown: typing.Dict[str, typing.Any] = {"signal": None, "deadline": None}
+
+    def _handle_termination_signal(_signal: int, frame: typing.Any) -> None:
+        if shutdown["signal"] is None:
+            shutdown["signal"] = _signal
+            shutdown["deadline"] = time.monotonic() + drain_duration
+        for pid in list(children):
+            try:
+                os.kill(pid, _signal)
+            except ProcessLookupError:
+                pass
+
+    previous_handlers = {}
+    for _signal in _TERMINATION_SIGNALS:
+        previous_handlers[_signal] = signal.signal(_signal, _handle_termination_signal)
+
+    try:
+        for index in range(processes):
+            pid = _spawn(logger=logger, index=index, target=target, cpu_affinity=cpu_affinity)
+            children[pid] = (index, time.monotonic())
+
+        while children:
+            pid, status = os.waitpid(-1, os.WNOHANG)
+            if pid == 0:
+                if shutdown["deadline"] is not None and time.monotonic() > shutdown["deadline"]:
+                    logger.log(
+                        logging.WARNING,
+                        {
+                            "event": "wiji.cli.prefork",
+                            "stage": "end",
+                            "state": "children did not drain in time. killing them",
+                            "process_ids": list(children),
+                        },
+                    )
+                    for child_pid in list(children):
+                        try:
+                            os.kill(child_pid, signal.SIGKILL)
+                        except ProcessLookupError:
+                            pass
+                    shutdown["deadline"] = None
+                time.sleep(0.1)
+                continue
+
+            if pid not in children:
+                continue
+            index, start_time = children.pop(pid)
+            exit_code = os.WEXITSTATUS(status) if os.WIFEXITED(status) else -os.WTERMSIG(status)
+            if shutdown["signal"] is not None:
+                logger.log(
+                    logging.INFO,
+                    {
+                        "event": "wiji.cli.prefork",
+                        "stage": "end",
+                        "state": "child process shutdown",
+                        "process_index": index,
+                        "process_id": pid,
+                        "exit_code": exit_code,
+                    },
+                )
+                continue
+
+            logger.log(
+                logging.ERROR,
+                {
+                    "event": "wiji.cli.prefork",
+                    "stage": "end",
+                    "state": "child process exited unexpectedly. restarting it",
+                    "process_index": index,
+                    "process_id": pid,
+                    "exit_code": exit_code,
+                },
+            )
+            if time.monotonic() - start_time < restart_delay:
+                # do not spin if the child crashes as soon as it starts.
+                time.sleep(restart_delay)
+            if shutdown["signal"] is None:
+                pid = _spawn(logger=logger, index=index, target=target, cpu_affinity=cpu_affinity)
+                children[pid] = (index, time.monotonic())
+    finally:
+        for _signal, handler in previous_handlers.items():
+            signal.signal(_signal, handler)
+
+    logger.log(
+        logging.INFO,
+        {"event": "wiji.cli.prefork", "stage": "end", "state": "all child processes have shutdown"},
+    )
@@ -5,6 +5,8 @@ import functools
 
 import wiji
 
+from . import prefork
+
 
 async def _signal_handling(logger: wiji.logger.BaseLogger, workers: list) -> None:
     try:
@@ -21,6 +23,8 @@ async def _signal_handling(logger: wiji.logger.BaseLogger, workers: list) -> Non
                     _handle_termination_signal(logger=logger, _signal=_signal, workers=workers),
                 ),
             )
+        # in a child process of `wiji-cli --processes N`, signals received while starting up are delivered now.
+        prefork._unblock_termination_signals()
     except ValueError as e:
         logger.log(
             logging.DEBUG,
@@ -37,6 +37,19 @@ class BlockinHttpTask(BaseTask):
         print("resp: ", resp)
 
 
+class ThreadedHttpTask(BaseTask):
+    queue_name = "ThreadedHttpTaskQueue"
+    # blocks a thread in the pool, rather than the event loop.
+    execution_mode = "thread"
+    thread_pool_name = "http"
+    thread_pool_size = 8
+
+    def run(self, *args, **kwargs):
+        url = kwargs["url"]
+        resp = requests.get(url)
+        print("resp: ", resp)
+
+
 class AsyncHttpTask(BaseTask):
     queue_name = "AsyncHttpTaskQueue"
 
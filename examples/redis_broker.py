@@ -1,4 +1,5 @@
 import os
+import typing
 import asyncio
 import functools
 import concurrent
@@ -35,8 +36,9 @@ class ExampleRedisBroker(wiji.broker.BaseBroker):
             port = os.environ["REDIS_PORT"]
             password = os.environ.get("REDIS_PASSWORD", None)
         port = int(port)
+        self.socket_timeout = 8.0
         self.redis_instance = redis.StrictRedis(
-            host=host, port=port, password=password, db=0, socket_timeout=8.0
+            host=host, port=port, password=password, db=0, socket_timeout=self.socket_timeout
         )
 
     async def check(self, queue_name: str) -> None:
@@ -59,26 +61,51 @@ class ExampleRedisBroker(wiji.broker.BaseBroker):
     def _blocking_enqueue(self, queue_name, item):
         self.redis_instance.lpush(queue_name, item)
 
+    async def enqueue_many(self, queue_name: str, items: typing.List[str], etas=None) -> None:
+        try:
+            self.loop = asyncio.get_running_loop()
+        except RuntimeError:
+            self.loop = asyncio.get_event_loop()
+
+        with concurrent.futures.ThreadPoolExecutor(
+            thread_name_prefix="wiji-redis-thread-pool"
+        ) as executor:
+            await self.loop.run_in_executor(
+                executor,
+                functools.partial(self._blocking_enqueue_many, queue_name=queue_name, items=items),
+            )
+
+    def _blocking_enqueue_many(self, queue_name, items):
+        # LPUSH takes many values and pushes them, in order, in one round trip.
+        self.redis_instance.lpush(queue_name, *items)
+
     async def dequeue(self, queue_name: str) -> str:
+        while True:
+            item = await self.poll(queue_name=queue_name, timeout=self.socket_timeout - 1)
+            if item:
+                return item
+
+    async def poll(self, queue_name: str, timeout: float) -> typing.Optional[str]:
         try:
             self.loop = asyncio.get_running_loop()
         except RuntimeError:
             self.loop = asyncio.get_event_loop()
 
+        # BRPOP only takes whole seconds and a timeout of 0 means block forever.
+        # It also has to return before the socket times out.
+        brpop_timeout = int(min(max(timeout, 1), self.socket_timeout - 1))
         with concurrent.futures.ThreadPoolExecutor(
             thread_name_prefix="wiji-redis-thread-pool"
         ) as executor:
-            while True:
-                item = await self.loop.run_in_executor(
-                    executor, functools.partial(self._blocking_dequeue, queue_name=queue_name)
-                )
-                if item:
-                    return item
-                else:
-                    await asyncio.sleep(1 / 117)
-
-    def _blocking_dequeue(self, queue_name: str):
-        dequed_item = self.redis_instance.brpop(queue_name, timeout=3)
+            return await self.loop.run_in_executor(
+                executor,
+                functools.partial(
+                    self._blocking_dequeue, queue_name=queue_name, timeout=brpop_timeout
+                ),
+            )
+
+    def _blocking_dequeue(self, queue_name: str, timeout: int):
+        dequed_item = self.redis_instance.brpop(queue_name, timeout=timeout)
         if not dequed_item:
             return None
         dequed_item = dequed_item[1]
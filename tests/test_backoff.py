@@ -0,0 +1,86 @@
+from unittest import TestCase
+
+import wiji
+
+
+class TestBackoff(TestCase):
+    """
+    run tests as:
+        python -m unittest discover -v -s .
+    run one testcase as:
+        python -m unittest -v tests.test_backoff.TestBackoff.test_something
+    """
+
+    def setUp(self):
+        self.backoff = wiji.backoff.SimpleBackoff(
+            initial_idle_delay=0.01,
+            max_idle_delay=0.08,
+            initial_error_delay=0.5,
+            max_error_delay=4.0,
+        )
+
+    def test_bad_args(self):
+        with self.assertRaises(ValueError) as raised_exception:
+            wiji.backoff.SimpleBackoff(initial_idle_delay=1)
+        self.assertIn(
+            "`initial_idle_delay` should be of type:: `float`", str(raised_exception.exception)
+        )
+
+        with self.assertRaises(ValueError) as raised_exception:
+            wiji.backoff.SimpleBackoff(initial_error_delay=-1.0)
+        self.assertIn(
+            "`initial_error_delay` should not be less than 0", str(raised_exception.exception)
+        )
+
+        with self.assertRaises(ValueError) as raised_exception:
+            wiji.backoff.SimpleBackoff(initial_idle_delay=2.0, max_idle_delay=1.0)
+        self.assertIn(
+            "`max_idle_delay` should not be less than `initial_idle_delay`",
+            str(raised_exception.exception),
+        )
+
+        with self.assertRaises(ValueError) as raised_exception:
+            wiji.backoff.SimpleBackoff(multiplier=0.5)
+        self.assertIn("`multiplier` should not be less than 1.0", str(raised_exception.exception))
+
+    def test_idle_backoff_grows_upto_max(self):
+        delays = [self.backoff.idle(waited=0.0) for _ in range(6)]
+        self.assertEqual(delays, [0.01, 0.02, 0.04, 0.08, 0.08, 0.08])
+        self.assertEqual(self.backoff.metrics()["consecutive_empty_polls"], 6)
+        self.assertEqual(self.backoff.metrics()["empty_polls"], 6)
+        self.assertAlmostEqual(self.backoff.metrics()["idle_sleep"], 0.31)
+
+    def test_idle_backoff_accounts_for_time_waited(self):
+        # a broker that long-polled for longer than the delay is not slowed down further.
+        self.assertEqual(self.backoff.idle(waited=1.0), 0.0)
+        self.assertAlmostEqual(self.backoff.idle(waited=0.005), 0.015)
+
+    def test_success_resets(self):
+        for _ in range(5):
+            self.backoff.idle(waited=0.0)
+            self.backoff.error(Exception("broker down"))
+        self.backoff.success()
+        self.assertEqual(self.backoff.idle(waited=0.0), 0.01)
+        self.assertTrue(self.backoff.error(Exception("broker down")) <= 0.5)
+
+        metrics = self.backoff.metrics()
+        self.assertEqual(metrics["successes"], 1)
+        self.assertEqual(metrics["consecutive_empty_polls"], 1)
+        self.assertEqual(metrics["consecutive_errors"], 1)
+
+    def test_error_backoff(self):
+        first = self.backoff.error(Exception("broker down"))
+        # the first step is sub-second.
+        self.assertTrue(0.25 <= first <= 0.5)
+        for _ in range(10):
+            delay = self.backoff.error(Exception("broker down"))
+        self.assertTrue(2.0 <= delay <= 4.0)
+        self.assertEqual(self.backoff.metrics()["errors"], 11)
+        self.assertEqual(self.backoff.metrics()["consecutive_errors"], 11)
+
+    def test_empty_poll_resets_error_backoff(self):
+        for _ in range(5):
+            self.backoff.error(Exception("broker down"))
+        self.backoff.idle(waited=0.0)
+        self.assertEqual(self.backoff.metrics()["error_delay"], 0.5)
+        self.assertEqual(self.backoff.metrics()["consecutive_errors"], 0)
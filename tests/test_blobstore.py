@@ -0,0 +1,110 @@
+# do not to pollute the global namespace.
+# see: https://python-packaging.readthedocs.io/en/latest/testing.html
+import os
+import time
+import asyncio
+import tempfile
+from unittest import TestCase, mock
+
+import wiji
+
+
+class TestFileSystemBlobStore(TestCase):
+    """
+    run tests as:
+        python -m unittest discover -v -s .
+    run one testcase as:
+        python -m unittest -v tests.test_blobstore.TestFileSystemBlobStore.test_something
+    """
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.blob_store = wiji.blobstore.FileSystemBlobStore(directory=self.directory.name)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    @staticmethod
+    def _run(coro):
+        loop = asyncio.get_event_loop()
+        return loop.run_until_complete(coro)
+
+    def test_put_get(self):
+        key = self._run(self.blob_store.put(b"some large body"))
+        self.assertEqual(bytes(self._run(self.blob_store.get(key))), b"some large body")
+
+        with self.assertRaises(KeyError):
+            self._run(self.blob_store.get("0" * 64))
+
+    def test_empty_blob(self):
+        key = self._run(self.blob_store.put(b""))
+        self.assertEqual(bytes(self._run(self.blob_store.get(key))), b"")
+
+    def test_bad_key(self):
+        outside = os.path.join(self.directory.name, "outside")
+        with open(outside, "wb") as f:
+            f.write(b"secret")
+        store = wiji.blobstore.FileSystemBlobStore(
+            directory=os.path.join(self.directory.name, "blobs")
+        )
+        for key in [
+            "non-existent-key",
+            "../outside",
+            outside,
+            "A" * 64,
+            "0" * 63,
+            "0" * 63 + "/",
+            "0" * 65,
+        ]:
+            with self.assertRaises(ValueError) as raised_exception:
+                self._run(store.get(key))
+            self.assertIn("`key` should be a hex sha256", str(raised_exception.exception))
+
+    def test_deduplication(self):
+        key_one = self._run(self.blob_store.put(b"same body"))
+        key_two = self._run(self.blob_store.put(b"same body"))
+        key_three = self._run(self.blob_store.put(b"other body"))
+        self.assertEqual(key_one, key_two)
+        self.assertNotEqual(key_one, key_three)
+        self.assertEqual(len(os.listdir(self.directory.name)), 2)
+        self.assertEqual(self.blob_store.metrics()["puts"], 3)
+        self.assertEqual(self.blob_store.metrics()["deduplicated"], 1)
+
+    def test_put_while_collected(self):
+        """
+        a blob that `collect` removes just as an identical blob is put, is written again.
+        """
+        key = self._run(self.blob_store.put(b"same body"))
+        path = os.path.join(self.directory.name, key)
+        utime = os.utime
+
+        def collect_then_utime(*args, **kwargs):
+            os.remove(path)
+            return utime(*args, **kwargs)
+
+        with mock.patch("wiji.blobstore.os.utime", side_effect=collect_then_utime):
+            self.assertEqual(self._run(self.blob_store.put(b"same body")), key)
+        self.assertEqual(bytes(self._run(self.blob_store.get(key))), b"same body")
+        self.assertEqual(self.blob_store.metrics()["deduplicated"], 0)
+
+    def test_garbage_collection(self):
+        blob_store = wiji.blobstore.FileSystemBlobStore(directory=self.directory.name, ttl=60.0)
+        old_key = self._run(blob_store.put(b"old body"))
+        new_key = self._run(blob_store.put(b"new body"))
+        an_hour_ago = time.time() - 3600
+        os.utime(os.path.join(self.directory.name, old_key), (an_hour_ago, an_hour_ago))
+
+        self.assertEqual(self._run(blob_store.collect()), 1)
+        with self.assertRaises(KeyError):
+            self._run(blob_store.get(old_key))
+        self.assertEqual(bytes(self._run(blob_store.get(new_key))), b"new body")
+        self.assertEqual(blob_store.metrics()["collected"], 1)
+
+    def test_bad_args(self):
+        with self.assertRaises(ValueError) as raised_exception:
+            wiji.blobstore.FileSystemBlobStore(directory=self.directory.name, threshold=1.5)
+        self.assertIn("`threshold` should be of type:: `int`", str(raised_exception.exception))
+
+        with self.assertRaises(ValueError) as raised_exception:
+            wiji.blobstore.FileSystemBlobStore(directory=self.directory.name, ttl=-1.0)
+        self.assertIn("`ttl` should not be less than 0", str(raised_exception.exception))
@@ -0,0 +1,269 @@
+# do not to pollute the global namespace.
+# see: https://python-packaging.readthedocs.io/en/latest/testing.html
+
+import time
+import uuid
+import asyncio
+from unittest import TestCase
+
+import wiji
+
+
+class TestInMemoryBroker(TestCase):
+    """
+    run tests as:
+        python -m unittest discover -v -s .
+    run one testcase as:
+        python -m unittest -v tests.test_broker.TestInMemoryBroker.test_something
+    """
+
+    def setUp(self):
+        self.broker = wiji.broker.InMemoryBroker()
+        self.queue_name = "{0}-TestInMemoryBroker".format(uuid.uuid4())
+        self._run(self.broker.check(queue_name=self.queue_name))
+
+    def tearDown(self):
+        pass
+
+    @staticmethod
+    def _run(coro):
+        """
+        helper function that runs any coroutine in an event loop and passes its return value back to the caller.
+        https://blog.miguelgrinberg.com/post/unit-testing-asyncio-code
+        """
+        loop = asyncio.get_event_loop()
+        return loop.run_until_complete(coro)
+
+    def test_dequeue_many(self):
+        for i in range(5):
+            self._run(self.broker.enqueue(queue_name=self.queue_name, item="item{0}".format(i)))
+
+        items = self._run(
+            self.broker.dequeue_many(queue_name=self.queue_name, max_items=3, timeout=1.0)
+        )
+        self.assertEqual(items, ["item0", "item1", "item2"])
+        items = self._run(
+            self.broker.dequeue_many(queue_name=self.queue_name, max_items=3, timeout=1.0)
+        )
+        self.assertEqual(items, ["item3", "item4"])
+        self.assertEqual(self.broker._llen(self.queue_name), 0)
+
+    def test_dequeue_many_timeout(self):
+        start = time.monotonic()
+        items = self._run(
+            self.broker.dequeue_many(queue_name=self.queue_name, max_items=3, timeout=0.3)
+        )
+        self.assertEqual(items, [])
+        self.assertTrue(time.monotonic() - start < 1.0)
+
+    def test_delayed_delivery(self):
+        now = time.time()
+        self._run(self.broker.enqueue(queue_name=self.queue_name, item="later", eta=now + 0.4))
+        self._run(self.broker.enqueue(queue_name=self.queue_name, item="soon", eta=now + 0.2))
+        self._run(self.broker.enqueue(queue_name=self.queue_name, item="now", eta=None))
+        self.assertEqual(self.broker._llen(self.queue_name), 3)
+
+        self.assertEqual(self._run(self.broker.dequeue(queue_name=self.queue_name)), "now")
+        items = self._run(
+            self.broker.dequeue_many(queue_name=self.queue_name, max_items=3, timeout=0.05)
+        )
+        self.assertEqual(items, [])
+
+        # items are handed out, in eta order, once due.
+        self._run(asyncio.sleep(0.5))
+        items = self._run(
+            self.broker.dequeue_many(queue_name=self.queue_name, max_items=3, timeout=0.05)
+        )
+        self.assertEqual(items, ["soon", "later"])
+
+    def test_dequeue_wakes_up_on_enqueue(self):
+        async def enqueue_later():
+            await asyncio.sleep(0.1)
+            await self.broker.enqueue(queue_name=self.queue_name, item="item0")
+            return time.monotonic()
+
+        async def dequeue():
+            item = await self.broker.dequeue(queue_name=self.queue_name)
+            return item, time.monotonic()
+
+        (item, dequeued_at), enqueued_at = self._run(asyncio.gather(dequeue(), enqueue_later()))
+        self.assertEqual(item, "item0")
+        # no polling interval between the enqueue and the dequeue.
+        self.assertTrue(dequeued_at - enqueued_at < 0.05)
+
+    def test_dequeue_missing_queue(self):
+        with self.assertRaises(ValueError) as raised_exception:
+            self._run(self.broker.dequeue(queue_name="{0}-missing".format(uuid.uuid4())))
+        self.assertIn("does not exist", str(raised_exception.exception))
+
+    def test_no_items_dropped(self):
+        for i in range(2_500):
+            self._run(self.broker.enqueue(queue_name=self.queue_name, item="item{0}".format(i)))
+        self.assertEqual(self.broker._llen(self.queue_name), 2_500)
+
+    def test_bounded(self):
+        broker = wiji.broker.InMemoryBroker(maxsize=2)
+        self._run(broker.enqueue(queue_name=self.queue_name, item="item0"))
+        self._run(broker.enqueue(queue_name=self.queue_name, item="item1"))
+
+        async def enqueue():
+            await broker.enqueue(queue_name=self.queue_name, item="item2")
+            return broker._llen(self.queue_name)
+
+        async def dequeue_later():
+            await asyncio.sleep(0.2)
+            # the enqueue is still waiting for space
+            self.assertEqual(broker._llen(self.queue_name), 2)
+            return await broker.dequeue(queue_name=self.queue_name)
+
+        llen, item = self._run(asyncio.gather(enqueue(), dequeue_later()))
+        self.assertEqual(item, "item0")
+        self.assertEqual(llen, 2)
+        items = self._run(broker.dequeue_many(queue_name=self.queue_name, max_items=5, timeout=0.1))
+        self.assertEqual(items, ["item1", "item2"])
+
+    def test_bad_args(self):
+        with self.assertRaises(ValueError) as raised_exception:
+            wiji.broker.InMemoryBroker(maxsize=-1)
+        self.assertIn("`maxsize` should not be less than 0", str(raised_exception.exception))
+
+    def test_poll(self):
+        start = time.monotonic()
+        item = self._run(self.broker.poll(queue_name=self.queue_name, timeout=0.2))
+        self.assertIsNone(item)
+        self.assertTrue(time.monotonic() - start < 1.0)
+
+        self._run(self.broker.enqueue(queue_name=self.queue_name, item="item0"))
+        item = self._run(self.broker.poll(queue_name=self.queue_name, timeout=0.2))
+        self.assertEqual(item, "item0")
+
+    def test_default_poll(self):
+        """
+        brokers that do not implement `poll` get a default built on `dequeue` that does not lose items on timeout.
+        """
+        item = self._run(
+            wiji.broker.BaseBroker.poll(self.broker, queue_name=self.queue_name, timeout=0.1)
+        )
+        self.assertIsNone(item)
+        # the dequeue that timed out is still pending and hands over the next item.
+        self._run(self.broker.enqueue(queue_name=self.queue_name, item="item0"))
+        item = self._run(
+            wiji.broker.BaseBroker.poll(self.broker, queue_name=self.queue_name, timeout=0.1)
+        )
+        self.assertEqual(item, "item0")
+        self.assertEqual(self.broker._llen(self.queue_name), 0)
+
+    def test_cancel_poll(self):
+        self.assertIsNone(self.broker.cancel_poll(queue_name=self.queue_name))
+
+        async def poll_then_enqueue():
+            item = await wiji.broker.BaseBroker.poll(
+                self.broker, queue_name=self.queue_name, timeout=0.1
+            )
+            # the dequeue that timed out takes this item off the queue.
+            await self.broker.enqueue(queue_name=self.queue_name, item="item0")
+            await asyncio.sleep(0.01)
+            return item
+
+        self.assertIsNone(self._run(poll_then_enqueue()))
+        self.assertEqual(self.broker._llen(self.queue_name), 0)
+        self.assertEqual(self.broker.cancel_poll(queue_name=self.queue_name), "item0")
+        self.assertEqual(self.broker._pending_dequeues, {})
+
+        # a dequeue that is still waiting is cancelled.
+        self._run(wiji.broker.BaseBroker.poll(self.broker, queue_name=self.queue_name, timeout=0.1))
+        pending = self.broker._pending_dequeues[self.queue_name]
+        self.assertIsNone(self.broker.cancel_poll(queue_name=self.queue_name))
+        self._run(asyncio.sleep(0.01))
+        self.assertTrue(pending.cancelled())
+
+    def test_poll_without_base_init(self):
+        """
+        the default `poll` works with brokers whose `__init__` does not call `super().__init__()`
+        """
+
+        class DelegatingBroker(wiji.broker.BaseBroker):
+            def __init__(self, broker):
+                self.broker = broker
+
+            async def check(self, queue_name):
+                await self.broker.check(queue_name=queue_name)
+
+            async def enqueue(self, queue_name, item, eta=None):
+                await self.broker.enqueue(queue_name=queue_name, item=item, eta=eta)
+
+            async def dequeue(self, queue_name):
+                return await self.broker.dequeue(queue_name=queue_name)
+
+            async def done(self, queue_name, item, state):
+                await self.broker.done(queue_name=queue_name, item=item, state=state)
+
+            async def shutdown(self, queue_name, duration):
+                await self.broker.shutdown(queue_name=queue_name, duration=duration)
+
+        broker = DelegatingBroker(self.broker)
+        self.assertIsNone(broker.cancel_poll(queue_name=self.queue_name))
+        self.assertIsNone(self._run(broker.poll(queue_name=self.queue_name, timeout=0.1)))
+        self._run(broker.enqueue(queue_name=self.queue_name, item="item0"))
+        self.assertEqual(self._run(broker.poll(queue_name=self.queue_name, timeout=0.1)), "item0")
+        self.assertIsNone(self._run(broker.poll(queue_name=self.queue_name, timeout=0.1)))
+        self.assertIsNone(broker.cancel_poll(queue_name=self.queue_name))
+
+    def test_enqueue_many(self):
+        items = ["item{0}".format(i) for i in range(5)]
+        self._run(
+            self.broker.enqueue_many(
+                queue_name=self.queue_name,
+                items=items,
+                etas=[None, None, time.time() + 600, None, None],
+            )
+        )
+        self.assertEqual(self.broker._llen(self.queue_name), 5)
+        dequeued = self._run(
+            self.broker.dequeue_many(queue_name=self.queue_name, max_items=10, timeout=0.1)
+        )
+        self.assertEqual(dequeued, ["item0", "item1", "item3", "item4"])
+
+    def test_enqueue_many_bounded(self):
+        broker = wiji.broker.InMemoryBroker(maxsize=3)
+        self._run(broker.check(queue_name=self.queue_name))
+        items = ["item{0}".format(i) for i in range(10)]
+
+        async def consume():
+            dequeued = []
+            while len(dequeued) < len(items):
+                self.assertTrue(broker._llen(self.queue_name) <= 3)
+                dequeued.extend(
+                    await broker.dequeue_many(queue_name=self.queue_name, max_items=2, timeout=1.0)
+                )
+            return dequeued
+
+        async def run():
+            _, dequeued = await asyncio.gather(
+                broker.enqueue_many(queue_name=self.queue_name, items=items), consume()
+            )
+            return dequeued
+
+        self.assertEqual(self._run(run()), items)
+
+    def test_default_enqueue_many(self):
+        items = ["item{0}".format(i) for i in range(3)]
+        self._run(
+            wiji.broker.BaseBroker.enqueue_many(
+                self.broker, queue_name=self.queue_name, items=items
+            )
+        )
+        self.assertEqual(self.broker._llen(self.queue_name), 3)
+
+    def test_default_dequeue_many(self):
+        """
+        brokers that do not implement `dequeue_many` get a default built on `dequeue`
+        """
+        self._run(self.broker.enqueue(queue_name=self.queue_name, item="item0"))
+        self._run(self.broker.enqueue(queue_name=self.queue_name, item="item1"))
+        items = self._run(
+            wiji.broker.BaseBroker.dequeue_many(
+                self.broker, queue_name=self.queue_name, max_items=3, timeout=1.0
+            )
+        )
+        self.assertEqual(items, ["item0"])
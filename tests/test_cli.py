@@ -1,7 +1,11 @@
+import os
+import time
 import uuid
 import signal
 import asyncio
 import argparse
+import tempfile
+import threading
 from unittest import TestCase, mock
 
 import cli
@@ -30,7 +34,14 @@ class MockArgumentParser:
         pass
 
     def parse_args(self, args=None, namespace=None):
-        return argparse.Namespace(app=self.wiji_app, dry_run=self.dry_run, loglevel="DEBUG")
+        return argparse.Namespace(
+            app=self.wiji_app,
+            dry_run=self.dry_run,
+            concurrency=1,
+            processes=1,
+            cpu_affinity=False,
+            loglevel="DEBUG",
+        )
 
 
 class TestCli(TestCase):
@@ -52,6 +63,24 @@ class TestCli(TestCase):
         with self.assertRaises(SystemExit):
             self.parser.parse_args(["wiji-cli", "-someBad", "-arguments"])
 
+    def test_concurrency_arg(self):
+        args = self.parser.parse_args(["--app", self.wiji_app, "--concurrency", "8"])
+        self.assertEqual(args.concurrency, 8)
+
+        args = self.parser.parse_args(["--app", self.wiji_app])
+        self.assertEqual(args.concurrency, 1)
+
+    def test_processes_arg(self):
+        args = self.parser.parse_args(
+            ["--app", self.wiji_app, "--processes", "4", "--cpu-affinity"]
+        )
+        self.assertEqual(args.processes, 4)
+        self.assertTrue(args.cpu_affinity)
+
+        args = self.parser.parse_args(["--app", self.wiji_app])
+        self.assertEqual(args.processes, 1)
+        self.assertFalse(args.cpu_affinity)
+
     def test_cli_success(self):
         with mock.patch("argparse.ArgumentParser") as mock_ArgumentParser:
             mock_ArgumentParser.return_value = MockArgumentParser(wiji_app=self.wiji_app)
@@ -98,6 +127,50 @@ class TestCliSigHandling(TestCase):
         )
 
 
+class TestCliProducer(TestCase):
+    """
+    run tests as:
+        python -m unittest discover -v -s .
+    run one testcase as:
+        python -m unittest -v tests.test_cli.TestCliProducer.test_something
+    """
+
+    @staticmethod
+    def _run(coro):
+        loop = asyncio.get_event_loop()
+        return loop.run_until_complete(coro)
+
+    def test_full_queue_does_not_block(self):
+        class WatchDogTask(wiji.task.Task):
+            the_broker = wiji.broker.InMemoryBroker(maxsize=3)
+            queue_name = "{0}-WatchDogTaskQueue".format(uuid.uuid4())
+
+            async def run(self):
+                pass
+
+        task = WatchDogTask()
+        enqueue = task.the_broker.enqueue
+        enqueued = []
+
+        async def counting_enqueue(*args, **kwargs):
+            enqueued.append(kwargs.get("item"))
+            return await enqueue(*args, **kwargs)
+
+        async def produce():
+            producer = asyncio.ensure_future(
+                cli.utils._producer.produce_tasks_continously(task=task, watchdog_duration=0.1)
+            )
+            await asyncio.sleep(0.2)
+            self.assertFalse(producer.done())
+            producer.cancel()
+
+        with mock.patch.object(task.the_broker, "enqueue", new=counting_enqueue):
+            self._run(produce())
+        # once the queue is full, the producer skips enqueueing instead of waiting for space.
+        self.assertEqual(len(enqueued), 3)
+        self.assertEqual(task.the_broker._llen(task.queue_name), 3)
+
+
 class TestCliLoad(TestCase):
     """
     run tests as:
@@ -119,3 +192,91 @@ class TestCliLoad(TestCase):
     def test_fail(self):
         with self.assertRaises(AttributeError):
             cli.utils.load.load_class("tests.testdata.cli.my_app.NonExistentAppInstance")
+
+
+class TestCliPrefork(TestCase):
+    """
+    run tests as:
+        python -m unittest discover -v -s .
+    run one testcase as:
+        python -m unittest -v tests.test_cli.TestCliPrefork.test_something
+    """
+
+    def setUp(self):
+        self.logger = wiji.logger.SimpleLogger("wiji.TestCliPrefork")
+        self.started = tempfile.NamedTemporaryFile(mode="r", delete=False)
+        self.drained = tempfile.NamedTemporaryFile(mode="r", delete=False)
+
+    def tearDown(self):
+        os.remove(self.started.name)
+        os.remove(self.drained.name)
+
+    def _lines(self, f):
+        with open(f.name) as _f:
+            return _f.read().splitlines()
+
+    def test_supervise(self):
+        started = self.started.name
+        drained = self.drained.name
+
+        def target(process_index):
+            with open(started, "a") as f:
+                f.write("{0}\n".format(process_index))
+
+            if process_index == 0 and len(open(started).read().splitlines()) <= 2:
+                # crash once; the supervisor should restart us.
+                raise Exception("test_supervise crash")
+
+            def _drain(_signal, frame):
+                with open(drained, "a") as f:
+                    f.write("{0}\n".format(process_index))
+                os._exit(0)
+
+            signal.signal(signal.SIGTERM, _drain)
+            cli.utils.prefork._unblock_termination_signals()
+            while True:
+                time.sleep(0.05)
+
+        # send the supervisor a termination signal once the children are up.
+        timer = threading.Timer(2.5, os.kill, args=(os.getpid(), signal.SIGTERM))
+        timer.start()
+        start = time.monotonic()
+        cli.utils.prefork.supervise(
+            logger=self.logger, processes=2, target=target, drain_duration=5.0, restart_delay=0.5
+        )
+        timer.join()
+
+        self.assertTrue(time.monotonic() - start < 5.0)
+        # child 0 was started twice
+        self.assertEqual(sorted(self._lines(self.started)), ["0", "0", "1"])
+        # and every running child drained on the one signal.
+        self.assertEqual(sorted(self._lines(self.drained)), ["0", "1"])
+
+    def test_signal_while_child_starts(self):
+        """
+        a termination signal that arrives before a child has installed its handlers is held back, not fatal.
+        """
+        drained = self.drained.name
+
+        def target(process_index):
+            # eg loading the app.
+            time.sleep(1.0)
+
+            def _drain(_signal, frame):
+                with open(drained, "a") as f:
+                    f.write("{0}\n".format(process_index))
+                os._exit(0)
+
+            signal.signal(signal.SIGTERM, _drain)
+            cli.utils.prefork._unblock_termination_signals()
+            while True:
+                time.sleep(0.05)
+
+        timer = threading.Timer(0.3, os.kill, args=(os.getpid(), signal.SIGTERM))
+        timer.start()
+        cli.utils.prefork.supervise(
+            logger=self.logger, processes=2, target=target, drain_duration=5.0
+        )
+        timer.join()
+
+        self.assertEqual(sorted(self._lines(self.drained)), ["0", "1"])
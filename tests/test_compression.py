@@ -0,0 +1,68 @@
+# do not to pollute the global namespace.
+# see: https://python-packaging.readthedocs.io/en/latest/testing.html
+import os
+from unittest import TestCase
+
+import wiji
+
+
+class TestCompression(TestCase):
+    """
+    run tests as:
+        python -m unittest discover -v -s .
+    run one testcase as:
+        python -m unittest -v tests.test_compression.TestCompression.test_something
+    """
+
+    def test_round_trip(self):
+        data = b"wiji " * 1_000
+        for codec, codec_id in wiji.compression.CODECS.items():
+            the_compression = wiji.compression.Compression(codec=codec, threshold=100)
+            compressed_with, compressed = the_compression.compress(data)
+            self.assertEqual(compressed_with, codec_id)
+            self.assertLess(len(compressed), len(data))
+            self.assertEqual(the_compression.decompress(compressed_with, compressed), data)
+            self.assertEqual(wiji.compression.decompress(compressed_with, compressed), data)
+
+    def test_not_compressed(self):
+        the_compression = wiji.compression.Compression(threshold=100)
+        # below the threshold.
+        self.assertEqual(the_compression.compress(b"a" * 99), (wiji.compression.NONE, b"a" * 99))
+        # data that does not get any smaller is sent as is.
+        random_data = os.urandom(1_000)
+        self.assertEqual(
+            the_compression.compress(random_data), (wiji.compression.NONE, random_data)
+        )
+        self.assertEqual(the_compression.metrics()["skipped"], 2)
+        self.assertEqual(the_compression.metrics()["compressed"], 0)
+
+    def test_metrics(self):
+        the_compression = wiji.compression.Compression(threshold=0)
+        _, compressed = the_compression.compress(b"a" * 1_000)
+        the_compression.decompress(wiji.compression.CODECS["zlib"], compressed)
+        metrics = the_compression.metrics()
+        self.assertEqual(metrics["compressed"], 1)
+        self.assertEqual(metrics["decompressed"], 1)
+        self.assertEqual(metrics["bytes_in"], 1_000)
+        self.assertEqual(metrics["bytes_out"], len(compressed))
+        self.assertEqual(metrics["ratio"], len(compressed) / 1_000)
+        self.assertGreaterEqual(metrics["compress_time"], 0.0)
+
+    def test_bad_args(self):
+        with self.assertRaises(ValueError) as raised_exception:
+            wiji.compression.Compression(codec="gzip")
+        self.assertIn("`codec` should be one of", str(raised_exception.exception))
+
+        with self.assertRaises(ValueError) as raised_exception:
+            wiji.compression.Compression(threshold=-1)
+        self.assertIn("`threshold` should not be less than 0", str(raised_exception.exception))
+
+        with self.assertRaises(ValueError) as raised_exception:
+            wiji.compression.Compression(level="9")
+        self.assertIn(
+            "`level` should be of type:: `None` or `int`", str(raised_exception.exception)
+        )
+
+        with self.assertRaises(ValueError) as raised_exception:
+            wiji.compression.decompress(7, b"")
+        self.assertIn("unknown compression codec: 7", str(raised_exception.exception))
@@ -0,0 +1,197 @@
+# do not to pollute the global namespace.
+# see: https://python-packaging.readthedocs.io/en/latest/testing.html
+import os
+import time
+import asyncio
+import tempfile
+from unittest import TestCase
+
+import wiji
+
+
+class TestDedup(TestCase):
+    """
+    run tests as:
+        python -m unittest discover -v -s .
+    run one testcase as:
+        python -m unittest -v tests.test_dedup.TestDedup.test_something
+    """
+
+    def setUp(self):
+        self.dedup = self._dedup(ttl=60.0, maxsize=3)
+
+    def _dedup(self, ttl, maxsize):
+        return wiji.dedup.Dedup(ttl=ttl, maxsize=maxsize, bloom_capacity=100)
+
+    @staticmethod
+    def _run(coro):
+        loop = asyncio.get_event_loop()
+        return loop.run_until_complete(coro)
+
+    def test_bad_args(self):
+        with self.assertRaises(ValueError):
+            wiji.dedup.Dedup(ttl=60)
+        with self.assertRaises(ValueError):
+            wiji.dedup.Dedup(maxsize=0)
+        with self.assertRaises(ValueError):
+            wiji.dedup.Dedup(maxsize=10, bloom_capacity=5)
+        with self.assertRaises(ValueError):
+            wiji.dedup.Dedup(bloom_error_rate=1.0)
+        with self.assertRaises(ValueError):
+            wiji.dedup.Dedup(the_store="store")
+        with self.assertRaises(ValueError):
+            wiji.dedup.Dedup(lease=0.0)
+
+    def test_claim(self):
+        self.assertIsNone(self._run(self.dedup.claim(wiji.dedup.QUEUED, "key-1", "task-1")))
+        self.assertEqual(
+            self._run(self.dedup.claim(wiji.dedup.QUEUED, "key-1", "task-2")), "task-1"
+        )
+        # the stages are claimed independently.
+        self.assertIsNone(self._run(self.dedup.claim(wiji.dedup.EXECUTED, "key-1", "task-1")))
+        self.assertEqual(
+            self._run(self.dedup.claim(wiji.dedup.EXECUTED, "key-1", "task-3")), "task-1"
+        )
+
+        self._run(self.dedup.release(wiji.dedup.QUEUED, "key-1"))
+        self.assertIsNone(self._run(self.dedup.claim(wiji.dedup.QUEUED, "key-1", "task-4")))
+
+        metrics = self.dedup.metrics()
+        self.assertEqual(metrics["suppressed_queued"], 1)
+        self.assertEqual(metrics["suppressed_executed"], 1)
+        self.assertEqual(metrics["lru_hits"], 2)
+        self.assertEqual(metrics["bloom_negatives"], 2)
+
+    def test_ttl(self):
+        dedup = self._dedup(ttl=0.05, maxsize=3)
+        self.assertIsNone(self._run(dedup.claim(wiji.dedup.QUEUED, "key-1", "task-1")))
+        self.assertEqual(self._run(dedup.claim(wiji.dedup.QUEUED, "key-1", "task-2")), "task-1")
+        time.sleep(0.06)
+        self.assertIsNone(self._run(dedup.claim(wiji.dedup.QUEUED, "key-1", "task-3")))
+
+    def test_lease(self):
+        dedup = self._dedup(ttl=60.0, maxsize=3)
+        self.assertIsNone(self._run(dedup.claim(wiji.dedup.EXECUTED, "key-1", "task-1", ttl=0.05)))
+        self.assertEqual(
+            self._run(dedup.claim(wiji.dedup.EXECUTED, "key-1", "task-2", ttl=0.05)), "task-1"
+        )
+        # a lease that is not renewed lapses.
+        time.sleep(0.06)
+        self.assertIsNone(self._run(dedup.claim(wiji.dedup.EXECUTED, "key-1", "task-3", ttl=0.05)))
+
+        # once recorded, the claim holds for the whole ttl.
+        self._run(dedup.record(wiji.dedup.EXECUTED, "key-1", "task-3"))
+        time.sleep(0.06)
+        self.assertEqual(
+            self._run(dedup.claim(wiji.dedup.EXECUTED, "key-1", "task-4", ttl=0.05)), "task-3"
+        )
+
+    def test_maxsize(self):
+        for i in range(5):
+            self._run(self.dedup.claim(wiji.dedup.QUEUED, "key-{0}".format(i), "task"))
+        self.assertEqual(len(self.dedup._lru), 3)
+        # the least recently used are forgotten first.
+        self.assertIsNone(self._run(self.dedup.claim(wiji.dedup.QUEUED, "key-0", "task")))
+        self.assertEqual(self._run(self.dedup.claim(wiji.dedup.QUEUED, "key-4", "task")), "task")
+
+    def test_bloom_filter_refilled_when_full(self):
+        dedup = wiji.dedup.Dedup(maxsize=3, bloom_capacity=5)
+        for i in range(12):
+            self._run(dedup.claim(wiji.dedup.QUEUED, "key-{0}".format(i), "task"))
+        self.assertLessEqual(dedup._bloom.count, 5)
+        # the keys in the LRU are never lost from the bloom filter.
+        for i in range(9, 12):
+            self.assertIn("queued:key-{0}".format(i), dedup._bloom)
+            self.assertEqual(
+                self._run(dedup.claim(wiji.dedup.QUEUED, "key-{0}".format(i), "task-2")), "task"
+            )
+
+    def test_bloom_filter(self):
+        bloom = wiji.dedup.BloomFilter(capacity=1_000, error_rate=0.01)
+        for i in range(1_000):
+            bloom.add("key-{0}".format(i))
+        for i in range(1_000):
+            self.assertIn("key-{0}".format(i), bloom)
+        false_positives = sum("other-{0}".format(i) in bloom for i in range(10_000))
+        self.assertLess(false_positives, 300)
+
+
+class TestSqliteDedupStore(TestCase):
+    """
+    run tests as:
+        python -m unittest discover -v -s .
+    run one testcase as:
+        python -m unittest -v tests.test_dedup.TestSqliteDedupStore.test_something
+    """
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, "dedup.sqlite")
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    @staticmethod
+    def _run(coro):
+        loop = asyncio.get_event_loop()
+        return loop.run_until_complete(coro)
+
+    def test_add_remove(self):
+        store = wiji.dedup.SqliteDedupStore(path=self.path)
+        self.assertIsNone(self._run(store.add("key-1", "task-1", 60.0)))
+        self.assertEqual(self._run(store.add("key-1", "task-2", 60.0)), "task-1")
+        self._run(store.remove("key-1"))
+        self.assertIsNone(self._run(store.add("key-1", "task-3", 60.0)))
+
+        self.assertIsNone(self._run(store.add("key-2", "task-1", 0.05)))
+        time.sleep(0.06)
+        self.assertIsNone(self._run(store.add("key-2", "task-2", 0.05)))
+
+    def test_set(self):
+        store = wiji.dedup.SqliteDedupStore(path=self.path)
+        self.assertIsNone(self._run(store.add("key-1", "task-1", 0.05)))
+        # the key is extended, rather than added again.
+        self._run(store.set("key-1", "task-1", 60.0))
+        time.sleep(0.06)
+        self.assertEqual(self._run(store.add("key-1", "task-2", 60.0)), "task-1")
+        self._run(store.set("key-2", "task-3", 60.0))
+        self.assertEqual(self._run(store.add("key-2", "task-4", 60.0)), "task-3")
+
+    def test_shared_across_processes(self):
+        # eg a producer and a worker in different processes; each with their own LRU.
+        producer = wiji.dedup.Dedup(the_store=wiji.dedup.SqliteDedupStore(path=self.path))
+        other_producer = wiji.dedup.Dedup(the_store=wiji.dedup.SqliteDedupStore(path=self.path))
+
+        self.assertIsNone(self._run(producer.claim(wiji.dedup.QUEUED, "key-1", "task-1")))
+        self.assertEqual(
+            self._run(other_producer.claim(wiji.dedup.QUEUED, "key-1", "task-2")), "task-1"
+        )
+        self.assertEqual(
+            self._run(other_producer.claim(wiji.dedup.QUEUED, "key-1", "task-3")), "task-1"
+        )
+        self.assertEqual(other_producer.metrics()["suppressed_queued"], 2)
+        # the key may be released by the process that claimed it, so only that process remembers it in its LRU.
+        self.assertEqual(other_producer.metrics()["store_checks"], 2)
+        self.assertEqual(self._run(producer.claim(wiji.dedup.QUEUED, "key-1", "task-4")), "task-1")
+        self.assertEqual(producer.metrics()["store_checks"], 1)
+        self.assertEqual(producer.metrics()["lru_hits"], 1)
+
+        self._run(producer.release(wiji.dedup.QUEUED, "key-1"))
+        self.assertIsNone(self._run(producer.claim(wiji.dedup.QUEUED, "key-1", "task-5")))
+
+    def test_concurrent_claims(self):
+        dedups = [
+            wiji.dedup.Dedup(the_store=wiji.dedup.SqliteDedupStore(path=self.path))
+            for _ in range(5)
+        ]
+
+        async def claim():
+            return await asyncio.gather(
+                *[
+                    dedup.claim(wiji.dedup.QUEUED, "key-1", "task-{0}".format(i))
+                    for i, dedup in enumerate(dedups)
+                ]
+            )
+
+        claims = self._run(claim())
+        self.assertEqual(claims.count(None), 1)
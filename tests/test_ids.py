@@ -0,0 +1,53 @@
+# do not to pollute the global namespace.
+# see: https://python-packaging.readthedocs.io/en/latest/testing.html
+import os
+import time
+from unittest import TestCase, mock
+
+import wiji
+
+
+class TestUlidGenerator(TestCase):
+    """
+    run tests as:
+        python -m unittest discover -v -s .
+    run one testcase as:
+        python -m unittest -v tests.test_ids.TestUlidGenerator.test_something
+    """
+
+    def test_format(self):
+        task_id = wiji.ids.UlidGenerator().generate()
+        self.assertEqual(len(task_id), 26)
+        self.assertTrue(set(task_id) <= set("0123456789ABCDEFGHJKMNPQRSTVWXYZ"))
+        self.assertAlmostEqual(wiji.ids.UlidGenerator.timestamp(task_id), time.time(), delta=1.0)
+
+    def test_ordered_and_unique(self):
+        generator = wiji.ids.UlidGenerator()
+        task_ids = [generator.generate() for _ in range(10_000)]
+        # many of these are generated within the same millisecond.
+        self.assertEqual(task_ids, sorted(task_ids))
+        self.assertEqual(len(set(task_ids)), 10_000)
+
+    def test_clock_going_backwards(self):
+        generator = wiji.ids.UlidGenerator()
+        first = generator.generate()
+        with mock.patch("wiji.ids.time.time_ns", return_value=0):
+            second = generator.generate()
+        self.assertLess(first, second)
+        self.assertEqual(first[:10], second[:10])
+
+    def test_reseeded_after_fork(self):
+        generator = wiji.ids.UlidGenerator()
+        with mock.patch("wiji.ids.time.time_ns", return_value=1_000_000_000_000), mock.patch(
+            "wiji.ids.os.urandom", side_effect=[bytes(10), bytes(9) + b"\x05"]
+        ):
+            parent = generator.generate()
+            with mock.patch("wiji.ids.os.getpid", return_value=os.getpid() + 1):
+                child = generator.generate()
+        self.assertEqual(parent[:10], child[:10])
+        self.assertEqual(parent[10:], "0" * 16)
+        # a fresh random part, rather than the next id in the parent's sequence.
+        self.assertEqual(child[10:], "0" * 15 + "5")
+
+    def test_uuid_generator(self):
+        self.assertEqual(len(wiji.ids.UuidGenerator().generate()), 36)
@@ -0,0 +1,70 @@
+# do not to pollute the global namespace.
+# see: https://python-packaging.readthedocs.io/en/latest/testing.html
+import asyncio
+import threading
+import concurrent.futures
+from unittest import TestCase
+
+import wiji
+
+
+class TestOffload(TestCase):
+    """
+    run tests as:
+        python -m unittest discover -v -s .
+    run one testcase as:
+        python -m unittest -v tests.test_offload.TestOffload.test_something
+    """
+
+    @staticmethod
+    def _run(coro):
+        loop = asyncio.get_event_loop()
+        return loop.run_until_complete(coro)
+
+    def test_size_aware_paths(self):
+        offload = wiji.offload.Offload(threshold=100)
+
+        def thread_name():
+            return threading.current_thread().name
+
+        main_thread = threading.current_thread().name
+        self.assertEqual(self._run(offload.decode(99, thread_name)), main_thread)
+        self.assertNotEqual(self._run(offload.decode(100, thread_name)), main_thread)
+        self.assertEqual(self._run(offload.encode(10, thread_name)), main_thread)
+        self.assertNotEqual(self._run(offload.encode(1_000, thread_name)), main_thread)
+        self.assertEqual(
+            offload.metrics(),
+            {"decode_inline": 1, "decode_offloaded": 1, "encode_inline": 1, "encode_offloaded": 1},
+        )
+
+    def test_process_pool(self):
+        task_options = wiji.task.TaskOptions()
+        task_options.kwargs = {"a": 1}
+        item = wiji.protocol.Protocol(version=2, task_options=task_options).encode()
+        envelope = wiji.protocol.Protocol.decode(item)
+
+        with concurrent.futures.ProcessPoolExecutor(max_workers=1) as executor:
+            offload = wiji.offload.Offload(threshold=0, executor=executor)
+            # the body is a memoryview, which can not be pickled; it is sent to the pool as bytes.
+            args, kwargs = self._run(
+                offload.decode(
+                    len(envelope.undecoded_body),
+                    wiji.protocol.decode_task_body,
+                    envelope.codec,
+                    envelope.compression_codec,
+                    envelope.undecoded_body,
+                )
+            )
+        self.assertEqual((args, kwargs), ([], {"a": 1}))
+
+    def test_bad_args(self):
+        with self.assertRaises(ValueError) as raised_exception:
+            wiji.offload.Offload(threshold=-1)
+        self.assertIn("`threshold` should not be less than 0", str(raised_exception.exception))
+
+        with self.assertRaises(ValueError) as raised_exception:
+            wiji.offload.Offload(executor="threads")
+        self.assertIn(
+            "`executor` should be of type:: `None` or `concurrent.futures.Executor`",
+            str(raised_exception.exception),
+        )
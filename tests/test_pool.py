@@ -0,0 +1,197 @@
+# do not to pollute the global namespace.
+# see: https://python-packaging.readthedocs.io/en/latest/testing.html
+import os
+import sys
+import time
+import asyncio
+import threading
+import subprocess
+from unittest import TestCase
+
+import wiji
+
+
+def count_bytes(data, byte):
+    # a cpu-bound function, to run in a process pool.
+    total = 0
+    for _ in range(20):
+        total = data.count(byte)
+    return os.getpid(), total, data[:2] * (len(data) // 2)
+
+
+def fail():
+    raise ValueError("failed")
+
+
+def sleep_then_echo(data, duration):
+    time.sleep(duration)
+    return data
+
+
+def shared_memory_blocks():
+    # the posix shared memory blocks that python created.
+    return {name for name in os.listdir("/dev/shm") if name.startswith("psm_")}
+
+
+class TestPool(TestCase):
+    """
+    run tests as:
+        python -m unittest discover -v -s .
+    run one testcase as:
+        python -m unittest -v tests.test_pool.TestPool.test_something
+    """
+
+    @staticmethod
+    def _run(coro):
+        loop = asyncio.get_event_loop()
+        return loop.run_until_complete(coro)
+
+    def test_thread_pool_is_shared(self):
+        pool = wiji.pool.thread_pool(name="TestPoolShared", size=2)
+        self.assertIs(wiji.pool.thread_pool(name="TestPoolShared", size=2), pool)
+        self.assertIsNot(wiji.pool.thread_pool(name="TestPoolOther", size=2), pool)
+
+        with self.assertRaises(ValueError) as raised_exception:
+            wiji.pool.thread_pool(name="TestPoolShared", size=3)
+        self.assertIn("already exists with a size of: 2", str(raised_exception.exception))
+
+    def test_run_in_thread_pool(self):
+        pool = wiji.pool.thread_pool(name="TestPoolRun", size=1)
+
+        def thread_name(a, b):
+            time.sleep(0.05)
+            return threading.current_thread().name, a + b
+
+        timings = {}
+        name, result = self._run(
+            wiji.pool.run_in_thread_pool(pool, thread_name, (1,), {"b": 2}, timings)
+        )
+        self.assertEqual(result, 3)
+        self.assertTrue(name.startswith("wiji-TestPoolRun"))
+        self.assertGreaterEqual(timings["pool_run"], 0.04)
+        self.assertGreaterEqual(timings["pool_queue_wait"], 0.0)
+
+        # with a single thread, the second call waits for the first one.
+        timings_first, timings_second = {}, {}
+        self._run(
+            asyncio.gather(
+                wiji.pool.run_in_thread_pool(pool, thread_name, (1, 2), {}, timings_first),
+                wiji.pool.run_in_thread_pool(pool, thread_name, (1, 2), {}, timings_second),
+            )
+        )
+        self.assertGreaterEqual(timings_second["pool_queue_wait"], 0.04)
+
+    def test_timings_when_raising(self):
+        pool = wiji.pool.thread_pool(name="TestPoolRaise", size=1)
+
+        def fail():
+            raise ValueError("failed")
+
+        timings = {}
+        with self.assertRaises(ValueError):
+            self._run(wiji.pool.run_in_thread_pool(pool, fail, (), {}, timings))
+        self.assertIn("pool_run", timings)
+
+    def test_process_pool(self):
+        pool = wiji.pool.process_pool(name="TestPoolProcess", size=1, modules=["json"])
+        self.assertIs(wiji.pool.process_pool(name="TestPoolProcess", size=1), pool)
+        with self.assertRaises(ValueError):
+            wiji.pool.process_pool(name="TestPoolProcess", size=2)
+
+        timings = {}
+        pid, total, echoed = self._run(
+            wiji.pool.run_in_process_pool(pool, count_bytes, (b"ab" * 10,), {"byte": b"a"}, timings)
+        )
+        self.assertNotEqual(pid, os.getpid())
+        self.assertEqual(total, 10)
+        self.assertEqual(echoed, b"ab" * 10)
+        for key in ["pool_queue_wait", "pool_run", "thread_time", "process_time"]:
+            self.assertIn(key, timings)
+
+        with self.assertRaises(ValueError):
+            self._run(wiji.pool.run_in_process_pool(pool, fail, (), {}, {}))
+
+    def test_process_pool_shared_memory(self):
+        if wiji.pool.shared_memory is None:
+            return
+        pool = wiji.pool.process_pool(name="TestPoolProcess", size=1)
+        data = b"ab" * wiji.pool.SHARED_MEMORY_THRESHOLD
+        ref = wiji.pool._dump(data)
+        self.assertEqual(ref[0], "shared_memory")
+        self.assertEqual(wiji.pool._load(ref), data)
+        # it is freed once loaded.
+        with self.assertRaises(FileNotFoundError):
+            wiji.pool.shared_memory.SharedMemory(name=ref[1])
+
+        # both the args and the return value are large.
+
+        timings = {}
+        _, total, echoed = self._run(
+            wiji.pool.run_in_process_pool(pool, count_bytes, (data, b"b"), {}, timings)
+        )
+        self.assertEqual(total, wiji.pool.SHARED_MEMORY_THRESHOLD)
+        self.assertEqual(echoed, data)
+        self.assertGreater(timings["process_time"], 0.0)
+
+    def test_process_pool_cancelled_shared_memory_freed(self):
+        """
+        calls that are cancelled while they wait for, or run in, a child do not leak their shared memory.
+        """
+        if wiji.pool.shared_memory is None or not os.path.isdir("/dev/shm"):
+            return
+        pool = wiji.pool.process_pool(name="TestPoolCancel", size=1)
+        data = b"ab" * wiji.pool.SHARED_MEMORY_THRESHOLD
+        before = shared_memory_blocks()
+
+        async def cancel():
+            calls = [
+                asyncio.ensure_future(
+                    wiji.pool.run_in_process_pool(pool, sleep_then_echo, (data, 0.3), {}, {})
+                )
+                for _ in range(3)
+            ]
+            await asyncio.sleep(0.1)
+            for call in calls:
+                call.cancel()
+            await asyncio.gather(*calls, return_exceptions=True)
+            # the running call is not stopped; it completes, and then its result is freed.
+            await asyncio.sleep(1.5)
+            # the child did not fail on arguments that were freed under it.
+            return await wiji.pool.run_in_process_pool(pool, sleep_then_echo, (data, 0.0), {}, {})
+
+        self.assertEqual(self._run(cancel()), data)
+        self.assertEqual(shared_memory_blocks() - before, set())
+
+    def test_process_pool_shared_memory_not_leaked(self):
+        """
+        the resource tracker does not report the shared memory that was freed by another process as leaked
+        once the processes exit.
+        """
+        if wiji.pool.shared_memory is None:
+            return
+        script = """
+import asyncio
+import wiji
+
+def echo(data):
+    return data
+
+async def main():
+    pool = wiji.pool.process_pool(name="TestPoolLeak", size=1)
+    data = b"ab" * wiji.pool.SHARED_MEMORY_THRESHOLD
+    assert await wiji.pool.run_in_process_pool(pool, echo, (data,), {}, {}) == data
+    pool.shutdown()
+
+asyncio.run(main())
+"""
+        root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        env = dict(os.environ, PYTHONPATH=root)
+        completed = subprocess.run(
+            [sys.executable, "-W", "default", "-c", script],
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            env=env,
+            timeout=60,
+        )
+        self.assertEqual(completed.returncode, 0, completed.stderr)
+        self.assertNotIn(b"Warning", completed.stderr)
@@ -55,3 +55,281 @@ class TestProtocol(TestCase):
             wiji.protocol.Protocol._from_isoformat(task_eta),
             wiji.protocol.Protocol._from_isoformat(task_options.eta),
         )
+
+    def test_bad_version(self):
+        with self.assertRaises(ValueError) as raised_exception:
+            wiji.protocol.Protocol(version=3, task_options=wiji.task.TaskOptions())
+        self.assertIn("`version` should be one of: (1, 2)", str(raised_exception.exception))
+
+    def test_binary_round_trip(self):
+        task_options = wiji.task.TaskOptions(eta=60.0, max_retries=3, hook_metadata="meta")
+        task_options.task_id = "some-task-id"
+        task_options.args = (1, "two", [3.0])
+        task_options.kwargs = {"b": {"nested": None}}
+        item = wiji.protocol.Protocol(version=2, task_options=task_options).encode()
+        self.assertIsInstance(item, bytes)
+
+        envelope = wiji.protocol.Protocol.decode(item)
+        self.assertEqual(envelope.version, 2)
+        self.assertEqual(envelope.task_id, "some-task-id")
+        self.assertEqual(envelope.eta, task_options._eta_timestamp)
+        self.assertEqual(envelope.current_retries, 0)
+        self.assertEqual(envelope.max_retries, 3)
+        self.assertEqual(envelope.hook_metadata, "meta")
+        self.assertEqual(envelope.args, [1, "two", [3.0]])
+        self.assertEqual(envelope.kwargs, {"b": {"nested": None}})
+
+        # the binary item is smaller than the same task as JSON text.
+        self.assertTrue(
+            len(item) < len(wiji.protocol.Protocol(version=1, task_options=task_options).encode())
+        )
+        # a memoryview of the item decodes just as well.
+        self.assertEqual(wiji.protocol.Protocol.decode(memoryview(item)).task_id, "some-task-id")
+
+    def test_decode_json(self):
+        task_options = wiji.task.TaskOptions(eta=60.0)
+        task_options.task_id = "some-task-id"
+        task_options.args = (1, 2)
+        item = wiji.protocol.Protocol(version=1, task_options=task_options).encode()
+        self.assertIsInstance(item, str)
+        for i in [item, item.encode("utf-8")]:
+            envelope = wiji.protocol.Protocol.decode(i)
+            self.assertEqual(envelope.version, 1)
+            self.assertEqual(envelope.task_id, "some-task-id")
+            self.assertAlmostEqual(envelope.eta, task_options._eta_timestamp, places=5)
+            self.assertEqual(envelope.args, [1, 2])
+            self.assertEqual(envelope.dictsy()["task_options"]["eta"], task_options.eta)
+
+        with self.assertRaises(KeyError):
+            wiji.protocol.Protocol.decode(json.dumps({"version": 1, "task_options": {}}))
+
+    def test_decode_malformed_binary(self):
+        item = wiji.protocol.Protocol(version=2, task_options=wiji.task.TaskOptions()).encode()
+        with self.assertRaises(ValueError):
+            wiji.protocol.Protocol.decode(item[:10])
+
+        # a binary item of an unknown version; eg one written by a newer wiji.
+        item = item[:2] + bytes([3]) + item[3:]
+        with self.assertRaises(ValueError) as raised_exception:
+            wiji.protocol.Protocol.decode(item)
+        self.assertIn("should be of version 2 You entered: 3", str(raised_exception.exception))
+
+    def test_binary_body_decoded_lazily(self):
+        task_options = wiji.task.TaskOptions(eta=60.0, expires=120.0)
+        task_options.task_id = "some-task-id"
+        task_options.args = ("x" * 100_000,)
+        item = wiji.protocol.Protocol(version=2, task_options=task_options).encode()
+
+        envelope = wiji.protocol.Protocol.decode(item)
+        # the header is available without decoding the body.
+        self.assertEqual(envelope.task_id, "some-task-id")
+        self.assertEqual(envelope.expires, task_options._expires_timestamp)
+        self.assertFalse(envelope.has_expired(now=task_options._eta_timestamp))
+        self.assertTrue(envelope.has_expired(now=task_options._expires_timestamp))
+        self.assertIsNotNone(envelope._body)
+        self.assertIsNone(envelope._args)
+
+        self.assertEqual(envelope.args, ["x" * 100_000])
+        self.assertEqual(envelope.kwargs, {})
+        self.assertIsNone(envelope._body)
+
+    def test_expires(self):
+        task_options = wiji.task.TaskOptions()
+        self.assertIsNone(task_options.expires)
+        for version in [1, 2]:
+            item = wiji.protocol.Protocol(version=version, task_options=task_options).encode()
+            self.assertIsNone(wiji.protocol.Protocol.decode(item).expires)
+
+        task_options = wiji.task.TaskOptions(expires=30.0)
+        for version in [1, 2]:
+            item = wiji.protocol.Protocol(version=version, task_options=task_options).encode()
+            self.assertAlmostEqual(
+                wiji.protocol.Protocol.decode(item).expires,
+                task_options._expires_timestamp,
+                places=5,
+            )
+
+        with self.assertRaises(ValueError) as raised_exception:
+            wiji.task.TaskOptions(expires=30)
+        self.assertIn(
+            "`expires` should be of type:: `None` or `float`", str(raised_exception.exception)
+        )
+
+    def test_idempotency_key(self):
+        for idempotency_key in [None, "order-1234", "заказ-1234"]:
+            task_options = wiji.task.TaskOptions(idempotency_key=idempotency_key)
+            task_options.task_id = "some-task-id"
+            task_options.args = (1,)
+            task_options.kwargs = {"a": "b"}
+            for version in [1, 2]:
+                item = wiji.protocol.Protocol(version=version, task_options=task_options).encode()
+                envelope = wiji.protocol.Protocol.decode(item)
+                self.assertEqual(envelope.idempotency_key, idempotency_key)
+                self.assertEqual(envelope.task_id, "some-task-id")
+                self.assertEqual(envelope.args, [1])
+                self.assertEqual(envelope.kwargs, {"a": "b"})
+
+        with self.assertRaises(ValueError) as raised_exception:
+            wiji.task.TaskOptions(idempotency_key=1234)
+        self.assertIn(
+            "`idempotency_key` should be of type:: `None` or `str`",
+            str(raised_exception.exception),
+        )
+        with self.assertRaises(ValueError):
+            wiji.task.TaskOptions(idempotency_key="")
+
+    def test_serializer_tagged_in_item(self):
+        task_options = wiji.task.TaskOptions()
+        task_options.task_id = "some-task-id"
+        task_options.args = (1, 2.5)
+        task_options.kwargs = {"nested": {"a": [1, 2, 3]}}
+
+        # a queue can hold items encoded by different serializers.
+        serializers = [
+            wiji.serializer.JsonSerializer(),
+            wiji.serializer.PickleSerializer(),
+            wiji.serializer.MarshalSerializer(),
+        ]
+        codecs = []
+        for the_serializer in serializers:
+            item = wiji.protocol.Protocol(
+                version=2, task_options=task_options, the_serializer=the_serializer
+            ).encode()
+            envelope = wiji.protocol.Protocol.decode(item)
+            codecs.append(envelope.codec)
+            envelope.decode_body(the_serializer=the_serializer)
+            self.assertEqual(list(envelope.args), [1, 2.5])
+            self.assertEqual(envelope.kwargs, {"nested": {"a": [1, 2, 3]}})
+        self.assertEqual(codecs, [1, 2, 3])
+
+    def test_serializer_not_allowed(self):
+        task_options = wiji.task.TaskOptions()
+        task_options.args = (1, 2.5)
+        item = wiji.protocol.Protocol(
+            version=2, task_options=task_options, the_serializer=wiji.serializer.PickleSerializer()
+        ).encode()
+        # pickle is not registered, so only a caller that hands over a pickle serializer decodes the body.
+        for the_serializer in [None, wiji.serializer.JsonSerializer()]:
+            envelope = wiji.protocol.Protocol.decode(item)
+            with self.assertRaises(ValueError) as raised_exception:
+                envelope.decode_body(the_serializer=the_serializer)
+            self.assertIn(
+                "no serializer is registered with `codec_id`: 2", str(raised_exception.exception)
+            )
+            self.assertIsNotNone(envelope._body)
+
+    def test_serializer_needs_version_2(self):
+        with self.assertRaises(ValueError) as raised_exception:
+            wiji.protocol.Protocol(
+                version=1,
+                task_options=wiji.task.TaskOptions(),
+                the_serializer=wiji.serializer.PickleSerializer(),
+            )
+        self.assertIn(
+            "version 1 of the protocol only supports the `json` serializer",
+            str(raised_exception.exception),
+        )
+
+    def test_unknown_codec(self):
+        class UnregisteredSerializer(wiji.serializer.JsonSerializer):
+            codec_id = 250
+
+        item = wiji.protocol.Protocol(
+            version=2, task_options=wiji.task.TaskOptions(), the_serializer=UnregisteredSerializer()
+        ).encode()
+        # the header can still be decoded, which lets a worker report on the task.
+        envelope = wiji.protocol.Protocol.decode(item)
+        self.assertEqual(envelope.codec, 250)
+        with self.assertRaises(ValueError) as raised_exception:
+            envelope.args
+        self.assertIn(
+            "no serializer is registered with `codec_id`: 250", str(raised_exception.exception)
+        )
+
+    def test_compression_flagged_in_item(self):
+        task_options = wiji.task.TaskOptions()
+        task_options.args = ("x" * 10_000,)
+        the_compression = wiji.compression.Compression(codec="lzma", threshold=1_000)
+        item = wiji.protocol.Protocol(
+            version=2, task_options=task_options, the_compression=the_compression
+        ).encode()
+        self.assertLess(len(item), 1_000)
+
+        # workers decompress regardless of their own configuration.
+        envelope = wiji.protocol.Protocol.decode(item)
+        self.assertEqual(envelope.compression_codec, wiji.compression.CODECS["lzma"])
+        self.assertEqual(envelope.args, ["x" * 10_000])
+
+        # small items are not compressed.
+        task_options.args = ("x",)
+        item = wiji.protocol.Protocol(
+            version=2, task_options=task_options, the_compression=the_compression
+        ).encode()
+        envelope = wiji.protocol.Protocol.decode(item)
+        self.assertEqual(envelope.compression_codec, wiji.compression.NONE)
+        self.assertEqual(envelope.args, ["x"])
+
+        with self.assertRaises(ValueError) as raised_exception:
+            wiji.protocol.Protocol(
+                version=1, task_options=task_options, the_compression=the_compression
+            )
+        self.assertIn(
+            "version 1 of the protocol does not support compression",
+            str(raised_exception.exception),
+        )
+
+    def test_claim_check(self):
+        task_options = wiji.task.TaskOptions()
+        task_options.task_id = "some-task-id"
+        task_options.kwargs = {"a": "x" * 10_000}
+        proto = wiji.protocol.Protocol(version=2, task_options=task_options)
+        flags, body = proto.encode_body()
+        item = proto.binary(flags=flags, body=body, claim_check="some-key")
+        self.assertLess(len(item), 1_000)
+
+        envelope = wiji.protocol.Protocol.decode(item)
+        self.assertEqual(envelope.task_id, "some-task-id")
+        self.assertEqual(envelope.claim_check, "some-key")
+        with self.assertRaises(ValueError) as raised_exception:
+            envelope.kwargs
+        self.assertIn("has not been fetched", str(raised_exception.exception))
+
+        envelope.resolve_claim_check(body)
+        self.assertEqual(envelope.kwargs, {"a": "x" * 10_000})
+
+    def test_decode_bytes_like_items(self):
+        task_options = wiji.task.TaskOptions()
+        task_options.kwargs = {"a": 1}
+        for version in [1, 2]:
+            item = wiji.protocol.Protocol(version=version, task_options=task_options).encode()
+            if isinstance(item, str):
+                item = item.encode("utf-8")
+            for bytes_like in [bytes(item), bytearray(item), memoryview(item)]:
+                envelope = wiji.protocol.Protocol.decode(bytes_like)
+                self.assertEqual(envelope.version, version)
+                self.assertEqual(envelope.kwargs, {"a": 1})
+
+    def test_body_not_copied_before_decoding(self):
+        received = []
+
+        class RecordingSerializer(wiji.serializer.MarshalSerializer):
+            codec_id = 201
+
+            def loads(self, data):
+                received.append(data)
+                return super().loads(data)
+
+        task_options = wiji.task.TaskOptions()
+        task_options.kwargs = {"a": 1}
+        item = wiji.protocol.Protocol(
+            version=2, task_options=task_options, the_serializer=RecordingSerializer()
+        ).encode()
+        wiji.serializer.register(RecordingSerializer())
+        self.addCleanup(wiji.serializer._REGISTRY.pop, 201)
+
+        envelope = wiji.protocol.Protocol.decode(item)
+        self.assertEqual(envelope.kwargs, {"a": 1})
+        # the serializer is handed a view into the item rather than a copy of the body.
+        self.assertIsInstance(received[0], memoryview)
+        self.assertIs(received[0].obj, item)
+        self.assertIsNone(envelope._body)
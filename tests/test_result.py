@@ -0,0 +1,155 @@
+# do not to pollute the global namespace.
+# see: https://python-packaging.readthedocs.io/en/latest/testing.html
+import os
+import time
+import asyncio
+import tempfile
+from unittest import TestCase
+
+import wiji
+
+
+class TestInMemoryResultBackend(TestCase):
+    """
+    run tests as:
+        python -m unittest discover -v -s .
+    run one testcase as:
+        python -m unittest -v tests.test_result.TestInMemoryResultBackend.test_something
+    """
+
+    def setUp(self):
+        self.backend = self._backend(ttl=60.0, maxsize=3)
+
+    def _backend(self, ttl, maxsize):
+        return wiji.result.InMemoryResultBackend(ttl=ttl, maxsize=maxsize)
+
+    @staticmethod
+    def _run(coro):
+        loop = asyncio.get_event_loop()
+        return loop.run_until_complete(coro)
+
+    def test_bad_args(self):
+        with self.assertRaises(ValueError):
+            self._backend(ttl=60, maxsize=3)
+        with self.assertRaises(ValueError):
+            self._backend(ttl=60.0, maxsize=0)
+
+    def test_set_get(self):
+        with self.assertRaises(KeyError):
+            self._run(self.backend.get("task-1"))
+        self._run(self.backend.set("task-1", b"one"))
+        self.assertEqual(self._run(self.backend.get("task-1")), b"one")
+        self._run(self.backend.set("task-1", b"uno"))
+        self.assertEqual(self._run(self.backend.get("task-1")), b"uno")
+
+    def test_maxsize(self):
+        for i in range(5):
+            self._run(self.backend.set("task-{0}".format(i), b"value"))
+        # the oldest are evicted first.
+        for i in range(2):
+            with self.assertRaises(KeyError):
+                self._run(self.backend.get("task-{0}".format(i)))
+        for i in range(2, 5):
+            self._run(self.backend.get("task-{0}".format(i)))
+
+    def test_ttl(self):
+        backend = self._backend(ttl=0.05, maxsize=3)
+        self._run(backend.set("task-1", b"one"))
+        self._run(backend.get("task-1"))
+        time.sleep(0.06)
+        with self.assertRaises(KeyError):
+            self._run(backend.get("task-1"))
+
+    def test_wait(self):
+        async def set_later():
+            await asyncio.sleep(0.05)
+            await self.backend.set("task-1", b"one")
+
+        async def wait():
+            start = time.monotonic()
+            value, _ = await asyncio.gather(self.backend.wait("task-1", timeout=5.0), set_later())
+            return value, time.monotonic() - start
+
+        value, waited = self._run(wait())
+        self.assertEqual(value, b"one")
+        # woken by the set, rather than by a poll.
+        self.assertLess(waited, 0.3)
+
+        with self.assertRaises(asyncio.TimeoutError):
+            self._run(self.backend.wait("task-2", timeout=0.05))
+
+
+class TestSqliteResultBackend(TestInMemoryResultBackend):
+    """
+    run tests as:
+        python -m unittest discover -v -s .
+    run one testcase as:
+        python -m unittest -v tests.test_result.TestSqliteResultBackend.test_something
+    """
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        super().setUp()
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def _backend(self, ttl, maxsize):
+        return wiji.result.SqliteResultBackend(
+            path=os.path.join(self.directory.name, "results.sqlite"),
+            ttl=ttl,
+            maxsize=maxsize,
+            poll_interval=0.02,
+        )
+
+    def test_shared_database(self):
+        # eg a producer and a worker in different processes.
+        other_backend = self._backend(ttl=60.0, maxsize=3)
+
+        async def set_later():
+            await asyncio.sleep(0.05)
+            await other_backend.set("task-1", b"one")
+
+        async def wait():
+            value, _ = await asyncio.gather(self.backend.wait("task-1", timeout=5.0), set_later())
+            return value
+
+        self.assertEqual(self._run(wait()), b"one")
+
+
+class TestTaskHandle(TestCase):
+    """
+    run tests as:
+        python -m unittest discover -v -s .
+    run one testcase as:
+        python -m unittest -v tests.test_result.TestTaskHandle.test_something
+    """
+
+    @staticmethod
+    def _run(coro):
+        loop = asyncio.get_event_loop()
+        return loop.run_until_complete(coro)
+
+    def test_result(self):
+        backend = wiji.result.InMemoryResultBackend()
+        the_serializer = wiji.serializer.JsonSerializer()
+
+        def encode(*args):
+            return wiji.result._encode_result(the_serializer, *args)
+
+        self._run(backend.set("task-1", encode(None, None, "task-2")))
+        self._run(backend.set("task-2", encode({"a": 1}, None, None)))
+        self._run(backend.set("task-3", encode(None, ValueError("bad value"), None)))
+
+        # a retried task gives the result of its retry.
+        handle = wiji.result.TaskHandle("task-1", backend, the_serializer)
+        self.assertEqual(self._run(handle.result(timeout=1.0)), {"a": 1})
+
+        handle = wiji.result.TaskHandle("task-3", backend, the_serializer)
+        with self.assertRaises(wiji.result.TaskExecutionError) as raised_exception:
+            self._run(handle.result(timeout=1.0))
+        self.assertIn("ValueError: bad value", str(raised_exception.exception))
+
+        handle = wiji.result.TaskHandle("task-4", None, the_serializer)
+        with self.assertRaises(ValueError):
+            self._run(handle.result(timeout=1.0))
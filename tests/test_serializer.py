@@ -0,0 +1,101 @@
+# do not to pollute the global namespace.
+# see: https://python-packaging.readthedocs.io/en/latest/testing.html
+from unittest import TestCase
+
+import wiji
+
+
+class TestSerializer(TestCase):
+    """
+    run tests as:
+        python -m unittest discover -v -s .
+    run one testcase as:
+        python -m unittest -v tests.test_serializer.TestSerializer.test_something
+    """
+
+    def tearDown(self):
+        wiji.serializer._REGISTRY.pop(200, None)
+
+    def test_round_trip(self):
+        obj = [[1, "two", 3.5, None, True], {"nested": {"numbers": list(range(100))}}]
+        for the_serializer in [
+            wiji.serializer.JsonSerializer(),
+            wiji.serializer.PickleSerializer(),
+            wiji.serializer.MarshalSerializer(),
+        ]:
+            data = the_serializer.dumps(obj)
+            self.assertIsInstance(data, bytes)
+            self.assertEqual(the_serializer.loads(data), obj)
+
+    def test_builtin_serializers_registered(self):
+        self.assertIsInstance(wiji.serializer.get(1), wiji.serializer.JsonSerializer)
+        # serializers that can execute arbitrary code, or that are tied to a python version, need to be registered explicitly.
+        for codec_id in [2, 3, 200]:
+            with self.assertRaises(ValueError) as raised_exception:
+                wiji.serializer.get(codec_id)
+            self.assertIn(
+                "no serializer is registered with `codec_id`: {0}".format(codec_id),
+                str(raised_exception.exception),
+            )
+
+        # neither does a task register its serializer.
+        class PickleTask(wiji.task.Task):
+            the_broker = wiji.broker.InMemoryBroker()
+            queue_name = "PickleTaskQueueRegistry"
+            the_serializer = wiji.serializer.PickleSerializer()
+
+            async def run(self, a):
+                return a
+
+        PickleTask()
+        with self.assertRaises(ValueError):
+            wiji.serializer.get(2)
+
+    def test_register(self):
+        class ReprSerializer(wiji.serializer.BaseSerializer):
+            codec_id = 200
+            name = "repr"
+
+            def dumps(self, obj):
+                return repr(obj).encode()
+
+            def loads(self, data):
+                import ast
+
+                return ast.literal_eval(str(data, "utf-8"))
+
+        wiji.serializer.register(ReprSerializer())
+        self.assertIsInstance(wiji.serializer.get(200), ReprSerializer)
+        # registering the same serializer again is allowed.
+        wiji.serializer.register(ReprSerializer())
+
+        class OtherSerializer(ReprSerializer):
+            pass
+
+        with self.assertRaises(ValueError) as raised_exception:
+            wiji.serializer.register(OtherSerializer())
+        self.assertIn(
+            "`codec_id` 200 is already used by the serializer: repr",
+            str(raised_exception.exception),
+        )
+
+    def test_bad_register_args(self):
+        with self.assertRaises(ValueError) as raised_exception:
+            wiji.serializer.register("json")
+        self.assertIn(
+            "`serializer` should be of type:: `wiji.serializer.BaseSerializer`",
+            str(raised_exception.exception),
+        )
+
+        class BadSerializer(wiji.serializer.JsonSerializer):
+            codec_id = 256
+
+        with self.assertRaises(ValueError) as raised_exception:
+            wiji.serializer.register(BadSerializer())
+        self.assertIn(
+            "`codec_id` should be an `int` from 0 to 255", str(raised_exception.exception)
+        )
+
+        with self.assertRaises(ValueError) as raised_exception:
+            wiji.serializer.PickleSerializer(protocol="4")
+        self.assertIn("`protocol` should be of type:: `int`", str(raised_exception.exception))
@@ -1,10 +1,13 @@
 # do not to pollute the global namespace.
 # see: https://python-packaging.readthedocs.io/en/latest/testing.html
 
+import os
 import json
+import time
 import asyncio
-import inspect
+import tempfile
 import datetime
+import tracemalloc
 from unittest import TestCase, mock
 
 import wiji
@@ -47,28 +50,6 @@ class TestTypeChecking(TestCase):
         loop = asyncio.get_event_loop()
         return loop.run_until_complete(coro)
 
-    def test_type_check_error(self):
-        def foo(a, b, *args, c, d=10, **kwargs):
-            pass
-
-        def carry_out_checking():
-            return wiji.task.Task._type_check(foo, 1, 4)
-
-        self.assertRaises(TypeError, carry_out_checking)
-        with self.assertRaises(TypeError) as raised_exception:
-            carry_out_checking()
-        self.assertIn("missing a required argument: 'c'", str(raised_exception.exception))
-
-    def test_type_check_success(self):
-        def foo(a, b, *args, c, d=10, **kwargs):
-            pass
-
-        def carry_out_checking():
-            return wiji.task.Task._type_check(foo, 1, 4, c="PP")
-
-        x = carry_out_checking()
-        self.assertTrue(x.signature == inspect.signature(foo))
-
     def test_type_check_task_error(self):
         class AdderTask(wiji.task.Task):
             the_broker = wiji.broker.InMemoryBroker()
@@ -132,6 +113,23 @@ class TestTaskOptions(TestCase):
             str(raised_exception.exception),
         )
 
+    def test_eta_and_expires(self):
+        start = time.time()
+        task_options = wiji.task.TaskOptions(eta=60.0, expires=120.0)
+        self.assertTrue(start + 60.0 <= task_options._eta_timestamp <= time.time() + 60.0)
+        self.assertAlmostEqual(task_options._expires_timestamp - task_options._eta_timestamp, 60.0)
+        # the ISO 8601 strings are derived from the timestamps.
+        self.assertAlmostEqual(
+            wiji.protocol.Protocol._from_isoformat(task_options.eta).timestamp(),
+            task_options._eta_timestamp,
+            places=5,
+        )
+        self.assertAlmostEqual(
+            wiji.protocol.Protocol._from_isoformat(task_options.expires).timestamp(),
+            task_options._expires_timestamp,
+            places=5,
+        )
+
 
 class TestTask(TestCase):
     """
@@ -227,49 +225,41 @@ class TestTask(TestCase):
     def test_retry(self):
         max_retries = 3
 
+        async def execute(current_retries):
+            # what the worker does for every execution of a task.
+            context = wiji.task.TaskContext(current_retries=current_retries)
+            wiji.task._TASK_CONTEXT.set(context)
+            await self.my_task.retry(
+                a=23, b=1481, task_options=wiji.task.TaskOptions(max_retries=max_retries)
+            )
+            return context
+
         self._run(self.my_task.delay(a=44, b=252_223))
+        self.assertIsNone(self.my_task.context)
         self.assertEqual(self.my_task.current_retries, 0)
         self.assertEqual(self.my_task.max_retries, 0)
-        self.assertEqual(self.my_task._RETRYING, False)
-
-        # retry_1
-        self._run(
-            self.my_task.retry(
-                a=23, b=1481, task_options=wiji.task.TaskOptions(max_retries=max_retries)
-            )
-        )
-        self.assertEqual(self.my_task.current_retries, 1)
-        self.assertEqual(self.my_task.max_retries, max_retries)
-        self.assertEqual(self.my_task._RETRYING, True)
-
-        # retry_2
-        self._run(
-            self.my_task.retry(
-                a=101, b=98, task_options=wiji.task.TaskOptions(max_retries=max_retries)
-            )
-        )
-        self.assertEqual(self.my_task.current_retries, 2)
-        self.assertEqual(self.my_task.max_retries, max_retries)
-        self.assertEqual(self.my_task._RETRYING, True)
-
-        # retry_3
-        self._run(
-            self.my_task.retry(
-                a=12, b=2, task_options=wiji.task.TaskOptions(max_retries=max_retries)
-            )
+        self.assertEqual(
+            json.loads(self._run(self.my_task.the_broker.dequeue(self.my_task.queue_name)))[
+                "task_options"
+            ]["current_retries"],
+            0,
         )
 
-        self.assertEqual(self.my_task.current_retries, 3)
-        self.assertEqual(self.my_task.max_retries, max_retries)
-        self.assertEqual(self.my_task._RETRYING, True)
+        # retry_1, retry_2 and retry_3; each from the execution of the previous retry.
+        for current_retries in range(max_retries):
+            context = self._run(execute(current_retries))
+            self.assertTrue(context.retrying)
+            task_options = json.loads(
+                self._run(self.my_task.the_broker.dequeue(self.my_task.queue_name))
+            )["task_options"]
+            self.assertEqual(task_options["current_retries"], current_retries + 1)
+            self.assertEqual(task_options["max_retries"], max_retries)
+        # the context of an execution does not leak out of it.
+        self.assertIsNone(self.my_task.context)
 
         # retry_4
         def retrial_4():
-            self._run(
-                self.my_task.retry(
-                    a=1513, b=783, task_options=wiji.task.TaskOptions(max_retries=max_retries)
-                )
-            )
+            self._run(execute(max_retries))
 
         self.assertRaises(wiji.task.WijiMaxRetriesExceededError, retrial_4)
         with self.assertRaises(wiji.task.WijiMaxRetriesExceededError) as raised_exception:
@@ -278,7 +268,38 @@ class TestTask(TestCase):
             "has reached its max_retries count of: {max_retries}".format(max_retries=max_retries),
             str(raised_exception.exception),
         )
-        self.assertEqual(self.my_task._RETRYING, False)
+        self.assertEqual(self.my_task.the_broker._llen(self.my_task.queue_name), 0)
+
+    def test_concurrent_executions_have_own_context(self):
+        seen = []
+
+        class RetryingTask(wiji.task.Task):
+            the_broker = wiji.broker.InMemoryBroker()
+            queue_name = "RetryingTaskQueueConcurrentContext"
+
+            async def run(self, a):
+                # let the other executions start before this one is done.
+                await asyncio.sleep(0.01 * (3 - a))
+                seen.append((a, self.context.task_id, self.current_retries))
+                if a == 0:
+                    await self.retry(a=a, task_options=wiji.task.TaskOptions(max_retries=5))
+
+        retrying_task = RetryingTask()
+
+        async def execute(a, current_retries):
+            wiji.task._TASK_CONTEXT.set(
+                wiji.task.TaskContext(task_id="task-{0}".format(a), current_retries=current_retries)
+            )
+            await retrying_task.run(a)
+            return retrying_task.context.retrying
+
+        retrying = self._run(asyncio.gather(execute(0, 2), execute(1, 0), execute(2, 4)))
+        self.assertEqual(retrying, [True, False, False])
+        self.assertEqual(sorted(seen), [(0, "task-0", 2), (1, "task-1", 0), (2, "task-2", 4)])
+        task_options = json.loads(
+            self._run(retrying_task.the_broker.dequeue(retrying_task.queue_name))
+        )["task_options"]
+        self.assertEqual(task_options["current_retries"], 3)
 
     def test_broker_check_called(self):
         with mock.patch("wiji.broker.InMemoryBroker.check", new=AsyncMock()) as mock_check:
@@ -292,3 +313,554 @@ class TestTask(TestCase):
             for _ in range(0, 5):
                 self._run(self.my_task.delay(31, 2))
             self.assertFalse(mock_check.mock.called)
+
+    def test_delay_many(self):
+        num_queued = self._run(
+            self.my_task.delay_many([((i,), {"b": 10}) for i in range(5)], batch_size=2)
+        )
+        self.assertEqual(num_queued, 5)
+        self.assertEqual(self.my_task.the_broker._llen(self.my_task.queue_name), 5)
+
+        items = [
+            json.loads(self._run(self.my_task.the_broker.dequeue(self.my_task.queue_name)))
+            for _ in range(5)
+        ]
+        self.assertEqual([item["task_options"]["args"] for item in items], [[i] for i in range(5)])
+        self.assertEqual(items[0]["task_options"]["kwargs"], {"b": 10})
+        self.assertEqual(len(set(item["task_options"]["task_id"] for item in items)), 5)
+
+    def test_delay_many_streams_in_batches(self):
+        consumed = []
+
+        async def calls():
+            for i in range(7):
+                consumed.append(i)
+                yield (), {"a": i, "b": 1, "task_options": wiji.task.TaskOptions(max_retries=2)}
+
+        batches = []
+
+        async def mock_enqueue_many(queue_name, items, etas=None):
+            # only one batch of calls has been taken off the stream at a time.
+            batches.append(len(items))
+            self.assertEqual(len(consumed), sum(batches))
+
+        with mock.patch.object(self.my_task.the_broker, "enqueue_many", new=mock_enqueue_many):
+            num_queued = self._run(self.my_task.delay_many(calls(), batch_size=3))
+        self.assertEqual(num_queued, 7)
+        self.assertEqual(batches, [3, 3, 1])
+
+    def test_delay_many_notifies_hooks_per_batch(self):
+        with mock.patch.object(
+            self.my_task.the_hook, "notify_many", new=AsyncMock()
+        ) as mock_hook, mock.patch.object(
+            self.my_task.the_ratelimiter, "notify_many", new=AsyncMock()
+        ) as mock_ratelimiter:
+            self._run(self.my_task.delay_many([((1, 2), {})] * 4, batch_size=2))
+
+        # QUEUEING and QUEUED once per batch.
+        self.assertEqual(mock_hook.mock.call_count, 4)
+        self.assertEqual(
+            [c[1]["state"] for c in mock_hook.mock.call_args_list],
+            [wiji.task.TaskState.QUEUEING, wiji.task.TaskState.QUEUED] * 2,
+        )
+        self.assertEqual(len(mock_hook.mock.call_args[1]["task_ids"]), 2)
+        self.assertEqual(mock_ratelimiter.mock.call_count, 2)
+
+    def test_delay_many_bad_args(self):
+        with self.assertRaises(ValueError) as raised_exception:
+            self._run(self.my_task.delay_many([((1, 2), {})], batch_size=0))
+        self.assertIn("`batch_size` should not be less than 1", str(raised_exception.exception))
+
+        with self.assertRaises(ValueError) as raised_exception:
+            self._run(self.my_task.delay_many([(1, 2)]))
+        self.assertIn("should be a pair of `(args, kwargs)`", str(raised_exception.exception))
+
+        with self.assertRaises(TypeError) as raised_exception:
+            self._run(self.my_task.delay_many([((1,), {})]))
+        self.assertIn("missing a required argument: 'b'", str(raised_exception.exception))
+
+        now = datetime.datetime.now(tz=datetime.timezone.utc)
+        with self.assertRaises(TypeError) as raised_exception:
+            self._run(self.my_task.delay_many([((now, now), {})]))
+        self.assertIn(
+            "All the task arguments passed into `delay_many` should be JSON serializable.",
+            str(raised_exception.exception),
+        )
+
+    def test_call_plan_is_reused(self):
+        self._run(self.my_task.delay(1, 2))
+        with mock.patch("wiji.task.inspect.signature") as mock_signature, mock.patch(
+            "wiji.protocol.Protocol._validate_protocol_args"
+        ) as mock_validate:
+            for _ in range(3):
+                self._run(self.my_task.delay(1, b=2))
+            self.assertFalse(mock_signature.called)
+            self.assertFalse(mock_validate.called)
+
+        # the plan still type-checks calls.
+        with self.assertRaises(TypeError) as raised_exception:
+            self._run(self.my_task.delay(1, 2, 3))
+        self.assertIn("too many positional arguments", str(raised_exception.exception))
+
+    def test_call_plan_run_takes_anything(self):
+        class AnyTask(wiji.task.Task):
+            the_broker = wiji.broker.InMemoryBroker()
+            queue_name = "AnyTaskQueue"
+
+            async def run(self, *args, **kwargs):
+                pass
+
+        any_task = AnyTask()
+        self.assertTrue(any_task._run_takes_anything)
+        self.assertFalse(self.my_task._run_takes_anything)
+        self._run(any_task.delay(1, 2, x=3))
+        self.assertEqual(any_task.the_broker._llen(any_task.queue_name), 1)
+
+    def test_retry_uses_fast_path(self):
+        with mock.patch.object(
+            self.my_task, "delay", new=AsyncMock()
+        ) as mock_delay, mock.patch.object(
+            self.my_task, "_delay", new=AsyncMock()
+        ) as mock_fast_delay:
+            self._run(
+                self.my_task.retry(a=1, b=2, task_options=wiji.task.TaskOptions(max_retries=1))
+            )
+        self.assertFalse(mock_delay.mock.called)
+        self.assertTrue(mock_fast_delay.mock.called)
+        task_options = mock_fast_delay.mock.call_args[0][0]
+        self.assertEqual(task_options.kwargs, {"a": 1, "b": 2})
+
+        with self.assertRaises(TypeError):
+            self._run(self.my_task.retry(a=1, task_options=wiji.task.TaskOptions(max_retries=5)))
+
+    def test_protocol_version(self):
+        class AdderTask(wiji.task.Task):
+            the_broker = wiji.broker.InMemoryBroker()
+            queue_name = "AdderTaskQueueProtocolVersion"
+            protocol_version = 2
+
+            async def run(self, a, b):
+                return a + b
+
+        adder_task = AdderTask()
+        self._run(adder_task.delay(1, b=2))
+        self._run(adder_task.delay_many([((3, 4), {})]))
+        for _ in range(2):
+            item = self._run(adder_task.the_broker.dequeue(adder_task.queue_name))
+            self.assertIsInstance(item, bytes)
+            self.assertEqual(wiji.protocol.Protocol.decode(item).version, 2)
+
+        # the broker's version is used if the task does not set its own.
+        broker = wiji.broker.InMemoryBroker()
+        broker.protocol_version = 2
+
+        class BrokerVersionTask(wiji.task.Task):
+            the_broker = broker
+            queue_name = "BrokerVersionTaskQueue"
+
+            async def run(self, a, b):
+                return a + b
+
+        broker_version_task = BrokerVersionTask()
+        self._run(broker_version_task.delay(1, b=2))
+        item = self._run(broker.dequeue(broker_version_task.queue_name))
+        self.assertIsInstance(item, bytes)
+
+    def test_bad_protocol_version(self):
+        class AdderTask(wiji.task.Task):
+            the_broker = wiji.broker.InMemoryBroker()
+            queue_name = "AdderTaskQueueBadProtocolVersion"
+            protocol_version = 7
+
+            async def run(self, a, b):
+                return a + b
+
+        with self.assertRaises(ValueError) as raised_exception:
+            AdderTask()
+        self.assertIn("`protocol_version` should be one of", str(raised_exception.exception))
+
+    def test_serializer(self):
+        class AdderTask(wiji.task.Task):
+            the_broker = wiji.broker.InMemoryBroker()
+            queue_name = "AdderTaskQueueSerializer"
+            the_serializer = wiji.serializer.PickleSerializer()
+
+            async def run(self, a, b):
+                return a + b
+
+        adder_task = AdderTask()
+        self._run(adder_task.delay(1, b=2))
+        item = self._run(adder_task.the_broker.dequeue(adder_task.queue_name))
+        # serializers other than JSON use version 2 even though the broker is on version 1.
+        envelope = wiji.protocol.Protocol.decode(item)
+        self.assertEqual(envelope.version, 2)
+        self.assertEqual(envelope.codec, wiji.serializer.PickleSerializer.codec_id)
+        envelope.decode_body(the_serializer=adder_task.the_serializer)
+        self.assertEqual(list(envelope.args), [1])
+        self.assertEqual(envelope.kwargs, {"b": 2})
+
+        with self.assertRaises(TypeError) as raised_exception:
+            self._run(adder_task.delay(lambda: 1, b=2))
+        self.assertIn("should be `pickle` serializable", str(raised_exception.exception))
+
+    def test_compression(self):
+        broker = wiji.broker.InMemoryBroker()
+        broker.the_compression = wiji.compression.Compression(threshold=100)
+
+        class AdderTask(wiji.task.Task):
+            the_broker = broker
+            queue_name = "AdderTaskQueueCompression"
+
+            async def run(self, a, b):
+                return a + b
+
+        adder_task = AdderTask()
+        self._run(adder_task.delay("a" * 1_000, b="b"))
+        item = self._run(broker.dequeue(adder_task.queue_name))
+        # the broker's compression is used and needs version 2.
+        self.assertIsInstance(item, bytes)
+        self.assertLess(len(item), 1_000)
+        self.assertEqual(wiji.protocol.Protocol.decode(item).args, ["a" * 1_000])
+        self.assertEqual(broker.the_compression.metrics()["compressed"], 1)
+
+        class VersionOneTask(AdderTask):
+            protocol_version = 1
+
+        with self.assertRaises(ValueError) as raised_exception:
+            VersionOneTask()
+        self.assertIn(
+            "`protocol_version` 1 does not support compression", str(raised_exception.exception)
+        )
+
+        class BadCompressionTask(AdderTask):
+            the_compression = "zlib"
+
+        with self.assertRaises(ValueError) as raised_exception:
+            BadCompressionTask()
+        self.assertIn(
+            "`the_compression` should be of type:: `None` or `wiji.compression.Compression`",
+            str(raised_exception.exception),
+        )
+
+    def test_blob_store(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+
+        class AdderTask(wiji.task.Task):
+            the_broker = wiji.broker.InMemoryBroker()
+            queue_name = "AdderTaskQueueBlobStore"
+            the_blob_store = wiji.blobstore.FileSystemBlobStore(
+                directory=directory.name, threshold=1_000
+            )
+
+            async def run(self, a, b):
+                return a + b
+
+        adder_task = AdderTask()
+        self._run(adder_task.delay("a" * 10_000, b="b"))
+        self._run(adder_task.delay_many([(("a" * 10_000,), {"b": "b"}), (("a",), {"b": "b"})]))
+
+        items = [self._run(adder_task.the_broker.dequeue(adder_task.queue_name)) for _ in range(3)]
+        envelopes = [wiji.protocol.Protocol.decode(item) for item in items]
+        # only a reference to the large bodies is sent through the broker, and identical bodies are stored once.
+        self.assertTrue(all(len(item) < 1_000 for item in items))
+        self.assertEqual(envelopes[0].claim_check, envelopes[1].claim_check)
+        self.assertIsNone(envelopes[2].claim_check)
+        self.assertEqual(len(os.listdir(directory.name)), 1)
+        self.assertEqual(adder_task.the_blob_store.metrics()["deduplicated"], 1)
+
+        body = self._run(adder_task.the_blob_store.get(envelopes[0].claim_check))
+        envelopes[0].resolve_claim_check(body)
+        self.assertEqual(envelopes[0].args, ["a" * 10_000])
+
+        class VersionOneTask(AdderTask):
+            protocol_version = 1
+
+        with self.assertRaises(ValueError) as raised_exception:
+            VersionOneTask()
+        self.assertIn(
+            "`protocol_version` 1 does not support a blob store", str(raised_exception.exception)
+        )
+
+    def test_large_items_encoded_off_loop(self):
+        class AdderTask(wiji.task.Task):
+            the_broker = wiji.broker.InMemoryBroker()
+            queue_name = "AdderTaskQueueOffload"
+            the_offload = wiji.offload.Offload(threshold=1_000)
+
+            async def run(self, a, b):
+                return a + b
+
+        adder_task = AdderTask()
+        # the size of an item is estimated from its args and kwargs; so even the first large item is offloaded.
+        self._run(adder_task.delay("a" * 5_000, b="b"))
+        self.assertEqual(adder_task.the_offload.metrics()["encode_offloaded"], 1)
+        self._run(adder_task.delay("a", b="b"))
+        self.assertEqual(adder_task.the_offload.metrics()["encode_inline"], 1)
+        self._run(adder_task.delay_many([(("a",), {"b": "b"}), ((), {"a": ["a" * 999], "b": "b"})]))
+        self._run(adder_task.delay_many([(("a",), {"b": "b"})]))
+        self.assertEqual(
+            adder_task.the_offload.metrics(),
+            {"decode_inline": 0, "decode_offloaded": 0, "encode_inline": 2, "encode_offloaded": 2},
+        )
+        for _ in range(5):
+            self.assertIn(
+                "task_options", self._run(adder_task.the_broker.dequeue(adder_task.queue_name))
+            )
+
+    def test_delay_allocation_budget(self):
+        """
+        the memory allocated while queuing a task stays within a budget; so that extra per-task copies get noticed.
+        """
+
+        class AdderTask(wiji.task.Task):
+            the_broker = wiji.broker.InMemoryBroker()
+            queue_name = "AdderTaskQueueAllocationBudget"
+            loglevel = "ERROR"
+
+            async def run(self, a, b):
+                return a + b
+
+        adder_task = AdderTask()
+        # a loop of its own, so that tasks left over by other tests do not allocate while we measure.
+        # debug mode, which other tests can switch on via PYTHONASYNCIODEBUG, records a traceback for every callback.
+        loop = asyncio.new_event_loop()
+        loop.set_debug(False)
+        try:
+            for i in range(20):
+                # warm up caches, eg of the task id generator and the broker's queue.
+                loop.run_until_complete(adder_task.delay(i, b=2))
+
+            tracemalloc.start()
+            try:
+                tracemalloc.clear_traces()
+                loop.run_until_complete(adder_task.delay(1, b=2))
+                _, peak = tracemalloc.get_traced_memory()
+            finally:
+                tracemalloc.stop()
+        finally:
+            loop.close()
+        self.assertLess(peak, 8_000)
+
+    def test_thread_execution_mode(self):
+        class BlockingTask(wiji.task.Task):
+            the_broker = wiji.broker.InMemoryBroker()
+            queue_name = "BlockingTaskQueueThreadMode"
+            execution_mode = "thread"
+            thread_pool_name = "TestTaskThreadMode"
+            thread_pool_size = 2
+
+            def run(self, a, b):
+                return a + b
+
+        blocking_task = BlockingTask()
+        self.assertEqual(self._run(blocking_task(1, b=2)), 3)
+        # the type of the args is still checked when queuing.
+        with self.assertRaises(TypeError):
+            self._run(blocking_task.delay(1))
+        self._run(blocking_task.delay(1, b=2))
+
+        class AsyncBlockingTask(BlockingTask):
+            async def run(self, a, b):
+                return a + b
+
+        with self.assertRaises(ValueError) as raised_exception:
+            AsyncBlockingTask()
+        self.assertIn("should be a plain function", str(raised_exception.exception))
+
+        class SyncTask(BlockingTask):
+            execution_mode = "async"
+
+        with self.assertRaises(ValueError) as raised_exception:
+            SyncTask()
+        self.assertIn("should be a python coroutine", str(raised_exception.exception))
+
+        class BadModeTask(BlockingTask):
+            execution_mode = "fibers"
+
+        with self.assertRaises(ValueError) as raised_exception:
+            BadModeTask()
+        self.assertIn("`execution_mode` should be one of", str(raised_exception.exception))
+
+        class ResizedPoolTask(BlockingTask):
+            thread_pool_size = 3
+
+        with self.assertRaises(ValueError) as raised_exception:
+            ResizedPoolTask()
+        self.assertIn("already exists with a size of: 2", str(raised_exception.exception))
+
+    def test_default_thread_pools(self):
+        """
+        tasks that do not name their thread pool share one per size; they can ask for different sizes in any order.
+        """
+
+        class SmallPoolTask(wiji.task.Task):
+            the_broker = wiji.broker.InMemoryBroker()
+            queue_name = "SmallPoolTaskQueue"
+            execution_mode = "thread"
+            thread_pool_size = 2
+
+            def run(self, a, b):
+                return a + b
+
+        class LargePoolTask(SmallPoolTask):
+            thread_pool_size = 5
+
+        small_pool_task = SmallPoolTask()
+        large_pool_task = LargePoolTask()
+        self.assertIsNot(small_pool_task._thread_pool, large_pool_task._thread_pool)
+        self.assertIs(SmallPoolTask()._thread_pool, small_pool_task._thread_pool)
+        self.assertEqual(large_pool_task._thread_pool._max_workers, 5)
+        self.assertEqual(self._run(large_pool_task(1, b=2)), 3)
+
+    def test_delay_returns_handle(self):
+        handle = self._run(self.my_task.delay(a=1, b=2))
+        task_options = json.loads(
+            self._run(self.my_task.the_broker.dequeue(self.my_task.queue_name))
+        )["task_options"]
+        self.assertEqual(handle.task_id, task_options["task_id"])
+        # the task does not have a result backend.
+        with self.assertRaises(ValueError):
+            self._run(handle.result(timeout=1.0))
+
+        class BadResultBackendTask(wiji.task.Task):
+            the_broker = wiji.broker.InMemoryBroker()
+            queue_name = "BadResultBackendTaskQueue"
+            the_result_backend = "sqlite"
+
+            async def run(self, a, b):
+                return a + b
+
+        with self.assertRaises(ValueError) as raised_exception:
+            BadResultBackendTask()
+        self.assertIn(
+            "`the_result_backend` should be of type:: `None` or `wiji.result.BaseResultBackend`",
+            str(raised_exception.exception),
+        )
+
+    def test_dedup(self):
+        class DedupTask(wiji.task.Task):
+            the_broker = wiji.broker.InMemoryBroker()
+            queue_name = "DedupTaskQueue"
+            the_dedup = wiji.dedup.Dedup()
+
+            async def run(self, a, b):
+                return a + b
+
+        dedup_task = DedupTask()
+
+        async def delay(key):
+            return await dedup_task.delay(
+                a=1, b=2, task_options=wiji.task.TaskOptions(idempotency_key=key)
+            )
+
+        handle = self._run(delay("order-1"))
+        # duplicates are not queued and get the handle of the task that they duplicate.
+        self.assertEqual(self._run(delay("order-1")).task_id, handle.task_id)
+        self.assertNotEqual(self._run(delay("order-2")).task_id, handle.task_id)
+
+        def call(key):
+            return (1, 2), {"task_options": wiji.task.TaskOptions(idempotency_key=key)}
+
+        calls = [call("order-2"), call("order-3"), call("order-3"), ((1, 2), {})]
+        self.assertEqual(self._run(dedup_task.delay_many(calls)), 2)
+        self.assertEqual(len(dedup_task.the_broker.store[dedup_task.queue_name]), 4)
+        self.assertEqual(dedup_task.the_dedup.metrics()["suppressed_queued"], 3)
+
+        # a task that fails to be queued can be queued again.
+        async def mock_enqueue(*args, **kwargs):
+            raise Exception("broker is down")
+
+        with mock.patch.object(dedup_task.the_broker, "enqueue", new=mock_enqueue):
+            with self.assertRaises(wiji.task.TaskQueueingError):
+                self._run(delay("order-4"))
+        self.assertIsNotNone(self._run(delay("order-4")))
+        self.assertEqual(len(dedup_task.the_broker.store[dedup_task.queue_name]), 5)
+
+        # a task is queued, rather than lost, if the dedup store can not be reached.
+        async def mock_claim(*args, **kwargs):
+            raise Exception("dedup store is down")
+
+        with mock.patch.object(dedup_task.the_dedup, "claim", new=mock_claim):
+            self.assertIsNotNone(self._run(delay("order-1")))
+        self.assertEqual(len(dedup_task.the_broker.store[dedup_task.queue_name]), 6)
+
+        class BadDedupTask(wiji.task.Task):
+            the_broker = wiji.broker.InMemoryBroker()
+            queue_name = "BadDedupTaskQueue"
+            the_dedup = "dedup"
+
+            async def run(self, a, b):
+                return a + b
+
+        with self.assertRaises(ValueError) as raised_exception:
+            BadDedupTask()
+        self.assertIn(
+            "`the_dedup` should be of type:: `None` or `wiji.dedup.Dedup`",
+            str(raised_exception.exception),
+        )
+
+    def test_task_id_generator(self):
+        class CountingGenerator(wiji.ids.BaseTaskIdGenerator):
+            def __init__(self):
+                self.count = 0
+
+            def generate(self):
+                self.count += 1
+                return "task-{0}".format(self.count)
+
+        class AdderTask(wiji.task.Task):
+            the_broker = wiji.broker.InMemoryBroker()
+            queue_name = "AdderTaskQueueTaskIdGenerator"
+            the_task_id_generator = CountingGenerator()
+
+            async def run(self, a, b):
+                return a + b
+
+        adder_task = AdderTask()
+        self._run(adder_task.delay(1, b=2))
+        self._run(adder_task.delay_many([((3,), {"b": 4})]))
+        task_ids = [
+            json.loads(self._run(adder_task.the_broker.dequeue(adder_task.queue_name)))[
+                "task_options"
+            ]["task_id"]
+            for _ in range(2)
+        ]
+        self.assertEqual(task_ids, ["task-1", "task-2"])
+
+        class BadGeneratorTask(AdderTask):
+            the_task_id_generator = "uuid4"
+
+        with self.assertRaises(ValueError) as raised_exception:
+            BadGeneratorTask()
+        self.assertIn(
+            "`the_task_id_generator` should be of type:: `None` or `wiji.ids.BaseTaskIdGenerator`",
+            str(raised_exception.exception),
+        )
+
+    def test_bad_serializer(self):
+        class AdderTask(wiji.task.Task):
+            the_broker = wiji.broker.InMemoryBroker()
+            queue_name = "AdderTaskQueueBadSerializer"
+            the_serializer = "pickle"
+
+            async def run(self, a, b):
+                return a + b
+
+        with self.assertRaises(ValueError) as raised_exception:
+            AdderTask()
+        self.assertIn(
+            "`the_serializer` should be of type:: `None` or `wiji.serializer.BaseSerializer`",
+            str(raised_exception.exception),
+        )
+
+        class VersionOneTask(AdderTask):
+            the_serializer = wiji.serializer.MarshalSerializer()
+            protocol_version = 1
+
+        with self.assertRaises(ValueError) as raised_exception:
+            VersionOneTask()
+        self.assertIn(
+            "`protocol_version` 1 only supports the `json` serializer",
+            str(raised_exception.exception),
+        )
@@ -2,9 +2,13 @@
 # see: https://python-packaging.readthedocs.io/en/latest/testing.html
 
 import os
+import time
 import uuid
 import json
 import asyncio
+import hashlib
+import tempfile
+import tracemalloc
 from unittest import TestCase, mock
 
 import wiji
@@ -44,6 +48,20 @@ class ExampleAdderRedisTask(wiji.task.Task):
         return res
 
 
+class ExampleHashingProcessTask(wiji.task.Task):
+    the_broker = wiji.broker.InMemoryBroker()
+    queue_name = "{0}-ExampleHashingProcessTaskQueue".format(uuid.uuid4())
+    execution_mode = "process"
+    process_pool_name = "TestWorkerProcessMode"
+    process_pool_size = 1
+
+    def run(self, data):
+        digest = data.encode()
+        for _ in range(2_000):
+            digest = hashlib.sha256(digest).digest()
+        return os.getpid(), self.context.task_id, len(data)
+
+
 class TestWorker(TestCase):
     """
     run tests as:
@@ -101,16 +119,57 @@ class TestWorker(TestCase):
     def test_success_instantiation(self):
         wiji.Worker(the_task=self.myTask, worker_id="myWorkerID1")
 
-    def test_retries(self):
-        res = wiji.Worker._retry_after(-110)
-        self.assertEqual(res, 30)
+    def test_bad_concurrency_args(self):
+        with self.assertRaises(ValueError) as raised_exception:
+            wiji.Worker(the_task=self.myTask, concurrency="4")
+        self.assertIn("`concurrency` should be of type:: `int`", str(raised_exception.exception))
 
-        res = wiji.Worker._retry_after(5)
-        self.assertTrue(res > 60 * (2 ** 5))
+        with self.assertRaises(ValueError) as raised_exception:
+            wiji.Worker(the_task=self.myTask, concurrency=0)
+        self.assertIn("`concurrency` should not be less than 1", str(raised_exception.exception))
 
-        for i in [6, 7, 34]:
-            res = wiji.Worker._retry_after(i)
-            self.assertTrue(res > 16 * 60)
+    def test_bad_backoff_args(self):
+        with self.assertRaises(ValueError) as raised_exception:
+            wiji.Worker(the_task=self.myTask, the_backoff=object())
+        self.assertIn(
+            "`the_backoff` should be of type:: `None` or `wiji.backoff.BaseBackoff`",
+            str(raised_exception.exception),
+        )
+
+    def test_dequeue_error_backoff(self):
+        worker = wiji.Worker(the_task=self.myTask, worker_id="myWorkerID1")
+        self.myTask.synchronous_delay(a=21, b=535)
+
+        with mock.patch(
+            "{broker_path}.poll".format(broker_path=self.broker_path()),
+            new=AsyncMock(side_effect=[Exception("broker down"), None]),
+        ), mock.patch("wiji.worker.asyncio.sleep", new=AsyncMock()) as mock_sleep:
+            # stop the consume loop after the two polls above
+            original_idle = worker.the_backoff.idle
+
+            def idle(waited):
+                worker.SHOULD_SHUT_DOWN = True
+                return original_idle(waited)
+
+            worker.the_backoff.idle = idle
+            self._run(worker.consume_tasks(TESTING=True))
+
+        # the first sleep after a dequeue error is sub-second.
+        self.assertTrue(mock_sleep.mock.call_args_list[0][0][0] < 1.0)
+        self.assertEqual(worker.the_backoff.metrics()["errors"], 1)
+        self.assertEqual(worker.the_backoff.metrics()["empty_polls"], 1)
+
+    def test_idle_backoff_resets_when_work_arrives(self):
+        the_backoff = wiji.backoff.SimpleBackoff()
+        worker = wiji.Worker(the_task=self.myTask, worker_id="myWorkerID1", the_backoff=the_backoff)
+        for _ in range(4):
+            the_backoff.idle(waited=0.0)
+        self.assertTrue(the_backoff.metrics()["idle_delay"] > the_backoff.initial_idle_delay)
+
+        self.myTask.synchronous_delay(a=21, b=535)
+        self._run(worker.consume_tasks(TESTING=True))
+        self.assertEqual(the_backoff.metrics()["idle_delay"], the_backoff.initial_idle_delay)
+        self.assertEqual(the_backoff.metrics()["successes"], 1)
 
     def test_consume_tasks(self):
         worker = wiji.Worker(the_task=self.myTask, worker_id="myWorkerID1")
@@ -160,6 +219,19 @@ class TestWorker(TestCase):
 
             self.assertTrue(mock_ratelimit.mock.called)
 
+    def test_ratelimit_called_before_dequeue(self):
+        worker = wiji.Worker(the_task=self.myTask, worker_id="myWorkerID1")
+        self.myTask.synchronous_delay(a=21, b=535)
+        queued_while_limited = []
+
+        async def limit():
+            queued_while_limited.append(self.myTask.the_broker._llen(self.myTask.queue_name))
+
+        with mock.patch.object(self.myTask.the_ratelimiter, "limit", new=limit):
+            self._run(worker.consume_tasks(TESTING=True))
+        # the item is still on the broker while the worker waits on the ratelimiter.
+        self.assertEqual(queued_while_limited, [1])
+
     def test_broker_dequeue_called(self):
         item = {
             "version": 1,
@@ -175,17 +247,34 @@ class TestWorker(TestCase):
         }
 
         with mock.patch(
-            "{broker_path}.dequeue".format(broker_path=self.broker_path()), new=AsyncMock()
-        ) as mock_dequeue:
-            mock_dequeue.mock.return_value = json.dumps(item)
+            "{broker_path}.poll".format(broker_path=self.broker_path()), new=AsyncMock()
+        ) as mock_poll:
+            mock_poll.mock.return_value = json.dumps(item)
             worker = wiji.Worker(the_task=self.myTask, worker_id="myWorkerID1")
             # queue and consume task
             self.myTask.synchronous_delay(a=21, b=535)
             dequeued_item = self._run(worker.consume_tasks(TESTING=True))
             self.assertEqual(dequeued_item["version"], 1)
 
-            self.assertTrue(mock_dequeue.mock.called)
-            self.assertEqual(mock_dequeue.mock.call_args[1], {"queue_name": self.myTask.queue_name})
+            self.assertTrue(mock_poll.mock.called)
+            self.assertEqual(
+                mock_poll.mock.call_args[1],
+                {"queue_name": self.myTask.queue_name, "timeout": worker._dequeue_timeout},
+            )
+
+    def test_idle_worker_notices_shutdown(self):
+        worker = wiji.Worker(the_task=self.myTask, worker_id="myWorkerID1")
+        self.myTask.drain_duration = 0.2
+
+        async def call_worker_shutdown():
+            await asyncio.sleep(0.2)
+            await worker.shutdown()
+
+        start = time.monotonic()
+        self._run(asyncio.gather(worker.consume_tasks(TESTING=False), call_worker_shutdown()))
+        # the worker is not stuck waiting on an empty queue.
+        self.assertTrue(time.monotonic() - start < worker._dequeue_timeout + 1.0)
+        self.assertTrue(worker.SUCCESFULLY_SHUT_DOWN)
 
     def test_eta_respected(self):
         kwargs = {"a": 7121, "b": 6122}
@@ -198,16 +287,378 @@ class TestWorker(TestCase):
             self.assertEqual(dequeued_item["version"], 1)
             self.assertFalse(mock_task_delay.mock.called)
 
-        # re-queuing is carried out
+        # task is due beyond the worker's horizon, it is handed back to the broker unchanged.
         worker = wiji.Worker(the_task=self.myTask, worker_id="myWorkerID1")
-        self.myTask.synchronous_delay(
-            a=kwargs["a"], b=kwargs["b"], tas_options=wiji.task.TaskOptions(eta=788.99)
-        )
-        with mock.patch("wiji.task.Task.delay", new=AsyncMock()) as mock_task_delay:
+        with mock.patch.object(self.myTask.the_broker, "delayed_delivery", False):
+            self.myTask.synchronous_delay(
+                a=kwargs["a"], b=kwargs["b"], tas_options=wiji.task.TaskOptions(eta=788.99)
+            )
+        with mock.patch("wiji.task.Task.delay", new=AsyncMock()) as mock_task_delay, mock.patch(
+            "wiji.worker.Worker.run_task", new=AsyncMock()
+        ) as mock_run_task, mock.patch.object(self.myTask.the_broker, "delayed_delivery", False):
             dequeued_item = self._run(worker.consume_tasks(TESTING=True))
             self.assertEqual(dequeued_item["version"], 1)
-            self.assertTrue(mock_task_delay.mock.called)
-            self.assertEqual(mock_task_delay.mock.call_args[1], kwargs)
+            self.assertFalse(mock_task_delay.mock.called)
+            self.assertFalse(mock_run_task.mock.called)
+            self.assertEqual(len(worker._delayed), 0)
+            self.assertEqual(self.myTask.the_broker._llen(self.myTask.queue_name), 1)
+
+            requeued_item = self._run(worker.consume_tasks(TESTING=True))
+            self.assertEqual(
+                requeued_item["task_options"]["task_id"], dequeued_item["task_options"]["task_id"]
+            )
+            self.assertEqual(
+                requeued_item["task_options"]["eta"], dequeued_item["task_options"]["eta"]
+            )
+
+    def test_eta_held_locally(self):
+        kwargs = {"a": 7121, "b": 6122}
+        worker = wiji.Worker(the_task=self.myTask, worker_id="myWorkerID1")
+        with mock.patch.object(self.myTask.the_broker, "delayed_delivery", False):
+            self.myTask.synchronous_delay(
+                a=kwargs["a"], b=kwargs["b"], task_options=wiji.task.TaskOptions(eta=0.6)
+            )
+            with mock.patch("wiji.task.Task.delay", new=AsyncMock()) as mock_task_delay, mock.patch(
+                "wiji.worker.Worker.run_task", new=AsyncMock()
+            ) as mock_run_task:
+                self._run(worker.consume_tasks(TESTING=True))
+                # the task is not yet due; it is neither executed nor re-queued
+                self.assertFalse(mock_task_delay.mock.called)
+                self.assertFalse(mock_run_task.mock.called)
+                self.assertEqual(len(worker._delayed), 1)
+                self.assertEqual(self.myTask.the_broker._llen(self.myTask.queue_name), 0)
+
+                # it is executed once due
+                self._run(asyncio.sleep(1.2))
+                self.assertTrue(mock_run_task.mock.called)
+                self.assertEqual(mock_run_task.mock.call_args[1]["a"], kwargs["a"])
+                self.assertEqual(len(worker._delayed), 0)
+
+    def test_eta_held_locally_handed_back_on_shutdown(self):
+        worker = wiji.Worker(the_task=self.myTask, worker_id="myWorkerID1")
+        with mock.patch.object(self.myTask.the_broker, "delayed_delivery", False):
+            self.myTask.synchronous_delay(a=1, b=2, task_options=wiji.task.TaskOptions(eta=60.0))
+            self._run(worker.consume_tasks(TESTING=True))
+            self.assertEqual(len(worker._delayed), 1)
+            self.assertEqual(self.myTask.the_broker._llen(self.myTask.queue_name), 0)
+
+            self.myTask.drain_duration = 0.2
+            self._run(worker.shutdown())
+            self.assertEqual(len(worker._delayed), 0)
+            self.assertEqual(self.myTask.the_broker._llen(self.myTask.queue_name), 1)
+
+    def test_far_future_task_not_cycled(self):
+        """
+        a task due past the horizon is handed back to the broker, but the worker backs off before dequeuing it again.
+        """
+        worker = wiji.Worker(the_task=self.myTask, worker_id="myWorkerID1")
+        enqueue = self.myTask.the_broker.enqueue
+        round_trips = []
+
+        async def counting_enqueue(*args, **kwargs):
+            round_trips.append(kwargs.get("item"))
+            return await enqueue(*args, **kwargs)
+
+        async def consume():
+            consumer = asyncio.ensure_future(worker.consume_tasks(TESTING=False))
+            await asyncio.sleep(2.0)
+            worker.SHOULD_SHUT_DOWN = True
+            await asyncio.wait_for(consumer, timeout=5.0)
+
+        with mock.patch.object(self.myTask.the_broker, "delayed_delivery", False):
+            self.myTask.synchronous_delay(a=1, b=2, task_options=wiji.task.TaskOptions(eta=3600.0))
+            with mock.patch.object(
+                self.myTask.the_broker, "enqueue", new=counting_enqueue
+            ), mock.patch("wiji.worker.Worker.run_task", new=AsyncMock()) as mock_run_task:
+                self._run(consume())
+            self.assertFalse(mock_run_task.mock.called)
+
+        self.assertTrue(len(round_trips) >= 1)
+        self.assertTrue(len(round_trips) < 30)
+        self.assertTrue(worker.the_backoff.metrics()["empty_polls"] >= len(round_trips))
+        self.assertEqual(self.myTask.the_broker._llen(self.myTask.queue_name), 1)
+
+    def test_consume_mixed_protocol_versions(self):
+        worker = wiji.Worker(the_task=self.myTask, worker_id="myWorkerID1")
+        self.myTask.synchronous_delay(a=1, b=2)
+        with mock.patch.object(self.myTask, "protocol_version", 2):
+            self.myTask.synchronous_delay(a=3, b=4)
+
+        with mock.patch("wiji.worker.Worker.run_task", new=AsyncMock()) as mock_run_task:
+            dequeued_item = self._run(worker.consume_tasks(TESTING=True))
+            self.assertEqual(dequeued_item["version"], 1)
+            self.assertEqual(mock_run_task.mock.call_args[1]["a"], 1)
+
+            dequeued_item = self._run(worker.consume_tasks(TESTING=True))
+            self.assertEqual(dequeued_item["version"], 2)
+            self.assertEqual(dequeued_item["task_options"]["kwargs"], {"a": 3, "b": 4})
+            self.assertEqual(mock_run_task.mock.call_args[1]["a"], 3)
+            self.assertEqual(mock_run_task.mock.call_args[1]["b"], 4)
+
+    def test_eta_held_locally_protocol_version_2(self):
+        worker = wiji.Worker(the_task=self.myTask, worker_id="myWorkerID1")
+        with mock.patch.object(
+            self.myTask.the_broker, "delayed_delivery", False
+        ), mock.patch.object(self.myTask, "protocol_version", 2):
+            self.myTask.synchronous_delay(a=1, b=2, task_options=wiji.task.TaskOptions(eta=60.0))
+            self._run(worker.consume_tasks(TESTING=True))
+            self.assertEqual(len(worker._delayed), 1)
+            self.assertTrue(worker._delayed[0][0] > time.time() + 50)
+
+            self.myTask.drain_duration = 0.2
+            self._run(worker.shutdown())
+            # handed back unchanged.
+            self.assertEqual(self.myTask.the_broker._llen(self.myTask.queue_name), 1)
+            item = self._run(self.myTask.the_broker.dequeue(self.myTask.queue_name))
+            self.assertEqual(wiji.protocol.Protocol.decode(item).version, 2)
+
+    def test_expired_task_not_executed(self):
+        worker = wiji.Worker(the_task=self.myTask, worker_id="myWorkerID1")
+        self.myTask.synchronous_delay(a=1, b=2, task_options=wiji.task.TaskOptions(expires=0.0))
+        self._run(asyncio.sleep(0.01))
+
+        with mock.patch(
+            "wiji.worker.Worker.run_task", new=AsyncMock()
+        ) as mock_run_task, mock.patch(
+            "{broker_path}.done".format(broker_path=self.broker_path()), new=AsyncMock()
+        ) as mock_broker_done, mock.patch.object(
+            self.myTask.the_hook, "notify", new=AsyncMock()
+        ) as mock_hook_notify:
+            self._run(worker.consume_tasks(TESTING=True))
+            self.assertFalse(mock_run_task.mock.called)
+            self.assertEqual(
+                mock_broker_done.mock.call_args[1]["state"], wiji.task.TaskState.EXPIRED
+            )
+            self.assertEqual(
+                mock_hook_notify.mock.call_args[1]["state"], wiji.task.TaskState.EXPIRED
+            )
+
+    def test_body_not_decoded_until_executed(self):
+        worker = wiji.Worker(the_task=self.myTask, worker_id="myWorkerID1")
+        with mock.patch.object(
+            self.myTask.the_broker, "delayed_delivery", False
+        ), mock.patch.object(self.myTask, "protocol_version", 2):
+            self.myTask.synchronous_delay(a=1, b=2, task_options=wiji.task.TaskOptions(eta=0.3))
+            item = self._run(self.myTask.the_broker.dequeue(self.myTask.queue_name))
+            envelope = wiji.protocol.Protocol.decode(item)
+            worker._concurrency_slots = asyncio.Semaphore(1)
+            with mock.patch("wiji.worker.Worker.run_task", new=AsyncMock()) as mock_run_task:
+                self._run(worker._process_task(_dequeued_item=item, envelope=envelope))
+                # the task is held until due without its body been decoded.
+                self.assertIs(worker._delayed[0][2]["envelope"], envelope)
+                self.assertIsNotNone(envelope._body)
+
+                self._run(asyncio.sleep(0.6))
+                self.assertTrue(mock_run_task.mock.called)
+                self.assertEqual(mock_run_task.mock.call_args[1]["b"], 2)
+                self.assertIsNone(envelope._body)
+
+    def test_compressed_task_executed(self):
+        the_compression = wiji.compression.Compression(codec="zlib", threshold=0)
+        worker = wiji.Worker(the_task=self.myTask, worker_id="myWorkerID1")
+        with mock.patch.object(
+            self.myTask.the_broker, "delayed_delivery", False
+        ), mock.patch.object(self.myTask, "the_compression", the_compression):
+            self.myTask.synchronous_delay(a="x" * 5_000, b="y")
+            self.assertEqual(the_compression.metrics()["compressed"], 1)
+            with mock.patch("wiji.worker.Worker.run_task", new=AsyncMock()) as mock_run_task:
+                self._run(worker.consume_tasks(TESTING=True))
+                self.assertEqual(mock_run_task.mock.call_args[1]["a"], "x" * 5_000)
+            self.assertEqual(the_compression.metrics()["decompressed"], 1)
+
+    def test_only_allowed_serializers_decode(self):
+        """
+        a worker only decodes bodies that were encoded by its task's serializer or by a registered serializer.
+        """
+        task_options = wiji.task.TaskOptions()
+        task_options.task_id = "some-task-id"
+        task_options.kwargs = {"a": 1, "b": 2}
+        worker = wiji.Worker(the_task=self.myTask, worker_id="myWorkerID1")
+        worker._concurrency_slots = asyncio.Semaphore(1)
+
+        def process(the_serializer):
+            item = wiji.protocol.Protocol(
+                version=2, task_options=task_options, the_serializer=the_serializer
+            ).encode()
+            self._run(
+                worker._process_task(
+                    _dequeued_item=item, envelope=wiji.protocol.Protocol.decode(item)
+                )
+            )
+
+        with mock.patch("wiji.worker.Worker.run_task", new=AsyncMock()) as mock_run_task:
+            process(wiji.serializer.PickleSerializer())
+            self.assertFalse(mock_run_task.mock.called)
+
+            with mock.patch.object(
+                self.myTask, "the_serializer", wiji.serializer.PickleSerializer()
+            ):
+                process(wiji.serializer.PickleSerializer())
+                self.assertEqual(mock_run_task.mock.call_args[1]["b"], 2)
+
+            mock_run_task.mock.reset_mock()
+            wiji.serializer.register(wiji.serializer.MarshalSerializer())
+            self.addCleanup(
+                wiji.serializer._REGISTRY.pop, wiji.serializer.MarshalSerializer.codec_id
+            )
+            process(wiji.serializer.MarshalSerializer())
+            self.assertEqual(mock_run_task.mock.call_args[1]["b"], 2)
+
+    def test_claim_checked_task_executed(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        the_blob_store = wiji.blobstore.FileSystemBlobStore(directory=directory.name, threshold=0)
+        worker = wiji.Worker(the_task=self.myTask, worker_id="myWorkerID1")
+        with mock.patch.object(
+            self.myTask.the_broker, "delayed_delivery", False
+        ), mock.patch.object(self.myTask, "the_blob_store", the_blob_store):
+            self.myTask.synchronous_delay(a="x" * 5_000, b="y")
+            with mock.patch("wiji.worker.Worker.run_task", new=AsyncMock()) as mock_run_task:
+                self._run(worker.consume_tasks(TESTING=True))
+                self.assertEqual(mock_run_task.mock.call_args[1]["a"], "x" * 5_000)
+            self.assertEqual(the_blob_store.metrics()["gets"], 1)
+
+    def test_consume_memoryview_items(self):
+        """
+        brokers can hand back version 2 items as memoryviews.
+        """
+        task_options = wiji.task.TaskOptions()
+        task_options.kwargs = {"a": 21, "b": 535}
+        item = wiji.protocol.Protocol(version=2, task_options=task_options).encode()
+        self._run(
+            self.myTask.the_broker.enqueue(queue_name=self.myTask.queue_name, item=memoryview(item))
+        )
+        worker = wiji.Worker(the_task=self.myTask, worker_id="myWorkerID1")
+        with mock.patch("wiji.worker.Worker.run_task", new=AsyncMock()) as mock_run_task:
+            dequeued_item = self._run(worker.consume_tasks(TESTING=True))
+            self.assertEqual(dequeued_item["task_options"]["kwargs"], {"a": 21, "b": 535})
+            self.assertEqual(mock_run_task.mock.call_args[1]["b"], 535)
+
+    def test_large_items_decoded_off_loop(self):
+        the_offload = wiji.offload.Offload(threshold=1_000)
+        worker = wiji.Worker(the_task=self.myTask, worker_id="myWorkerID1")
+        with mock.patch.object(self.myTask, "the_offload", the_offload):
+            self.myTask.synchronous_delay(a="x" * 5_000, b="y")
+            self._run(worker.consume_tasks(TESTING=True))
+            self.assertEqual(the_offload.metrics()["decode_offloaded"], 1)
+
+            self.myTask.synchronous_delay(a="x", b="y")
+            self._run(worker.consume_tasks(TESTING=True))
+            self.assertEqual(the_offload.metrics()["decode_inline"], 1)
+
+            # only the body of version 2 items is large.
+            with mock.patch.object(self.myTask, "protocol_version", 2), mock.patch.object(
+                self.myTask.the_broker, "delayed_delivery", False
+            ):
+                self.myTask.synchronous_delay(a="x" * 5_000, b="y")
+                with mock.patch("wiji.worker.Worker.run_task", new=AsyncMock()) as mock_run_task:
+                    self._run(worker.consume_tasks(TESTING=True))
+                    self.assertEqual(mock_run_task.mock.call_args[1]["a"], "x" * 5_000)
+            self.assertEqual(the_offload.metrics()["decode_inline"], 2)
+            self.assertEqual(the_offload.metrics()["decode_offloaded"], 2)
+
+    def test_allocation_budget(self):
+        """
+        the memory allocated while executing a task stays within a budget, and none of it is kept after the task.
+        """
+
+        class AdderTask(wiji.task.Task):
+            the_broker = wiji.broker.InMemoryBroker()
+            queue_name = "{0}-AdderTaskQueueAllocationBudget".format(uuid.uuid4())
+            loglevel = "ERROR"
+
+            async def run(self, a, b):
+                return a + b
+
+        adder_task = AdderTask()
+        worker = wiji.Worker(the_task=adder_task, worker_id="myWorkerID1")
+
+        async def execute(num_tasks):
+            for i in range(num_tasks):
+                await adder_task.delay(i, b=2)
+            for _ in range(num_tasks):
+                await worker.consume_tasks(TESTING=True)
+
+        num_tasks = 100
+        wiji_files = [tracemalloc.Filter(True, os.path.join(os.path.dirname(wiji.__file__), "*"))]
+        # a loop of its own, so that tasks left over by other tests do not allocate while we measure.
+        # debug mode, which other tests can switch on via PYTHONASYNCIODEBUG, records a traceback for every callback.
+        loop = asyncio.new_event_loop()
+        loop.set_debug(False)
+        try:
+            # warm up caches, eg of the ratelimiter and the broker's queue.
+            loop.run_until_complete(execute(20))
+
+            tracemalloc.start()
+            try:
+                loop.run_until_complete(adder_task.delay(1, b=2))
+                tracemalloc.clear_traces()
+                loop.run_until_complete(worker.consume_tasks(TESTING=True))
+                _, peak = tracemalloc.get_traced_memory()
+
+                before = tracemalloc.take_snapshot().filter_traces(wiji_files)
+                loop.run_until_complete(execute(num_tasks))
+                after = tracemalloc.take_snapshot().filter_traces(wiji_files)
+            finally:
+                tracemalloc.stop()
+        finally:
+            loop.close()
+        self.assertLess(peak, 6_500)
+        kept = sum(stat.count_diff for stat in after.compare_to(before, "filename"))
+        self.assertLess(kept / num_tasks, 1)
+
+    def test_broker_delayed_delivery(self):
+        """
+        the worker does not check the eta of tasks dequeued from a broker with delayed delivery.
+        """
+        if not self.myTask.the_broker.delayed_delivery:
+            return
+
+        item = {
+            "version": 1,
+            "task_options": {
+                "task_id": "f5ceee05-5e41-4fc4-8e2e-d16aa6d67bff",
+                "eta": wiji.protocol.Protocol._eta_to_isoformat(3600.0),
+                "current_retries": 0,
+                "max_retries": 0,
+                "hook_metadata": "",
+                "args": [],
+                "kwargs": {"a": 21, "b": 535},
+            },
+        }
+        # the broker is the authority on when the task is due; here it is told that it is due now.
+        self._run(
+            self.myTask.the_broker.enqueue(
+                queue_name=self.myTask.queue_name, item=json.dumps(item), eta=None
+            )
+        )
+        worker = wiji.Worker(the_task=self.myTask, worker_id="myWorkerID1")
+        with mock.patch("wiji.worker.Worker.run_task", new=AsyncMock()) as mock_run_task:
+            self._run(worker.consume_tasks(TESTING=True))
+            self.assertTrue(mock_run_task.mock.called)
+            self.assertEqual(len(worker._delayed), 0)
+
+        # and a task queued via `delay` is not handed out until it is due.
+        self.myTask.synchronous_delay(a=1, b=2, task_options=wiji.task.TaskOptions(eta=3600.0))
+        items = self._run(
+            self.myTask.the_broker.dequeue_many(
+                queue_name=self.myTask.queue_name, max_items=1, timeout=0.1
+            )
+        )
+        self.assertEqual(items, [])
+
+    def test_bad_delayed_tasks_args(self):
+        with self.assertRaises(ValueError) as raised_exception:
+            wiji.Worker(the_task=self.myTask, max_delayed_tasks=-1)
+        self.assertIn(
+            "`max_delayed_tasks` should not be less than 0", str(raised_exception.exception)
+        )
+
+        with self.assertRaises(ValueError) as raised_exception:
+            wiji.Worker(the_task=self.myTask, delayed_tasks_horizon=5)
+        self.assertIn(
+            "`delayed_tasks_horizon` should be of type:: `float`", str(raised_exception.exception)
+        )
 
     def test_run_task_called(self):
         kwargs = {"a": 263_342, "b": 832_429}
@@ -246,7 +697,7 @@ class TestWorker(TestCase):
             task_options = json.loads(mock_broker_done.mock.call_args[1]["item"])["task_options"]
             self.assertEqual(task_options["kwargs"], kwargs)
             self.assertIsNotNone(task_options["task_id"])
-            self.assertEqual(len(task_options["task_id"]), 36)  # len of uuid4
+            self.assertEqual(len(task_options["task_id"]), 26)  # len of a ULID
 
     def test_task_no_chain(self):
         """
@@ -290,8 +741,9 @@ class TestWorker(TestCase):
         worker = wiji.Worker(the_task=MYAdderTask, worker_id="myWorkerID1")
         MYAdderTask.synchronous_delay(a=kwargs["a"], b=kwargs["b"])
 
+        # `retry` queues the task again via the `_delay` fast path.
         with mock.patch.object(
-            AdderTask, "delay", new=AsyncMock()
+            AdderTask, "_delay", new=AsyncMock()
         ) as mock_adder_delay, mock.patch.object(
             DividerTask, "delay", new=AsyncMock()
         ) as mock_divider_delay:
@@ -381,8 +833,9 @@ class TestWorker(TestCase):
         worker = wiji.Worker(the_task=MYAdderTask, worker_id="myWorkerID1")
         MYAdderTask.synchronous_delay(a=kwargs["a"], b=kwargs["b"])
 
+        # `retry` queues the task again via the `_delay` fast path.
         with mock.patch.object(
-            AdderTask, "delay", new=AsyncMock()
+            AdderTask, "_delay", new=AsyncMock()
         ) as mock_adder_delay, mock.patch.object(
             DividerTask, "delay", new=AsyncMock()
         ) as mock_divider_delay:
@@ -397,6 +850,267 @@ class TestWorker(TestCase):
             # but adder task is queued again
             self.assertTrue(mock_adder_delay.mock.called)
 
+    def test_thread_execution_mode(self):
+        """
+        a blocking task, in the thread execution mode, does not block the event loop.
+        """
+        durations = []
+
+        class RecordingHook(wiji.hook.SimpleHook):
+            async def notify(self, **kwargs):
+                if kwargs["execution_duration"] is not None:
+                    durations.append(kwargs["execution_duration"])
+
+        class BlockingTask(wiji.task.Task):
+            the_broker = wiji.broker.InMemoryBroker()
+            queue_name = "{0}-BlockingTaskQueueThreadMode".format(uuid.uuid4())
+            the_hook = RecordingHook()
+            execution_mode = "thread"
+            thread_pool_name = "TestWorkerThreadMode"
+
+            def run(self, a):
+                time.sleep(0.2)
+                return self.context.task_id
+
+        blocking_task = BlockingTask()
+        worker = wiji.Worker(the_task=blocking_task, worker_id="myWorkerID1")
+        blocking_task.synchronous_delay(a=1)
+
+        ticks = []
+
+        async def tick():
+            for _ in range(5):
+                ticks.append(time.monotonic())
+                await asyncio.sleep(0.01)
+
+        with mock.patch.object(
+            blocking_task, "_notify_ratelimiter", new=AsyncMock()
+        ) as mock_notify_ratelimiter:
+            self._run(asyncio.gather(worker.consume_tasks(TESTING=True), tick()))
+            self.assertEqual(
+                mock_notify_ratelimiter.mock.call_args[1]["return_value"],
+                mock_notify_ratelimiter.mock.call_args[1]["task_id"],
+            )
+        # the loop kept running while the task was blocking.
+        self.assertLess(ticks[-1] - ticks[0], 0.2)
+        self.assertEqual(len(durations), 1)
+        self.assertGreaterEqual(durations[0]["pool_run"], 0.19)
+        self.assertIn("pool_queue_wait", durations[0])
+        self.assertIn("perf_counter", durations[0])
+
+    def test_process_execution_mode(self):
+        durations = []
+
+        class RecordingHook(wiji.hook.SimpleHook):
+            async def notify(self, **kwargs):
+                if kwargs["execution_duration"] is not None:
+                    durations.append(kwargs["execution_duration"])
+
+        hashing_task = ExampleHashingProcessTask()
+        worker = wiji.Worker(the_task=hashing_task, worker_id="myWorkerID1")
+        # large enough to go through shared memory.
+        hashing_task.synchronous_delay(data="x" * 100_000)
+
+        with mock.patch.object(hashing_task, "the_hook", RecordingHook()), mock.patch.object(
+            hashing_task, "_notify_ratelimiter", new=AsyncMock()
+        ) as mock_notify_ratelimiter:
+            self._run(worker.consume_tasks(TESTING=True))
+            pid, task_id, size = mock_notify_ratelimiter.mock.call_args[1]["return_value"]
+            self.assertNotEqual(pid, os.getpid())
+            self.assertEqual(task_id, mock_notify_ratelimiter.mock.call_args[1]["task_id"])
+            self.assertEqual(size, 100_000)
+
+        self.assertEqual(len(durations), 1)
+        # the cpu time is that of the child process.
+        self.assertGreater(durations[0]["process_time"], 0.0)
+        self.assertIn("pool_queue_wait", durations[0])
+        self.assertIn("pool_run", durations[0])
+
+        class LocalTask(ExampleHashingProcessTask):
+            pass
+
+        with self.assertRaises(ValueError) as raised_exception:
+            LocalTask()
+        self.assertIn("defined at the top level of a module", str(raised_exception.exception))
+
+    def test_task_results(self):
+        class AdderTask(wiji.task.Task):
+            the_broker = wiji.broker.InMemoryBroker()
+            queue_name = "{0}-AdderTaskQueueResults".format(uuid.uuid4())
+            the_result_backend = wiji.result.InMemoryResultBackend()
+
+            async def run(self, a, b):
+                if a < 0:
+                    raise ValueError("a should not be negative")
+                if self.current_retries < 1 and a == 0:
+                    await self.retry(
+                        a=a, b=b + 1, task_options=wiji.task.TaskOptions(max_retries=1)
+                    )
+                return a + b
+
+        adder_task = AdderTask()
+        worker = wiji.Worker(the_task=adder_task, worker_id="myWorkerID1")
+
+        async def delay_and_execute(num_executions, *args, **kwargs):
+            handle = await adder_task.delay(*args, **kwargs)
+            for _ in range(num_executions):
+                await worker.consume_tasks(TESTING=True)
+            return await handle.result(timeout=1.0)
+
+        self.assertEqual(self._run(delay_and_execute(1, 3, b=4)), 7)
+        # the result of a retried task is that of its retry.
+        self.assertEqual(self._run(delay_and_execute(2, 0, b=4)), 5)
+        with self.assertRaises(wiji.result.TaskExecutionError) as raised_exception:
+            self._run(delay_and_execute(1, -1, b=4))
+        self.assertIn("a should not be negative", str(raised_exception.exception))
+
+        async def wait_while_executing():
+            handle = await adder_task.delay(5, b=6)
+            # the producer is woken up as soon as the task has been executed.
+            return await asyncio.gather(
+                handle.result(timeout=1.0), worker.consume_tasks(TESTING=True)
+            )
+
+        self.assertEqual(self._run(wait_while_executing())[0], 11)
+
+    def test_dedup(self):
+        executions = []
+
+        class DedupTask(wiji.task.Task):
+            the_broker = wiji.broker.InMemoryBroker()
+            queue_name = "{0}-DedupTaskQueue".format(uuid.uuid4())
+            the_result_backend = wiji.result.InMemoryResultBackend()
+            the_dedup = wiji.dedup.Dedup()
+
+            async def run(self, a):
+                executions.append(a)
+                if a < 0:
+                    raise ValueError("a should not be negative")
+                return a * 2
+
+        class NoDedupTask(DedupTask):
+            # a producer that queues tasks without checking for duplicates.
+            the_dedup = None
+
+        dedup_task = DedupTask()
+        no_dedup_task = NoDedupTask()
+        worker = wiji.Worker(the_task=dedup_task, worker_id="myWorkerID1")
+
+        def task_options(key):
+            return wiji.task.TaskOptions(idempotency_key=key)
+
+        async def execute(num_executions):
+            for _ in range(num_executions):
+                await worker.consume_tasks(TESTING=True)
+
+        handle = self._run(dedup_task.delay(2, task_options=task_options("order-1")))
+        other_handle = self._run(no_dedup_task.delay(2, task_options=task_options("order-1")))
+        self._run(execute(2))
+        self.assertEqual(executions, [2])
+        # the duplicate gets the result of the task that it duplicates.
+        self.assertEqual(self._run(handle.result(timeout=1.0)), 4)
+        self.assertEqual(self._run(other_handle.result(timeout=1.0)), 4)
+
+        # the broker delivers the same item twice.
+        self._run(dedup_task.delay(3, task_options=task_options("order-2")))
+        item = self._run(dedup_task.the_broker.dequeue(queue_name=dedup_task.queue_name))
+        for _ in range(2):
+            self._run(dedup_task.the_broker.enqueue(queue_name=dedup_task.queue_name, item=item))
+        self._run(execute(2))
+        self.assertEqual(executions, [2, 3])
+        self.assertEqual(dedup_task.the_dedup.metrics()["suppressed_executed"], 2)
+
+        # a task whose execution fails can be executed again.
+        for _ in range(2):
+            self._run(no_dedup_task.delay(-1, task_options=task_options("order-3")))
+        self._run(execute(2))
+        self.assertEqual(executions, [2, 3, -1, -1])
+        self.assertEqual(dedup_task.the_dedup.metrics()["suppressed_executed"], 2)
+
+    def test_dedup_lease(self):
+        """
+        a worker only holds the idempotency key of a task for a lease while it executes it.
+        """
+        executions = []
+
+        class SlowDedupTask(wiji.task.Task):
+            the_broker = wiji.broker.InMemoryBroker()
+            queue_name = "{0}-SlowDedupTaskQueue".format(uuid.uuid4())
+            the_dedup = wiji.dedup.Dedup(lease=0.1)
+
+            async def run(self, a):
+                executions.append(a)
+                await asyncio.sleep(0.3)
+                return a
+
+        dedup_task = SlowDedupTask()
+        worker = wiji.Worker(the_task=dedup_task, worker_id="myWorkerID1")
+        other_worker = wiji.Worker(the_task=dedup_task, worker_id="myWorkerID2")
+        dedup_task.synchronous_delay(
+            1, task_options=wiji.task.TaskOptions(idempotency_key="order-1")
+        )
+        item = self._run(dedup_task.the_broker.dequeue(queue_name=dedup_task.queue_name))
+
+        async def deliver_twice():
+            execution = asyncio.ensure_future(worker.consume_tasks(TESTING=True))
+            # the lease is renewed while the task runs, which is longer than the lease.
+            await asyncio.sleep(0.2)
+            await dedup_task.the_broker.enqueue(queue_name=dedup_task.queue_name, item=item)
+            await other_worker.consume_tasks(TESTING=True)
+            await execution
+
+        self._run(dedup_task.the_broker.enqueue(queue_name=dedup_task.queue_name, item=item))
+        self._run(deliver_twice())
+        self.assertEqual(executions, [1])
+        self.assertEqual(worker._leases, {})
+        # once executed, the key is held for the whole ttl rather than for the lease.
+        self._run(asyncio.sleep(0.15))
+        self._run(dedup_task.the_broker.enqueue(queue_name=dedup_task.queue_name, item=item))
+        self._run(other_worker.consume_tasks(TESTING=True))
+        self.assertEqual(executions, [1])
+
+        # a worker that dies while executing the task never records it; the task can be executed once the lease lapses.
+        dedup_task.synchronous_delay(
+            2, task_options=wiji.task.TaskOptions(idempotency_key="order-2")
+        )
+        item = self._run(dedup_task.the_broker.dequeue(queue_name=dedup_task.queue_name))
+        envelope = wiji.protocol.Protocol.decode(item)
+        self.assertIsNone(self._run(worker._claim(envelope)))
+        _, renewer = worker._leases.pop("SlowDedupTask:order-2")
+        renewer.cancel()
+        self._run(dedup_task.the_broker.enqueue(queue_name=dedup_task.queue_name, item=item))
+        self._run(other_worker.consume_tasks(TESTING=True))
+        self.assertEqual(executions, [1])
+        self._run(asyncio.sleep(0.1))
+        self._run(dedup_task.the_broker.enqueue(queue_name=dedup_task.queue_name, item=item))
+        self._run(other_worker.consume_tasks(TESTING=True))
+        self.assertEqual(executions, [1, 2])
+
+    def test_retry_count_travels_with_task(self):
+        """
+        the retries of a task are counted per task, not per `Task` instance.
+        """
+        seen_retries = []
+
+        class AdderTask(wiji.task.Task):
+            the_broker = wiji.broker.InMemoryBroker()
+            queue_name = "{0}-AdderTaskQueueRetryCount".format(uuid.uuid4())
+
+            async def run(self, a, b):
+                seen_retries.append(self.current_retries)
+                await self.retry(a=a, b=b, task_options=wiji.task.TaskOptions(max_retries=2))
+
+        adder_task = AdderTask()
+        worker = wiji.Worker(the_task=adder_task, worker_id="myWorkerID1")
+        adder_task.synchronous_delay(a=1, b=2)
+        for _ in range(3):
+            self._run(worker.consume_tasks(TESTING=True))
+
+        self.assertEqual(seen_retries, [0, 1, 2])
+        # the third execution exceeded max_retries, so the task was not queued again.
+        self.assertEqual(adder_task.the_broker._llen(adder_task.queue_name), 0)
+        self.assertIsNone(adder_task.context)
+
     def test_shutdown(self):
         class AdderTask(wiji.task.Task):
             the_broker = self.BROKER
@@ -439,6 +1153,201 @@ class TestWorker(TestCase):
         self.assertTrue(_myTask.the_broker._llen(AdderTask.queue_name) < len(queued))
         self.assertTrue(worker.SUCCESFULLY_SHUT_DOWN)
 
+    def test_concurrency(self):
+        state = {"running": 0, "max_running": 0, "executed": 0}
+
+        class SleeperTask(wiji.task.Task):
+            the_broker = self.BROKER
+            queue_name = "{0}-TestWorker.test_concurrency".format(uuid.uuid4())
+            drain_duration = 4.0
+
+            async def run(self, a):
+                state["running"] += 1
+                state["max_running"] = max(state["max_running"], state["running"])
+                await asyncio.sleep(0.5)
+                state["running"] -= 1
+                state["executed"] += 1
+                return a
+
+        _myTask = SleeperTask()
+        worker = wiji.Worker(the_task=_myTask, worker_id="myWorkerID1", concurrency=3)
+        for i in range(6):
+            _myTask.synchronous_delay(a=i)
+
+        async def call_worker_shutdown():
+            await asyncio.sleep(0.8)
+            await worker.shutdown()
+
+        self._run(asyncio.gather(worker.consume_tasks(TESTING=False), call_worker_shutdown()))
+
+        # never more than `concurrency` tasks in flight, and those that were in flight got drained.
+        self.assertEqual(state["max_running"], 3)
+        self.assertEqual(state["running"], 0)
+        self.assertEqual(state["executed"], 6)
+        self.assertEqual(len(worker._in_flight), 0)
+        self.assertTrue(worker.SUCCESFULLY_SHUT_DOWN)
+
+    def test_prefetch(self):
+        executed = []
+
+        class SleeperTask(wiji.task.Task):
+            the_broker = self.BROKER
+            queue_name = "{0}-TestWorker.test_prefetch".format(uuid.uuid4())
+            drain_duration = 2.0
+
+            async def run(self, a):
+                await asyncio.sleep(0.2)
+                executed.append(a)
+                return a
+
+        _myTask = SleeperTask()
+        worker = wiji.Worker(the_task=_myTask, worker_id="myWorkerID1", prefetch_count=4)
+        for i in range(12):
+            _myTask.synchronous_delay(a=i)
+
+        async def call_worker_shutdown():
+            await asyncio.sleep(0.7)
+            self.assertTrue(len(worker._prefetched) <= 4)
+            await worker.shutdown()
+
+        self._run(asyncio.gather(worker.consume_tasks(TESTING=False), call_worker_shutdown()))
+
+        # tasks are executed in order and items that were prefetched but not executed are handed back.
+        self.assertTrue(len(executed) > 0)
+        self.assertEqual(executed, list(range(len(executed))))
+        self.assertEqual(len(worker._prefetched), 0)
+        self.assertEqual(_myTask.the_broker._llen(SleeperTask.queue_name), 12 - len(executed))
+
+    def test_bad_prefetch_args(self):
+        with self.assertRaises(ValueError) as raised_exception:
+            wiji.Worker(the_task=self.myTask, prefetch_count=-1)
+        self.assertIn("`prefetch_count` should not be less than 0", str(raised_exception.exception))
+
+        with self.assertRaises(ValueError) as raised_exception:
+            wiji.Worker(the_task=self.myTask, prefetch_bytes="10")
+        self.assertIn(
+            "`prefetch_bytes` should be of type:: `None` or `int`", str(raised_exception.exception)
+        )
+
+    def test_ack_batching(self):
+        kwargs = {"a": 263_342, "b": 832_429}
+        with mock.patch(
+            "{broker_path}.done_many".format(broker_path=self.broker_path()), new=AsyncMock()
+        ) as mock_broker_done_many, mock.patch(
+            "{broker_path}.done".format(broker_path=self.broker_path()), new=AsyncMock()
+        ) as mock_broker_done:
+            worker = wiji.Worker(the_task=self.myTask, worker_id="myWorkerID1", ack_batch_size=2)
+            self.myTask.synchronous_delay(a=kwargs["a"], b=kwargs["b"])
+            self.myTask.synchronous_delay(a=kwargs["a"], b=kwargs["b"])
+
+            self._run(worker.consume_tasks(TESTING=True))
+            # not yet flushed
+            self.assertFalse(mock_broker_done_many.mock.called)
+            self._run(worker.consume_tasks(TESTING=True))
+            # batch size reached
+            self.assertTrue(mock_broker_done_many.mock.called)
+            self.assertFalse(mock_broker_done.mock.called)
+
+            items_with_states = mock_broker_done_many.mock.call_args[1]["items_with_states"]
+            self.assertEqual(len(items_with_states), 2)
+            for item, state in items_with_states:
+                self.assertEqual(json.loads(item)["task_options"]["kwargs"], kwargs)
+                self.assertEqual(state, wiji.task.TaskState.EXECUTED)
+            self.assertEqual(worker._pending_acks, [])
+
+    def test_ack_batching_flush_failure(self):
+        """
+        if a batch flush fails, each item is acknowledged individually.
+        """
+        with mock.patch(
+            "{broker_path}.done_many".format(broker_path=self.broker_path()),
+            side_effect=Exception("test_ack_batching_flush_failure"),
+        ), mock.patch(
+            "{broker_path}.done".format(broker_path=self.broker_path()), new=AsyncMock()
+        ) as mock_broker_done:
+            worker = wiji.Worker(the_task=self.myTask, worker_id="myWorkerID1", ack_batch_size=5)
+            self.myTask.synchronous_delay(a=1, b=2)
+            self._run(worker.consume_tasks(TESTING=True))
+            self.assertFalse(mock_broker_done.mock.called)
+
+            # shutdown flushes whatever is pending.
+            self.myTask.drain_duration = 0.1
+            self._run(worker.shutdown())
+            self.assertEqual(mock_broker_done.mock.call_count, 1)
+            self.assertEqual(
+                mock_broker_done.mock.call_args[1]["state"], wiji.task.TaskState.EXECUTED
+            )
+
+    def test_ack_after_shutdown_flush(self):
+        """
+        tasks that are still executing when the last batch is flushed are acknowledged individually.
+        """
+
+        class SlowTask(wiji.task.Task):
+            the_broker = wiji.broker.InMemoryBroker()
+            queue_name = "{0}-SlowTaskQueue".format(uuid.uuid4())
+            drain_duration = 0.1
+
+            async def run(self, a):
+                await asyncio.sleep(0.2)
+                return a
+
+        slow_task = SlowTask()
+        with mock.patch.object(
+            slow_task.the_broker, "done_many", new=AsyncMock()
+        ) as mock_broker_done_many, mock.patch.object(
+            slow_task.the_broker, "done", new=AsyncMock()
+        ) as mock_broker_done:
+            worker = wiji.Worker(the_task=slow_task, worker_id="myWorkerID1", ack_batch_size=5)
+            slow_task.synchronous_delay(a=1)
+
+            async def execute_and_shutdown():
+                execution = asyncio.ensure_future(worker.consume_tasks(TESTING=True))
+                await asyncio.sleep(0.01)
+                await worker.shutdown()
+                self.assertFalse(mock_broker_done.mock.called)
+                await execution
+
+            self._run(execute_and_shutdown())
+            self.assertTrue(worker._ack_flusher.done())
+            self.assertFalse(mock_broker_done_many.mock.called)
+            self.assertEqual(mock_broker_done.mock.call_count, 1)
+            self.assertEqual(worker._pending_acks, [])
+
+    def test_shutdown_returns_polled_item(self):
+        """
+        an item taken by the dequeue that the default `poll` left running is handed back to the broker on shutdown.
+        """
+
+        class DefaultPollBroker(wiji.broker.InMemoryBroker):
+            async def poll(self, queue_name, timeout):
+                return await wiji.broker.BaseBroker.poll(self, queue_name, timeout)
+
+        class AdderTask(wiji.task.Task):
+            the_broker = DefaultPollBroker()
+            queue_name = "{0}-TestWorker.test_shutdown_returns_polled_item".format(uuid.uuid4())
+            drain_duration = 0.1
+
+            async def run(self, a, b):
+                return a + b
+
+        _myTask = AdderTask()
+        worker = wiji.Worker(the_task=_myTask, worker_id="myWorkerID1")
+        worker._dequeue_timeout = 0.05
+
+        async def consume_and_shutdown():
+            await _myTask.the_broker.check(queue_name=AdderTask.queue_name)
+            # the poll times out and its dequeue is left running.
+            await worker._dequeue()
+            await _myTask.delay(a=1, b=2)
+            await asyncio.sleep(0.01)
+            self.assertEqual(_myTask.the_broker._llen(AdderTask.queue_name), 0)
+            await worker.shutdown()
+
+        self._run(consume_and_shutdown())
+        self.assertEqual(_myTask.the_broker._llen(AdderTask.queue_name), 1)
+        self.assertEqual(_myTask.the_broker._pending_dequeues, {})
+
     def test_broker_shutdown_called(self):
         with mock.patch(
             "{broker_path}.shutdown".format(broker_path=self.broker_path()), new=AsyncMock()
@@ -7,5 +7,14 @@ from . import broker  # noqa: F401
 from . import logger  # noqa: F401
 from . import protocol  # noqa: F401
 from . import ratelimiter  # noqa: F401
+from . import backoff  # noqa: F401
+from . import serializer  # noqa: F401
+from . import compression  # noqa: F401
+from . import blobstore  # noqa: F401
+from . import offload  # noqa: F401
+from . import ids  # noqa: F401
+from . import pool  # noqa: F401
+from . import result  # noqa: F401
+from . import dedup  # noqa: F401
 
 from . import __version__  # noqa: F401
@@ -0,0 +1,188 @@
+import abc
+import random
+import typing
+
+
+class BaseBackoff(abc.ABC):
+    """
+    This is the interface that must be implemented to satisfy wiji's poll backoff.
+    User implementations should inherit this class and
+    implement the :func:`idle <BaseBackoff.idle>`, :func:`error <BaseBackoff.error>`, :func:`success <BaseBackoff.success>`
+    and :func:`metrics <BaseBackoff.metrics>` methods with the type signatures shown.
+
+    A worker asks the backoff how long to sleep whenever a poll of the broker comes back empty or fails.
+    This lets you trade off the cpu used by an idle worker against how quickly it picks up new tasks.
+    """
+
+    @abc.abstractmethod
+    def idle(self, waited: float) -> float:
+        """
+        called after a poll of the broker returned no items.
+        returns the duration, in seconds, that the worker should sleep before polling again.
+
+        Parameters:
+            waited: the duration, in seconds, that the poll itself spent waiting for items.
+        """
+        raise NotImplementedError("`idle` method must be implemented.")
+
+    @abc.abstractmethod
+    def error(self, exception: Exception) -> float:
+        """
+        called after a poll of the broker raised an exception.
+        returns the duration, in seconds, that the worker should sleep before polling again.
+        """
+        raise NotImplementedError("`error` method must be implemented.")
+
+    @abc.abstractmethod
+    def success(self) -> None:
+        """
+        called once an item that a poll of the broker returned is executed, or is held by the worker until it is due.
+        Items that the worker hands back to the broker, because they are due too far in the future,
+        count as empty polls instead.
+        """
+        raise NotImplementedError("`success` method must be implemented.")
+
+    @abc.abstractmethod
+    def metrics(self) -> typing.Dict[str, typing.Union[int, float]]:
+        """
+        returns the current state of the backoff, eg the current delays and how often the worker has backed off.
+        """
+        raise NotImplementedError("`metrics` method must be implemented.")
+
+
+class SimpleBackoff(BaseBackoff):
+    """
+    This is an implementation of BaseBackoff.
+
+    Empty polls are backed off exponentially, from `initial_idle_delay` upto `max_idle_delay`.
+    The time that a long-polling broker already spent waiting counts towards that delay,
+    so brokers that block server-side are not slowed down any further.
+    Failed polls are backed off exponentially, with jitter, from `initial_error_delay` upto `max_error_delay`.
+    Both delays are reset as soon as a poll returns items that the worker can execute or hold until due.
+
+    example usage:
+
+    .. code-block:: python
+
+        backoff = SimpleBackoff(max_idle_delay=2.0)
+        worker = wiji.Worker(the_task=myTask, the_backoff=backoff)
+        ...
+        print(backoff.metrics())
+    """
+
+    def __init__(
+        self,
+        initial_idle_delay: float = 0.01,
+        max_idle_delay: float = 1.0,
+        initial_error_delay: float = 0.5,
+        max_error_delay: float = 300.0,
+        multiplier: float = 2.0,
+    ) -> None:
+        """
+        Parameters:
+            initial_idle_delay: the duration, in seconds, to sleep after the first empty poll.
+            max_idle_delay: the maximum duration, in seconds, to sleep after an empty poll.
+            initial_error_delay: the duration, in seconds, to sleep after the first failed poll.
+            max_error_delay: the maximum duration, in seconds, to sleep after a failed poll.
+            multiplier: the factor by which the delays grow after each consecutive empty or failed poll.
+        """
+        self._validate_args(
+            initial_idle_delay=initial_idle_delay,
+            max_idle_delay=max_idle_delay,
+            initial_error_delay=initial_error_delay,
+            max_error_delay=max_error_delay,
+            multiplier=multiplier,
+        )
+        self.initial_idle_delay = initial_idle_delay
+        self.max_idle_delay = max_idle_delay
+        self.initial_error_delay = initial_error_delay
+        self.max_error_delay = max_error_delay
+        self.multiplier = multiplier
+
+        self.idle_delay: float = self.initial_idle_delay
+        self.error_delay: float = self.initial_error_delay
+        self.consecutive_empty_polls: int = 0
+        self.consecutive_errors: int = 0
+        self.empty_polls: int = 0
+        self.errors: int = 0
+        self.successes: int = 0
+        self.idle_sleep: float = 0.0
+        self.error_sleep: float = 0.0
+
+    def _validate_args(
+        self, initial_idle_delay, max_idle_delay, initial_error_delay, max_error_delay, multiplier
+    ):
+        for name, value in [
+            ("initial_idle_delay", initial_idle_delay),
+            ("max_idle_delay", max_idle_delay),
+            ("initial_error_delay", initial_error_delay),
+            ("max_error_delay", max_error_delay),
+            ("multiplier", multiplier),
+        ]:
+            if not isinstance(value, float):
+                raise ValueError(
+                    """`{0}` should be of type:: `float` You entered: {1}""".format(
+                        name, type(value)
+                    )
+                )
+            if value < 0:
+                raise ValueError(
+                    """`{0}` should not be less than 0 You entered: {1}""".format(name, value)
+                )
+        if max_idle_delay < initial_idle_delay:
+            raise ValueError(
+                """`max_idle_delay` should not be less than `initial_idle_delay` You entered: {0}""".format(
+                    max_idle_delay
+                )
+            )
+        if max_error_delay < initial_error_delay:
+            raise ValueError(
+                """`max_error_delay` should not be less than `initial_error_delay` You entered: {0}""".format(
+                    max_error_delay
+                )
+            )
+        if multiplier < 1.0:
+            raise ValueError(
+                """`multiplier` should not be less than 1.0 You entered: {0}""".format(multiplier)
+            )
+
+    def idle(self, waited: float) -> float:
+        # the broker is reachable, so the next failure starts over from the smallest error delay.
+        self.error_delay = self.initial_error_delay
+        self.consecutive_errors = 0
+
+        self.empty_polls += 1
+        self.consecutive_empty_polls += 1
+        delay = max(0.0, self.idle_delay - waited)
+        self.idle_delay = min(self.idle_delay * self.multiplier, self.max_idle_delay)
+        self.idle_sleep += delay
+        return delay
+
+    def error(self, exception: Exception) -> float:
+        self.errors += 1
+        self.consecutive_errors += 1
+        # jitter so that many workers do not all hit a recovering broker at the same time.
+        delay = random.uniform(self.error_delay / 2, self.error_delay)
+        self.error_delay = min(self.error_delay * self.multiplier, self.max_error_delay)
+        self.error_sleep += delay
+        return delay
+
+    def success(self) -> None:
+        self.successes += 1
+        self.consecutive_empty_polls = 0
+        self.consecutive_errors = 0
+        self.idle_delay = self.initial_idle_delay
+        self.error_delay = self.initial_error_delay
+
+    def metrics(self) -> typing.Dict[str, typing.Union[int, float]]:
+        return {
+            "idle_delay": self.idle_delay,
+            "error_delay": self.error_delay,
+            "consecutive_empty_polls": self.consecutive_empty_polls,
+            "consecutive_errors": self.consecutive_errors,
+            "empty_polls": self.empty_polls,
+            "errors": self.errors,
+            "successes": self.successes,
+            "idle_sleep": self.idle_sleep,
+            "error_sleep": self.error_sleep,
+        }
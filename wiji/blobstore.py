@@ -0,0 +1,220 @@
+import os
+import re
+import abc
+import mmap
+import time
+import typing
+import asyncio
+import hashlib
+import tempfile
+
+# the keys of `FileSystemBlobStore` are the hex sha256 of the blob.
+_KEY_PATTERN = re.compile("[0-9a-f]{64}")
+
+
+class BaseBlobStore(abc.ABC):
+    """
+    This is the interface that must be implemented to satisfy wiji's blob store.
+    User implementations should inherit this class and
+    implement the :func:`put <BaseBlobStore.put>` and :func:`get <BaseBlobStore.get>` methods with the type signatures shown.
+
+    A blob store implements the claim-check pattern. The bodies(args and kwargs) of items that are larger than
+    :attr:`threshold <BaseBlobStore.threshold>` bytes are written to the blob store, and only a reference to them
+    is sent through the broker. The worker fetches the body from the blob store just before it executes the task.
+    Thus both the producers and the workers of a task need access to the same blob store.
+    """
+
+    # bodies of this many bytes, or more, are written to the blob store.
+    threshold: int = 1024 * 1024
+
+    @abc.abstractmethod
+    async def put(self, data: bytes) -> str:
+        """
+        store `data` and return the key under which it is stored.
+        Keys should be derived from the content of `data`, so that identical bodies are only stored once.
+        Keys should be ascii and not longer than 255 characters.
+        """
+        raise NotImplementedError("`put` method must be implemented.")
+
+    @abc.abstractmethod
+    async def get(self, key: str) -> typing.Union[bytes, memoryview]:
+        """
+        return the data stored under `key`
+
+        Raises:
+            KeyError: there is no data stored under `key`; eg because it has expired.
+        """
+        raise NotImplementedError("`get` method must be implemented.")
+
+
+class FileSystemBlobStore(BaseBlobStore):
+    """
+    This is an implementation of BaseBlobStore that keeps blobs as files in a directory.
+    The directory can be on a filesystem that is shared by the producers and workers.
+
+    Blobs are named after the sha256 of their content, so identical bodies are only written once.
+    Blobs that have not been written, or re-written, within `ttl` seconds are garbage collected; thus `ttl` should be
+    longer than the time that a task can spend in the queue, including its retries.
+    Blobs are read via mmap, so that they are not copied more than once.
+
+    example usage:
+
+    .. code-block:: python
+
+        class MyTask(wiji.task.Task):
+            the_broker = MyBroker()
+            queue_name = "MyQueue"
+            the_blob_store = wiji.blobstore.FileSystemBlobStore(directory="/mnt/shared/wiji-blobs")
+    """
+
+    def __init__(
+        self,
+        directory: str,
+        threshold: int = 1024 * 1024,
+        ttl: float = 7 * 24 * 60 * 60.0,
+        gc_interval: float = 10 * 60.0,
+    ) -> None:
+        """
+        Parameters:
+            directory: the directory in which to keep blobs. It is created if it does not exist.
+            threshold: bodies of this many bytes, or more, are written to the blob store.
+            ttl: the duration, in seconds, after which blobs are garbage collected.
+            gc_interval: the minimum duration, in seconds, between garbage collections.
+        """
+        self._validate_args(
+            directory=directory, threshold=threshold, ttl=ttl, gc_interval=gc_interval
+        )
+        self.directory = directory
+        self.threshold = threshold
+        self.ttl = ttl
+        self.gc_interval = gc_interval
+        os.makedirs(self.directory, exist_ok=True)
+
+        self._last_gc: float = 0.0
+        self.puts: int = 0
+        self.deduplicated: int = 0
+        self.gets: int = 0
+        self.collected: int = 0
+
+    def _validate_args(self, directory, threshold, ttl, gc_interval):
+        if not isinstance(directory, str):
+            raise ValueError(
+                """`directory` should be of type:: `str` You entered: {0}""".format(type(directory))
+            )
+        if not isinstance(threshold, int):
+            raise ValueError(
+                """`threshold` should be of type:: `int` You entered: {0}""".format(type(threshold))
+            )
+        if threshold < 0:
+            raise ValueError(
+                """`threshold` should not be less than 0 You entered: {0}""".format(threshold)
+            )
+        for name, value in [("ttl", ttl), ("gc_interval", gc_interval)]:
+            if not isinstance(value, float):
+                raise ValueError(
+                    """`{0}` should be of type:: `float` You entered: {1}""".format(
+                        name, type(value)
+                    )
+                )
+            if value < 0:
+                raise ValueError(
+                    """`{0}` should not be less than 0 You entered: {1}""".format(name, value)
+                )
+
+    def _path(self, key: str) -> str:
+        # keys come from items in the broker; anything but a sha256 could name a file outside of `self.directory`
+        if not isinstance(key, str) or not _KEY_PATTERN.fullmatch(key):
+            raise ValueError(
+                """`key` should be a hex sha256 of 64 lowercase characters You entered: {0!r}""".format(
+                    key
+                )
+            )
+        return os.path.join(self.directory, key)
+
+    def _put(self, key: str, data: bytes) -> bool:
+        path = self._path(key)
+        try:
+            # an identical blob may already be stored; renew it so that the ttl counts from now.
+            os.utime(path)
+            return False
+        except FileNotFoundError:
+            # not stored, or `collect` removed it just now.
+            pass
+        # write to a temporary file first so that readers never see a partially written blob.
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, prefix=".tmp-")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+        return True
+
+    def _get(self, key: str) -> memoryview:
+        try:
+            with open(self._path(key), "rb") as f:
+                if os.fstat(f.fileno()).st_size == 0:
+                    # an empty file can not be mmapped.
+                    return memoryview(b"")
+                return memoryview(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ))
+        except FileNotFoundError:
+            raise KeyError(key) from None
+
+    def _collect(self, now: float) -> int:
+        collected = 0
+        for entry in os.scandir(self.directory):
+            try:
+                if entry.is_file() and (now - entry.stat().st_mtime) > self.ttl:
+                    os.unlink(entry.path)
+                    collected += 1
+            except FileNotFoundError:
+                # collected by another process.
+                pass
+        return collected
+
+    async def put(self, data: bytes) -> str:
+        key = hashlib.sha256(data).hexdigest()
+        loop = asyncio.get_event_loop()
+        # large blobs would otherwise block the event loop while they are written.
+        written = await loop.run_in_executor(None, self._put, key, data)
+        self.puts += 1
+        if not written:
+            self.deduplicated += 1
+
+        now = time.time()
+        if now - self._last_gc >= self.gc_interval:
+            self._last_gc = now
+            await self.collect()
+        return key
+
+    async def get(self, key: str) -> typing.Union[bytes, memoryview]:
+        """
+        return the blob stored under `key`
+
+        Raises:
+            KeyError: there is no blob stored under `key`; eg because it has been garbage collected.
+            ValueError: `key` is not a key that this blob store hands out.
+        """
+        loop = asyncio.get_event_loop()
+        data = await loop.run_in_executor(None, self._get, key)
+        self.gets += 1
+        return data
+
+    async def collect(self) -> int:
+        """
+        delete the blobs that have expired and return how many were deleted.
+        It is called periodically by :func:`put <FileSystemBlobStore.put>` but can also be called directly.
+        """
+        loop = asyncio.get_event_loop()
+        collected = await loop.run_in_executor(None, self._collect, time.time())
+        self.collected += collected
+        return collected
+
+    def metrics(self) -> typing.Dict[str, int]:
+        return {
+            "puts": self.puts,
+            "deduplicated": self.deduplicated,
+            "gets": self.gets,
+            "collected": self.collected,
+        }
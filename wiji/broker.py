@@ -1,10 +1,22 @@
 import abc
+import time
+import heapq
 import typing
 import asyncio
+import itertools
+import collections
+
+from . import compression
 
 if typing.TYPE_CHECKING:
     from . import task
 
+# The items that brokers store and hand back.
+# Version 1 items are `str` and version 2 items are `bytes`. Brokers may hand back version 2 items as any bytes-like
+# object, eg a `memoryview` over a buffer that the broker's client library already holds; wiji decodes
+# such items in place without copying them.
+Item = typing.Union[str, bytes, bytearray, memoryview]
+
 
 class BaseBroker(abc.ABC):
     """
@@ -14,8 +26,29 @@ class BaseBroker(abc.ABC):
     :func:`dequeue <BaseBroker.dequeue>` methods with the type signatures shown.
 
     wiji calls an implementation of this class to enqueue and/or dequeue an item.
+
+    Brokers that are able to hold on to an item until it is due can set :attr:`delayed_delivery <BaseBroker.delayed_delivery>` to True.
     """
 
+    # Whether this broker supports delayed delivery.
+    # If True, :func:`enqueue <BaseBroker.enqueue>` is called with the keyword argument `eta`
+    # which is the time(as a unix timestamp in seconds) at which the item becomes due.
+    # If False, `eta` is never passed; brokers without delayed delivery can leave it out of their `enqueue`
+    # The broker should then only hand out the item via dequeue once it is due;
+    # and wiji workers will execute any item that they dequeue without checking its eta.
+    # `eta` may also be None, in which case the item is due immediately.
+    delayed_delivery: bool = False
+
+    # The version of `wiji.protocol.Protocol` that tasks use, by default, to send items to this broker.
+    # Version 2 items are `bytes`, so only brokers that are able to store bytes should set this to 2;
+    # setting it is how a broker declares that it speaks bytes rather than text.
+    # Tasks can override it with their own `protocol_version`; workers are able to decode items of any version.
+    protocol_version: int = 1
+
+    # Compresses the args and kwargs of large items sent to this broker; see `wiji.compression.Compression`
+    # Compressed items are version 2 items. Tasks can override it with their own `the_compression`.
+    the_compression: typing.Union[None, compression.Compression] = None
+
     @abc.abstractmethod
     async def check(self, queue_name: str) -> None:
         """
@@ -27,7 +60,9 @@ class BaseBroker(abc.ABC):
         raise NotImplementedError("`check` method must be implemented.")
 
     @abc.abstractmethod
-    async def enqueue(self, queue_name: str, item: str) -> None:
+    async def enqueue(
+        self, queue_name: str, item: Item, eta: typing.Union[None, float] = None
+    ) -> None:
         """
         enqueue/save an item.
 
@@ -46,28 +81,159 @@ class BaseBroker(abc.ABC):
                                 "kwargs": {},
                             },
                         }
+                  or, if the task uses version 2 of `wiji.protocol.Protocol`, a compact binary(`bytes`) encoding of the same.
             queue_name: name of queue to enqueue in
+            eta: the time, as a unix timestamp in seconds, at which the item becomes due. None means it is due immediately.
+                 only passed in if the broker supports :attr:`delayed_delivery <BaseBroker.delayed_delivery>`
         """
         raise NotImplementedError("`enqueue` method must be implemented.")
 
+    async def enqueue_many(
+        self,
+        queue_name: str,
+        items: typing.List[Item],
+        etas: typing.Union[None, typing.List[typing.Union[None, float]]] = None,
+    ) -> None:
+        """
+        enqueue/save several items in one go.
+        Implementing this method is optional; brokers that can save several items in one round trip(eg redis LPUSH with many values)
+        should override it. The default implementation calls :func:`enqueue <BaseBroker.enqueue>` once per item.
+
+        Parameters:
+            queue_name: name of queue to enqueue in
+            items: the items to be enqueued/saved, in order. Each item looks like the one passed to :func:`enqueue <BaseBroker.enqueue>`
+            etas: only passed in if the broker supports :attr:`delayed_delivery <BaseBroker.delayed_delivery>`.
+                  It has one eta for each item.
+        """
+        if etas is None:
+            for item in items:
+                await self.enqueue(queue_name=queue_name, item=item)
+        else:
+            for item, eta in zip(items, etas):
+                await self.enqueue(queue_name=queue_name, item=item, eta=eta)
+
     @abc.abstractmethod
-    async def dequeue(self, queue_name: str) -> str:
+    async def dequeue(self, queue_name: str) -> Item:
         """
         dequeue an item.
+        This method should block until an item is available.
 
         Returns:
             item that was dequeued
         """
         raise NotImplementedError("`dequeue` method must be implemented.")
 
+    async def poll(self, queue_name: str, timeout: float) -> typing.Union[None, Item]:
+        """
+        long-poll for an item; wait upto `timeout` seconds for an item to become available.
+        wiji workers use this method, rather than :func:`dequeue <BaseBroker.dequeue>`, so that an idle worker
+        neither spins nor misses a shutdown signal.
+
+        Implementing this method is optional; brokers that can wait on the server side(eg redis BRPOP) should override it.
+        The default implementation is built on :func:`dequeue <BaseBroker.dequeue>`; if no item arrives within `timeout`,
+        the call to `dequeue` is left running and is picked up by the next call to `poll` so that no item is lost.
+
+        Parameters:
+            queue_name: name of queue to dequeue from
+            timeout: the maximum duration in seconds to wait for an item.
+
+        Returns:
+            item that was dequeued or None if no item became available within `timeout`.
+        """
+        pending_dequeues = self._get_pending_dequeues()
+        pending = pending_dequeues.pop(queue_name, None)
+        if pending is None:
+            pending = asyncio.ensure_future(self.dequeue(queue_name=queue_name))
+
+        done, _ = await asyncio.wait({pending}, timeout=timeout)
+        if not done:
+            pending_dequeues[queue_name] = pending
+            return None
+        return pending.result()
+
+    def cancel_poll(self, queue_name: str) -> typing.Union[None, Item]:
+        """
+        called by wiji worker when it shuts down, after it has stopped polling.
+        It cancels the call to `dequeue` that the default :func:`poll <BaseBroker.poll>` left running.
+        If that call had already taken an item off the queue, the item is returned so that the worker can hand it back.
+
+        Brokers that override :func:`poll <BaseBroker.poll>` without calling the default need not override this method.
+
+        Parameters:
+            queue_name: name of queue which the wiji worker was consuming from
+
+        Returns:
+            item that was dequeued but never handed out by `poll`, or None.
+        """
+        pending = self._get_pending_dequeues().pop(queue_name, None)
+        if pending is None:
+            return None
+        if not pending.done():
+            pending.cancel()
+            return None
+        if pending.cancelled() or pending.exception() is not None:
+            return None
+        return pending.result()
+
+    def _get_pending_dequeues(self) -> typing.Dict[str, "asyncio.Future[Item]"]:
+        """
+        returns queue_name -> the call to `dequeue` that the default `poll` left running after it timed out.
+        It is created on first use, so that implementations need not call `super().__init__()`.
+        """
+        pending_dequeues: typing.Dict[str, "asyncio.Future[Item]"] = self.__dict__.setdefault(
+            "_pending_dequeues", {}
+        )
+        return pending_dequeues
+
+    async def dequeue_many(
+        self, queue_name: str, max_items: int, timeout: float
+    ) -> typing.List[Item]:
+        """
+        dequeue upto `max_items` items in one go.
+        Implementing this method is optional; brokers that can fetch several items in one round trip
+        should override it. The default implementation is built on :func:`poll <BaseBroker.poll>`
+        and thus returns at most one item per call.
+
+        Parameters:
+            queue_name: name of queue to dequeue from
+            max_items: the maximum number of items to return.
+            timeout: the maximum duration in seconds to wait for the first item to become available.
+                     once an item is available, the broker should return at once with whatever items it has(upto `max_items`).
+
+        Returns:
+            list of items that were dequeued. It may be empty if no item became available within `timeout`.
+        """
+        item = await self.poll(queue_name=queue_name, timeout=timeout)
+        if item is None:
+            return []
+        return [item]
+
     @abc.abstractmethod
-    async def done(self, queue_name: str, item: str, state: "task.TaskState") -> None:
+    async def done(self, queue_name: str, item: Item, state: "task.TaskState") -> None:
         """
         called by wiji worker once it is done executing a task.
         the broker can then decide to do any clean up actions like removing that task from the queue etc.
         """
         raise NotImplementedError("`done` method must be implemented.")
 
+    async def done_many(
+        self, queue_name: str, items_with_states: typing.List[typing.Tuple[Item, "task.TaskState"]]
+    ) -> None:
+        """
+        called by wiji worker, instead of :func:`done <BaseBroker.done>`, when it acknowledges executed tasks in batches.
+        Implementing this method is optional; brokers that can acknowledge several items in one round trip
+        should override it. The default implementation calls :func:`done <BaseBroker.done>` for each item.
+
+        If this method raises an exception, wiji assumes that none of the items were acknowledged
+        and it will fall back to calling :func:`done <BaseBroker.done>` for each of them.
+
+        Parameters:
+            queue_name: name of queue that the items were dequeued from
+            items_with_states: list of `(item, state)` tuples.
+        """
+        for item, state in items_with_states:
+            await self.done(queue_name=queue_name, item=item, state=state)
+
     @abc.abstractmethod
     async def shutdown(self, queue_name: str, duration: float) -> None:
         """
@@ -90,80 +256,241 @@ class InMemoryBroker(BaseBroker):
     Do not use this broker in production or anywhere else that you care about.
 
     {
-        "queue1": ["item1", "item2", "item3"],
-        "queue2": ["item1", "item2", "item3"]
+        "queue1": deque(["item1", "item2", "item3"]),
+        "queue2": deque(["item1", "item2", "item3"])
         ...
     }
+
+    Consumers waiting on an empty queue are woken up as soon as an item is enqueued, instead of polling.
+
+    It supports delayed delivery; items that are not yet due are kept in a per queue heap ordered by their eta
+    and are moved into the queue once due.
+
+    example usage:
+
+    .. code-block:: python
+
+        # enqueue waits for space once a queue holds 1000 items.
+        broker = InMemoryBroker(maxsize=1000)
     """
 
-    def __init__(self) -> None:
+    delayed_delivery: bool = True
+
+    def __init__(self, maxsize: int = 0) -> None:
+        """
+        Parameters:
+            maxsize: the maximum number of items(due or not) that each queue can hold.
+                     once a queue is full, `enqueue` waits until an item is dequeued. A value of 0 means the queues are unbounded.
+        """
+        self._validate_args(maxsize=maxsize)
+        self.maxsize: int = maxsize
+        self.store: typing.Dict[str, typing.Deque[Item]] = {}
+        # queue_name -> heap of (eta, sequence_number, item) for items that are not yet due.
+        self.delayed_store: typing.Dict[str, typing.List[typing.Tuple[float, int, Item]]] = {}
+        self._sequence = itertools.count()
+        # queue_name -> (eventloop, not_empty_condition, not_full_condition)
+        self._conditions: typing.Dict[
+            str, typing.Tuple[asyncio.AbstractEventLoop, asyncio.Condition, asyncio.Condition]
+        ] = {}
+
+    @staticmethod
+    def _validate_args(maxsize: int) -> None:
+        if not isinstance(maxsize, int):
+            raise ValueError(
+                """`maxsize` should be of type:: `int` You entered: {0}""".format(type(maxsize))
+            )
+        if maxsize < 0:
+            raise ValueError(
+                """`maxsize` should not be less than 0 You entered: {0}""".format(maxsize)
+            )
+
+    def _get_conditions(
+        self, queue_name: str
+    ) -> typing.Tuple[asyncio.Condition, asyncio.Condition]:
         """
+        returns the (not_empty, not_full) conditions of a queue.
+        This broker is usually created at import time, before any eventloop is running,
+        so the conditions are created lazily and re-created if the broker is used from a different eventloop.
         """
-        self.store: dict = {}
-        # max tasks we can store per queue_name.
-        self.max_tasks: int = 2000
+        loop = asyncio.get_event_loop()
+        conditions = self._conditions.get(queue_name)
+        if conditions is None or conditions[0] is not loop:
+            lock = asyncio.Lock()
+            conditions = (loop, asyncio.Condition(lock), asyncio.Condition(lock))
+            self._conditions[queue_name] = conditions
+        return conditions[1], conditions[2]
+
+    def _queue(self, queue_name: str) -> typing.Deque[Item]:
+        if queue_name not in self.store:
+            raise ValueError("queue with name: {0} does not exist.".format(queue_name))
+        return self.store[queue_name]
 
     async def check(self, queue_name: str) -> None:
         if queue_name not in self.store:
-            self.store[queue_name] = []
+            self.store[queue_name] = collections.deque()
         await asyncio.sleep(0.00000000001)
 
-    async def enqueue(self, queue_name: str, item: str) -> None:
-        if self.store.get(queue_name):
+    async def enqueue(
+        self, queue_name: str, item: Item, eta: typing.Union[None, float] = None
+    ) -> None:
+        if queue_name not in self.store:
+            self.store[queue_name] = collections.deque()
+        not_empty, not_full = self._get_conditions(queue_name)
+        async with not_full:
+            while self.maxsize > 0 and self._llen(queue_name) >= self.maxsize:
+                await not_full.wait()
+
+            if eta is not None and eta > time.time():
+                heapq.heappush(
+                    self.delayed_store.setdefault(queue_name, []),
+                    (eta, next(self._sequence), item),
+                )
+            else:
+                self.store[queue_name].append(item)
+            # a consumer waiting for a delayed item may need to wake up earlier than it planned to.
+            not_empty.notify()
+
+        # NB: without this awaits, only tasks scheduled in the InMemoryBroker(like `WatchDogTask`)
+        # would get priority since they wouldn't be co-operative in their scheduling
+        await asyncio.sleep(delay=-1)
+
+    async def enqueue_many(
+        self,
+        queue_name: str,
+        items: typing.List[Item],
+        etas: typing.Union[None, typing.List[typing.Union[None, float]]] = None,
+    ) -> None:
+        if queue_name not in self.store:
+            self.store[queue_name] = collections.deque()
+        if etas is None:
+            etas = [None] * len(items)
+
+        not_empty, not_full = self._get_conditions(queue_name)
+        index = 0
+        while index < len(items):
+            async with not_full:
+                while self.maxsize > 0 and self._llen(queue_name) >= self.maxsize:
+                    await not_full.wait()
+
+                # add as many items as there is space for, then wait for consumers to make more room.
+                now = time.time()
+                end = len(items)
+                if self.maxsize > 0:
+                    end = min(end, index + self.maxsize - self._llen(queue_name))
+                for item, eta in zip(items[index:end], etas[index:end]):
+                    if eta is not None and eta > now:
+                        heapq.heappush(
+                            self.delayed_store.setdefault(queue_name, []),
+                            (eta, next(self._sequence), item),
+                        )
+                    else:
+                        self.store[queue_name].append(item)
+                not_empty.notify(end - index)
+                index = end
+
+        await asyncio.sleep(delay=-1)
+
+    def _release_due(self, queue_name: str) -> typing.Union[None, float]:
+        """
+        move the items that are now due from the delayed heap into the queue, in eta order.
+        returns the number of seconds until the next delayed item is due, or None if there is no delayed item.
+        """
+        delayed = self.delayed_store.get(queue_name)
+        if not delayed:
+            return None
+        now = time.time()
+        while delayed and delayed[0][0] <= now:
+            _, _, item = heapq.heappop(delayed)
             self.store[queue_name].append(item)
-            # NB: without this awaits, only tasks scheduled in the InMemoryBroker(like `WatchDogTask`)
-            # would get priority since they wouldn't be co-operative in their scheduling
-            await asyncio.sleep(delay=-1)
-        else:
-            self.store[queue_name] = [item]
-            await asyncio.sleep(delay=-1)
+        if delayed:
+            return delayed[0][0] - now
+        return None
+
+    async def _take(
+        self, queue_name: str, max_items: int, timeout: typing.Union[None, float]
+    ) -> typing.List[Item]:
+        """
+        take upto `max_items` from the queue.
+        waits for the first item for upto `timeout` seconds, or forever if `timeout` is None.
+        """
+        queue = self._queue(queue_name)
+        deadline = None
+        if timeout is not None:
+            deadline = time.monotonic() + timeout
+
+        not_empty, not_full = self._get_conditions(queue_name)
+        async with not_empty:
+            while True:
+                next_due = self._release_due(queue_name)
+                if queue:
+                    items = [queue.popleft() for _ in range(min(max_items, len(queue)))]
+                    not_full.notify(len(items))
+                    return items
 
-        await self._guard_leak(queue_name=queue_name)
+                wait = next_due
+                if deadline is not None:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        return []
+                    wait = remaining if wait is None else min(wait, remaining)
 
-    async def dequeue(self, queue_name: str) -> str:
-        while True:
-            if queue_name in self.store:
                 try:
-                    return await asyncio.sleep(delay=-1, result=self.store[queue_name].pop(0))
-                except IndexError:
-                    # queue is empty
-                    await asyncio.sleep(0.25)
-            else:
-                raise ValueError("queue with name: {0} does not exist.".format(queue_name))
+                    if wait is None:
+                        await not_empty.wait()
+                    else:
+                        await asyncio.wait_for(not_empty.wait(), timeout=wait)
+                except asyncio.TimeoutError:
+                    pass
+                except asyncio.CancelledError:
+                    # do not swallow a wakeup that was meant for us; pass it on to the next consumer.
+                    not_empty.notify()
+                    raise
 
-    async def done(self, queue_name: str, item: str, state: "task.TaskState") -> None:
+    async def dequeue(self, queue_name: str) -> Item:
+        items = await self._take(queue_name=queue_name, max_items=1, timeout=None)
+        return items[0]
+
+    async def poll(self, queue_name: str, timeout: float) -> typing.Union[None, Item]:
+        items = await self._take(queue_name=queue_name, max_items=1, timeout=timeout)
+        if not items:
+            return None
+        return items[0]
+
+    async def dequeue_many(
+        self, queue_name: str, max_items: int, timeout: float
+    ) -> typing.List[Item]:
+        return await self._take(queue_name=queue_name, max_items=max_items, timeout=timeout)
+
+    async def done(self, queue_name: str, item: Item, state: "task.TaskState") -> None:
         """
-        for this broker, this method is not needed, since `dequeue` uses .pop() which deletes the item.
+        for this broker, this method is not needed, since `dequeue` uses .popleft() which deletes the item.
         """
-        if queue_name in self.store:
-            return await asyncio.sleep(delay=-1, result=None)
-        else:
-            raise ValueError("queue with name: {0} does not exist.".format(queue_name))
+        self._queue(queue_name)
+        return await asyncio.sleep(delay=-1, result=None)
+
+    async def done_many(
+        self, queue_name: str, items_with_states: typing.List[typing.Tuple[Item, "task.TaskState"]]
+    ) -> None:
+        """
+        like `done`, this is a no-op for this broker.
+        """
+        self._queue(queue_name)
+        return await asyncio.sleep(delay=-1, result=None)
 
     async def shutdown(self, queue_name: str, duration: float) -> None:
         return await asyncio.sleep(delay=-1, result=None)
 
-    def _llen(self, queue_name: str) -> int:
+    def _full(self, queue_name: str) -> bool:
         """
-        find the length/size/number of queued items in the given queue.
-        Only used in tests.
+        whether an `enqueue` to the given queue would wait for space.
         """
-        return len(self.store[queue_name])
+        if self.maxsize <= 0 or queue_name not in self.store:
+            return False
+        return self._llen(queue_name) >= self.maxsize
 
-    async def _guard_leak(self, queue_name: str) -> None:
+    def _llen(self, queue_name: str) -> int:
         """
-        This func guards against the possibility of the `InMemoryBroker` leaking memory.
-        Since this broker uses a dict as its backing storage, if the number of items appended
-        to that dict keeps on rising over time without reducing; a memory leak may occur.
-
-        So this func makes sure that the number of items in `self.store` for a given `queue_name`
-        never goes above X items. If it does, this func will clear that queue back to empty.
-        Since this broker is only used for demo purposes and by `wiji.task.WatchDogTask`
-        it's okay to empty queues in an ad hoc manner.
-
-        This functionality was added to fix an actual memory leak.
-        see: https://github.com/komuw/wiji/issues/71
+        find the length/size/number of queued items in the given queue.
+        Only used in tests.
         """
-        _llen = self._llen(queue_name=queue_name)
-        if _llen > self.max_tasks:
-            self.store[queue_name] = []
+        return len(self.store[queue_name]) + len(self.delayed_store.get(queue_name, []))
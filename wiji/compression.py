@@ -0,0 +1,147 @@
+import bz2
+import time
+import lzma
+import zlib
+import typing
+
+# the ids of the codecs, as tagged in the flags of a version 2 item. 0 means the body is not compressed.
+NONE = 0
+CODECS: typing.Dict[str, int] = {"zlib": 1, "lzma": 2, "bz2": 3}
+
+
+def decompress(codec: int, data: typing.Union[bytes, memoryview]) -> bytes:
+    """
+    decompress `data` that was compressed with the codec whose id is `codec`
+
+    Raises:
+        ValueError: `codec` is not known.
+    """
+    if codec == CODECS["zlib"]:
+        return zlib.decompress(data)
+    elif codec == CODECS["lzma"]:
+        return lzma.decompress(data)
+    elif codec == CODECS["bz2"]:
+        return bz2.decompress(data)
+    raise ValueError("unknown compression codec: {0}".format(codec))
+
+
+class Compression:
+    """
+    compresses the body(args and kwargs) of items that are larger than `threshold` bytes.
+    The codec is flagged in each item, so workers decompress items automatically regardless of how they are configured.
+    Compression needs version 2 of the protocol.
+
+    It keeps metrics of how well compression is paying off, so that you can pick a codec and a threshold.
+
+    example usage:
+
+    .. code-block:: python
+
+        class MyTask(wiji.task.Task):
+            the_broker = MyBroker()
+            queue_name = "MyQueue"
+            the_compression = wiji.compression.Compression(codec="zlib", threshold=4096)
+
+        ...
+        print(MyTask.the_compression.metrics())
+    """
+
+    def __init__(
+        self, codec: str = "zlib", threshold: int = 1024, level: typing.Union[None, int] = None
+    ) -> None:
+        """
+        Parameters:
+            codec: one of; zlib, lzma or bz2
+            threshold: bodies smaller than this number of bytes are not compressed.
+            level: the compression level; its meaning depends on the codec. None uses the codec's default.
+        """
+        self._validate_args(codec=codec, threshold=threshold, level=level)
+        self.codec = codec
+        self.codec_id = CODECS[codec]
+        self.threshold = threshold
+        self.level = level
+
+        self.compressed: int = 0
+        self.skipped: int = 0
+        self.bytes_in: int = 0
+        self.bytes_out: int = 0
+        self.compress_time: float = 0.0
+        self.decompressed: int = 0
+        self.decompress_time: float = 0.0
+
+    def _validate_args(self, codec, threshold, level):
+        if codec not in CODECS:
+            raise ValueError(
+                """`codec` should be one of: {0} You entered: {1}""".format(
+                    tuple(CODECS.keys()), codec
+                )
+            )
+        if not isinstance(threshold, int):
+            raise ValueError(
+                """`threshold` should be of type:: `int` You entered: {0}""".format(type(threshold))
+            )
+        if threshold < 0:
+            raise ValueError(
+                """`threshold` should not be less than 0 You entered: {0}""".format(threshold)
+            )
+        if not isinstance(level, (type(None), int)):
+            raise ValueError(
+                """`level` should be of type:: `None` or `int` You entered: {0}""".format(
+                    type(level)
+                )
+            )
+
+    def _compress(self, data: bytes) -> bytes:
+        if self.codec == "zlib":
+            return zlib.compress(data, -1 if self.level is None else self.level)
+        elif self.codec == "lzma":
+            return lzma.compress(data, preset=self.level)
+        return bz2.compress(data, 9 if self.level is None else self.level)
+
+    def compress(self, data: bytes) -> typing.Tuple[int, bytes]:
+        """
+        returns the id of the codec used and the, possibly, compressed data.
+        data that is below the threshold, or that does not get smaller, is returned as is with a codec id of `NONE`
+        """
+        if len(data) < self.threshold:
+            self.skipped += 1
+            return NONE, data
+
+        start = time.thread_time()
+        compressed = self._compress(data)
+        self.compress_time += time.thread_time() - start
+        if len(compressed) >= len(data):
+            self.skipped += 1
+            return NONE, data
+
+        self.compressed += 1
+        self.bytes_in += len(data)
+        self.bytes_out += len(compressed)
+        return self.codec_id, compressed
+
+    def decompress(self, codec: int, data: typing.Union[bytes, memoryview]) -> bytes:
+        """
+        like :func:`decompress <decompress>` but also keeps metrics.
+        """
+        start = time.thread_time()
+        decompressed = decompress(codec, data)
+        self.decompress_time += time.thread_time() - start
+        self.decompressed += 1
+        return decompressed
+
+    def metrics(self) -> typing.Dict[str, typing.Union[int, float]]:
+        """
+        returns how often, and how well, bodies were compressed.
+        `ratio` is the size of the compressed bodies divided by their original size; smaller is better.
+        `compress_time` and `decompress_time` are cpu time in seconds.
+        """
+        return {
+            "compressed": self.compressed,
+            "skipped": self.skipped,
+            "bytes_in": self.bytes_in,
+            "bytes_out": self.bytes_out,
+            "ratio": self.bytes_out / self.bytes_in if self.bytes_in else 1.0,
+            "compress_time": self.compress_time,
+            "decompressed": self.decompressed,
+            "decompress_time": self.decompress_time,
+        }
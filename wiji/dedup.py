@@ -0,0 +1,422 @@
+import abc
+import math
+import time
+import typing
+import asyncio
+import sqlite3
+import threading
+import collections
+
+# the stages at which tasks are checked for duplicates.
+# queued: `wiji.task.Task.delay` does not queue a task whose idempotency key has already been queued.
+QUEUED = "queued"
+# executed: a worker does not execute a task whose idempotency key has already been executed.
+EXECUTED = "executed"
+
+
+class BaseDedupStore(abc.ABC):
+    """
+    This is the interface that must be implemented to satisfy wiji's dedup store.
+    User implementations should inherit this class and
+    implement the :func:`add <BaseDedupStore.add>` and :func:`remove <BaseDedupStore.remove>` methods with the type signatures shown.
+
+    A dedup store keeps the idempotency keys that have been seen, so that duplicates are suppressed across processes.
+    Thus the producers and the workers of a task need access to the same dedup store. see `wiji.dedup.Dedup`
+    """
+
+    @abc.abstractmethod
+    async def add(self, key: str, value: str, ttl: float) -> typing.Union[None, str]:
+        """
+        store `key`, with `value`, for `ttl` seconds; unless it is already stored.
+        This should be atomic; of many concurrent calls with the same key, only one should store it.
+
+        Returns:
+            None if `key` was stored, otherwise the value that `key` is already stored with.
+        """
+        raise NotImplementedError("`add` method must be implemented.")
+
+    @abc.abstractmethod
+    async def remove(self, key: str) -> None:
+        """
+        remove `key`, if it is stored.
+        """
+        raise NotImplementedError("`remove` method must be implemented.")
+
+    async def set(self, key: str, value: str, ttl: float) -> None:
+        """
+        store `key`, with `value`, for `ttl` seconds; replacing it if it is already stored.
+        It is used to renew, or to extend, a key that was stored by :func:`add <BaseDedupStore.add>`
+        Implementing this method is optional; stores that can replace a key in one atomic step should override it.
+        The default implementation calls :func:`remove <BaseDedupStore.remove>` and then :func:`add <BaseDedupStore.add>`
+        """
+        await self.remove(key)
+        await self.add(key, value, ttl)
+
+
+class SqliteDedupStore(BaseDedupStore):
+    """
+    This is an implementation of BaseDedupStore that keeps idempotency keys in an sqlite database.
+    The database file can be shared by the producers and workers that are on the same host.
+
+    example usage:
+
+    .. code-block:: python
+
+        class MyTask(wiji.task.Task):
+            the_broker = MyBroker()
+            queue_name = "MyQueue"
+            the_dedup = wiji.dedup.Dedup(
+                the_store=wiji.dedup.SqliteDedupStore(path="/var/lib/myapp/wiji-dedup.sqlite")
+            )
+    """
+
+    def __init__(self, path: str) -> None:
+        """
+        Parameters:
+            path: the path of the database file. It is created if it does not exist.
+        """
+        if not isinstance(path, str):
+            raise ValueError(
+                """`path` should be of type:: `str` You entered: {0}""".format(type(path))
+            )
+        self.path = path
+
+        # the connection is used from the threads of the event loop's default executor, one at a time.
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+        with self._lock:
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS wiji_dedup "
+                "(key TEXT PRIMARY KEY, value TEXT NOT NULL, expires REAL NOT NULL)"
+            )
+            self._connection.execute(
+                "CREATE INDEX IF NOT EXISTS wiji_dedup_expires ON wiji_dedup (expires)"
+            )
+
+    def _add(self, key: str, value: str, ttl: float) -> typing.Union[None, str]:
+        # wall clock time, since the database can be shared by processes.
+        now = time.time()
+        with self._lock:
+            # an immediate transaction locks out the other processes until the key has been checked and stored.
+            self._connection.execute("BEGIN IMMEDIATE")
+            try:
+                self._connection.execute("DELETE FROM wiji_dedup WHERE expires <= ?", (now,))
+                row = self._connection.execute(
+                    "SELECT value FROM wiji_dedup WHERE key = ?", (key,)
+                ).fetchone()
+                if row is None:
+                    self._connection.execute(
+                        "INSERT INTO wiji_dedup (key, value, expires) VALUES (?, ?, ?)",
+                        (key, value, now + ttl),
+                    )
+                self._connection.execute("COMMIT")
+            except BaseException:
+                self._connection.execute("ROLLBACK")
+                raise
+        if row is None:
+            return None
+        return typing.cast(str, row[0])
+
+    def _remove(self, key: str) -> None:
+        with self._lock:
+            self._connection.execute("DELETE FROM wiji_dedup WHERE key = ?", (key,))
+
+    def _set(self, key: str, value: str, ttl: float) -> None:
+        with self._lock:
+            self._connection.execute(
+                "INSERT OR REPLACE INTO wiji_dedup (key, value, expires) VALUES (?, ?, ?)",
+                (key, value, time.time() + ttl),
+            )
+
+    async def add(self, key: str, value: str, ttl: float) -> typing.Union[None, str]:
+        loop = asyncio.get_event_loop()
+        return await loop.run_in_executor(None, self._add, key, value, ttl)
+
+    async def remove(self, key: str) -> None:
+        loop = asyncio.get_event_loop()
+        await loop.run_in_executor(None, self._remove, key)
+
+    async def set(self, key: str, value: str, ttl: float) -> None:
+        loop = asyncio.get_event_loop()
+        await loop.run_in_executor(None, self._set, key, value, ttl)
+
+
+class BloomFilter:
+    """
+    a set that only answers whether a key might be in it; `False` is always right, `True` is wrong with a
+    probability of about `error_rate` once `capacity` keys have been added.
+    Keys can not be removed from it.
+    """
+
+    __slots__ = ("capacity", "error_rate", "num_bits", "num_hashes", "_bits", "count")
+
+    def __init__(self, capacity: int, error_rate: float) -> None:
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.num_bits = max(8, math.ceil(-capacity * math.log(error_rate) / (math.log(2) ** 2)))
+        self.num_hashes = max(1, round(self.num_bits / capacity * math.log(2)))
+        self._bits = bytearray((self.num_bits + 7) // 8)
+        self.count = 0
+
+    def _positions(self, key: str) -> typing.Iterator[int]:
+        # the two halves of one hash are combined to make the other `num_hashes`; see Kirsch & Mitzenmacher.
+        # the filter never leaves the process, so python's own hash, which is salted per process, is good enough.
+        h = hash(key)
+        h1 = h & 0xFFFFFFFF
+        h2 = (h >> 32) | 1
+        for i in range(self.num_hashes):
+            yield (h1 + i * h2) % self.num_bits
+
+    def add(self, key: str) -> None:
+        for position in self._positions(key):
+            self._bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, key: str) -> bool:
+        bits = self._bits
+        for position in self._positions(key):
+            if not bits[position >> 3] & (1 << (position & 7)):
+                return False
+        return True
+
+    def clear(self) -> None:
+        self._bits = bytearray(len(self._bits))
+        self.count = 0
+
+
+class Dedup:
+    """
+    suppresses duplicate tasks; tasks that are queued with an idempotency key that has already been seen.
+    see :class:`TaskOptions <wiji.task.TaskOptions>`
+
+    A task is checked twice; when it is queued, by `wiji.task.Task.delay`, and before it is executed, by the worker.
+    Of the tasks queued with the same idempotency key, only the first is queued; the others are not, and the handles
+    that `delay` returns for them are handles of the first task. A worker that dequeues a task whose idempotency key
+    has already been executed, eg because the broker delivered it twice, does not execute it again.
+    A task that fails to be queued, or whose execution raises an error, is forgotten so that it can be tried again.
+    Retries of a task are never suppressed.
+    While a worker executes a task, it only holds the idempotency key for `lease` seconds and keeps renewing it;
+    the key is remembered for `ttl` seconds once the task has executed. Thus, if the worker dies while executing
+    the task, a redelivery of the task is executed once the lease has lapsed.
+
+    The keys seen by this process are kept in a bounded LRU, with a bloom filter in front of it; most keys are new,
+    and the bloom filter tells so without looking them up in, and expiring them from, the LRU.
+    Without `the_store`, only duplicates seen by the same process, and still in the LRU, are suppressed.
+    With `the_store`, every key that is not in the LRU is claimed in the store; so duplicates are suppressed across
+    all the processes that share the store. A key that is new to this process may have been seen by another,
+    so the bloom filter can not save that trip to the store; the LRU saves the trips for duplicates of keys
+    that this process has claimed.
+
+    It keeps counts of the duplicates that it suppresses, and of how the keys were looked up.
+
+    example usage:
+
+    .. code-block:: python
+
+        class MyTask(wiji.task.Task):
+            the_broker = MyBroker()
+            queue_name = "MyQueue"
+            the_dedup = wiji.dedup.Dedup(ttl=60 * 60.0)
+
+        ...
+        await MyTask().delay(33, 14, task_options=wiji.task.TaskOptions(idempotency_key="order-1234"))
+        print(MyTask.the_dedup.metrics())
+    """
+
+    def __init__(
+        self,
+        ttl: float = 24 * 60 * 60.0,
+        maxsize: int = 10_000,
+        bloom_capacity: int = 100_000,
+        bloom_error_rate: float = 0.01,
+        the_store: typing.Union[None, BaseDedupStore] = None,
+        lease: float = 60.0,
+    ) -> None:
+        """
+        Parameters:
+            ttl: the duration, in seconds, for which an idempotency key is remembered.
+            maxsize: the maximum number of idempotency keys that are kept in the LRU.
+            bloom_capacity: the number of keys that the bloom filter is sized for. It is cleared, and refilled
+                            from the LRU, once that many keys have been added to it.
+            bloom_error_rate: the rate at which the bloom filter wrongly says that a key might have been seen.
+            the_store: the store shared by processes. None means duplicates are only suppressed within this process.
+            lease: the duration, in seconds, for which the idempotency key of a task that is executing is held.
+                   The worker renews it every `lease / 3` seconds until the task has executed.
+        """
+        self._validate_args(
+            ttl=ttl,
+            maxsize=maxsize,
+            bloom_capacity=bloom_capacity,
+            bloom_error_rate=bloom_error_rate,
+            the_store=the_store,
+            lease=lease,
+        )
+        self.ttl = ttl
+        self.lease = lease
+        self.maxsize = maxsize
+        self.the_store = the_store
+        self._bloom = BloomFilter(capacity=bloom_capacity, error_rate=bloom_error_rate)
+        # key -> (value, expires)
+        self._lru: "collections.OrderedDict[str, typing.Tuple[str, float]]" = (
+            collections.OrderedDict()
+        )
+
+        self.suppressed_queued: int = 0
+        self.suppressed_executed: int = 0
+        self.bloom_negatives: int = 0
+        self.lru_hits: int = 0
+        self.store_checks: int = 0
+
+    def _validate_args(
+        self,
+        ttl: float,
+        maxsize: int,
+        bloom_capacity: int,
+        bloom_error_rate: float,
+        the_store: typing.Union[None, BaseDedupStore],
+        lease: float,
+    ) -> None:
+        if not isinstance(ttl, float):
+            raise ValueError(
+                """`ttl` should be of type:: `float` You entered: {0}""".format(type(ttl))
+            )
+        if ttl <= 0:
+            raise ValueError("""`ttl` should be greater than 0 You entered: {0}""".format(ttl))
+        if not isinstance(maxsize, int):
+            raise ValueError(
+                """`maxsize` should be of type:: `int` You entered: {0}""".format(type(maxsize))
+            )
+        if maxsize <= 0:
+            raise ValueError(
+                """`maxsize` should be greater than 0 You entered: {0}""".format(maxsize)
+            )
+        if not isinstance(bloom_capacity, int):
+            raise ValueError(
+                """`bloom_capacity` should be of type:: `int` You entered: {0}""".format(
+                    type(bloom_capacity)
+                )
+            )
+        if bloom_capacity < maxsize:
+            raise ValueError(
+                """`bloom_capacity` should not be less than `maxsize` You entered: {0}""".format(
+                    bloom_capacity
+                )
+            )
+        if not isinstance(bloom_error_rate, float):
+            raise ValueError(
+                """`bloom_error_rate` should be of type:: `float` You entered: {0}""".format(
+                    type(bloom_error_rate)
+                )
+            )
+        if not 0 < bloom_error_rate < 1:
+            raise ValueError(
+                """`bloom_error_rate` should be between 0 and 1 You entered: {0}""".format(
+                    bloom_error_rate
+                )
+            )
+        if not isinstance(the_store, (type(None), BaseDedupStore)):
+            raise ValueError(
+                """`the_store` should be of type:: `None` or `wiji.dedup.BaseDedupStore` You entered: {0}""".format(
+                    type(the_store)
+                )
+            )
+        if not isinstance(lease, float):
+            raise ValueError(
+                """`lease` should be of type:: `float` You entered: {0}""".format(type(lease))
+            )
+        if lease <= 0:
+            raise ValueError("""`lease` should be greater than 0 You entered: {0}""".format(lease))
+
+    def _remember(self, key: str, value: str, expires: float) -> None:
+        if self._bloom.count >= self._bloom.capacity:
+            # the bloom filter is full and would soon say yes to everything; start over with the keys in the LRU.
+            self._bloom.clear()
+            for lru_key in self._lru:
+                self._bloom.add(lru_key)
+        self._bloom.add(key)
+        self._lru[key] = (value, expires)
+        self._lru.move_to_end(key)
+        if len(self._lru) > self.maxsize:
+            self._lru.popitem(last=False)
+
+    async def claim(
+        self, stage: str, key: str, value: str, ttl: typing.Union[None, float] = None
+    ) -> typing.Union[None, str]:
+        """
+        claim `key` at `stage`; `QUEUED` or `EXECUTED`
+
+        Parameters:
+            stage: the stage at which the task is been checked.
+            key: the idempotency key of the task; qualified by the name of the task.
+            value: what to remember the key with; the task id.
+            ttl: the duration, in seconds, for which the claim holds. None means `self.ttl`
+
+        Returns:
+            None if the key was claimed, otherwise the value of the earlier claim; the task is a duplicate.
+        """
+        if ttl is None:
+            ttl = self.ttl
+        key = stage + ":" + key
+        now = time.time()
+        previous = None
+        if key in self._bloom:
+            entry = self._lru.get(key)
+            if entry is not None:
+                if entry[1] > now:
+                    self.lru_hits += 1
+                    self._lru.move_to_end(key)
+                    previous = entry[0]
+                else:
+                    del self._lru[key]
+        else:
+            self.bloom_negatives += 1
+
+        if previous is None and self.the_store is not None:
+            self.store_checks += 1
+            previous = await self.the_store.add(key, value, ttl)
+
+        if previous is None:
+            self._remember(key, value, now + ttl)
+        elif stage == QUEUED:
+            self.suppressed_queued += 1
+        else:
+            self.suppressed_executed += 1
+        return previous
+
+    async def record(
+        self, stage: str, key: str, value: str, ttl: typing.Union[None, float] = None
+    ) -> None:
+        """
+        remember `key` at `stage` for `ttl` seconds from now; replacing an earlier claim.
+        It renews a lease, or turns a lease into a claim that holds for `self.ttl` once the task has executed.
+
+        Parameters:
+            stage: the stage at which the task is been checked.
+            key: the idempotency key of the task; qualified by the name of the task.
+            value: what to remember the key with; the task id.
+            ttl: the duration, in seconds, for which the claim holds. None means `self.ttl`
+        """
+        if ttl is None:
+            ttl = self.ttl
+        key = stage + ":" + key
+        if self.the_store is not None:
+            await self.the_store.set(key, value, ttl)
+        self._remember(key, value, time.time() + ttl)
+
+    async def release(self, stage: str, key: str) -> None:
+        """
+        forget `key` at `stage`; so that it can be claimed again.
+        """
+        key = stage + ":" + key
+        self._lru.pop(key, None)
+        if self.the_store is not None:
+            await self.the_store.remove(key)
+
+    def metrics(self) -> typing.Dict[str, int]:
+        return {
+            "suppressed_queued": self.suppressed_queued,
+            "suppressed_executed": self.suppressed_executed,
+            "bloom_negatives": self.bloom_negatives,
+            "lru_hits": self.lru_hits,
+            "store_checks": self.store_checks,
+        }
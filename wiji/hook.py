@@ -28,9 +28,40 @@ class BaseHook(abc.ABC):
     ) -> None:
         """
         called by `wiji` worker whenever a task undergoes a state change.
+
+        `queuing_duration` and `execution_duration` have the time, in seconds, taken on each of the clocks;
+        thread_time, perf_counter, monotonic and process_time. For tasks that run in a thread pool, `execution_duration`
+        also has `pool_queue_wait`; the time spent waiting for a free thread, and `pool_run`; the time spent running in it.
         """
         raise NotImplementedError("`notify` method must be implemented.")
 
+    async def notify_many(
+        self,
+        task_name: str,
+        task_ids: typing.List[str],
+        queue_name: str,
+        hook_metadata: typing.List[str],
+        state: "task.TaskState",
+        queuing_duration: typing.Union[None, typing.Dict[str, float]] = None,
+        queuing_exception: typing.Union[None, Exception] = None,
+    ) -> None:
+        """
+        called by `wiji.task.Task.delay_many` whenever a batch of tasks undergoes a state change while been queued.
+        `task_ids` and `hook_metadata` have one entry for each task in the batch, and `queuing_duration` is for the whole batch.
+
+        Implementing this method is optional. The default implementation calls :func:`notify <BaseHook.notify>` once per task.
+        """
+        for task_id, metadata in zip(task_ids, hook_metadata):
+            await self.notify(
+                task_name=task_name,
+                task_id=task_id,
+                queue_name=queue_name,
+                hook_metadata=metadata,
+                state=state,
+                queuing_duration=queuing_duration,
+                queuing_exception=queuing_exception,
+            )
+
 
 class SimpleHook(BaseHook):
     """
@@ -74,3 +105,27 @@ class SimpleHook(BaseHook):
                 "return_value": str(return_value),
             },
         )
+
+    async def notify_many(
+        self,
+        task_name: str,
+        task_ids: typing.List[str],
+        queue_name: str,
+        hook_metadata: typing.List[str],
+        state: "task.TaskState",
+        queuing_duration: typing.Union[None, typing.Dict[str, float]] = None,
+        queuing_exception: typing.Union[None, Exception] = None,
+    ) -> None:
+        self.logger.log(
+            logging.NOTSET,
+            {
+                "event": "wiji.SimpleHook.notify_many",
+                "stage": "start",
+                "state": state,
+                "task_name": task_name,
+                "num_tasks": len(task_ids),
+                "queue_name": queue_name,
+                "queuing_duration": queuing_duration,
+                "queuing_exception": queuing_exception,
+            },
+        )
@@ -0,0 +1,104 @@
+import os
+import abc
+import time
+import uuid
+import threading
+
+# Crockford's base32; it leaves out I, L, O and U which are easily confused.
+_ALPHABET = "0123456789ABCDEFGHJKMNPQRSTVWXYZ"
+# every 10 bit number as two base32 characters; so that 80 bits are encoded with just 8 lookups.
+_PAIRS = [_ALPHABET[i >> 5] + _ALPHABET[i & 31] for i in range(1024)]
+_RANDOM_BITS = 80
+_MAX_RANDOM = (1 << _RANDOM_BITS) - 1
+
+
+class BaseTaskIdGenerator(abc.ABC):
+    """
+    This is the interface that must be implemented to satisfy wiji's task id generator.
+    User implementations should inherit this class and
+    implement the :func:`generate <BaseTaskIdGenerator.generate>` method with the type signatures shown.
+
+    A task id is generated every time that a task is queued; including when it is retried.
+    """
+
+    @abc.abstractmethod
+    def generate(self) -> str:
+        """
+        returns a new, unique, task id.
+        """
+        raise NotImplementedError("`generate` method must be implemented.")
+
+
+class UlidGenerator(BaseTaskIdGenerator):
+    """
+    This is an implementation of BaseTaskIdGenerator that generates ULIDs; see: https://github.com/ulid/spec
+    It is the default task id generator.
+
+    A ULID is 26 characters long; a 48 bit unix timestamp in milliseconds followed by 80 random bits, both in Crockford's base32.
+    Thus task ids sort by the time at which their tasks were queued; brokers and stores can use them as naturally ordered keys.
+    Ids generated within the same millisecond increment the random part, so they remain ordered, and unique, within a process.
+    The random part is re-seeded after a fork so that child processes do not generate the same ids as their parent.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._pid = os.getpid()
+        self._last_ms = -1
+        self._prefix = ""
+        self._random = 0
+
+    @staticmethod
+    def _encode_timestamp(ms: int) -> str:
+        return "".join(_ALPHABET[(ms >> shift) & 31] for shift in range(45, -1, -5))
+
+    def generate(self) -> str:
+        ms = time.time_ns() // 1_000_000
+        with self._lock:
+            pid = os.getpid()
+            if ms > self._last_ms or pid != self._pid:
+                self._pid = pid
+                self._last_ms = max(ms, self._last_ms)
+                self._prefix = self._encode_timestamp(self._last_ms)
+                self._random = int.from_bytes(os.urandom(10), "big")
+            elif self._random < _MAX_RANDOM:
+                # same millisecond, or the clock went backwards; stay in the last millisecond.
+                self._random += 1
+            else:
+                # the random part is used up; move on to the next millisecond.
+                self._last_ms += 1
+                self._prefix = self._encode_timestamp(self._last_ms)
+                self._random = int.from_bytes(os.urandom(10), "big")
+            r = self._random
+            prefix = self._prefix
+
+        return (
+            prefix
+            + _PAIRS[r >> 70]
+            + _PAIRS[(r >> 60) & 1023]
+            + _PAIRS[(r >> 50) & 1023]
+            + _PAIRS[(r >> 40) & 1023]
+            + _PAIRS[(r >> 30) & 1023]
+            + _PAIRS[(r >> 20) & 1023]
+            + _PAIRS[(r >> 10) & 1023]
+            + _PAIRS[r & 1023]
+        )
+
+    @staticmethod
+    def timestamp(task_id: str) -> float:
+        """
+        returns the time, as a unix timestamp in seconds, that is encoded in a ULID.
+        """
+        ms = 0
+        for char in task_id[:10]:
+            ms = (ms << 5) | _ALPHABET.index(char)
+        return ms / 1000
+
+
+class UuidGenerator(BaseTaskIdGenerator):
+    """
+    This is an implementation of BaseTaskIdGenerator that generates random uuid4s.
+    These were the task ids of older versions of wiji.
+    """
+
+    def generate(self) -> str:
+        return str(uuid.uuid4())
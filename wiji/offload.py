@@ -0,0 +1,113 @@
+import typing
+import asyncio
+import concurrent.futures
+
+
+class Offload:
+    """
+    runs the decoding and encoding of large items away from the event loop; in a thread or process pool.
+    Items smaller than `threshold` bytes are decoded and encoded inline, since handing them over to a pool would cost
+    more than it saves.
+
+    A thread pool helps most where the work releases the GIL, eg decompressing. Decoding JSON or pickle holds the GIL,
+    so for very large items of those a `concurrent.futures.ProcessPoolExecutor` keeps the event loop more responsive.
+    With a process pool, work done in the child processes is not recorded in the metrics of a task's
+    `wiji.compression.Compression`
+
+    It keeps counts of how often each path is used, so that you can tune the threshold.
+
+    example usage:
+
+    .. code-block:: python
+
+        class MyTask(wiji.task.Task):
+            the_broker = MyBroker()
+            queue_name = "MyQueue"
+            the_offload = wiji.offload.Offload(threshold=256 * 1024)
+
+        ...
+        print(MyTask.the_offload.metrics())
+    """
+
+    def __init__(
+        self,
+        threshold: int = 512 * 1024,
+        executor: typing.Union[None, concurrent.futures.Executor] = None,
+    ) -> None:
+        """
+        Parameters:
+            threshold: items of this many bytes, or more, are decoded/encoded in `executor`
+            executor: the pool to use. None means the event loop's default executor; a thread pool that is shared.
+        """
+        self._validate_args(threshold=threshold, executor=executor)
+        self.threshold = threshold
+        self.executor = executor
+        # arguments sent to a process pool are pickled, and memoryviews can not be.
+        self._pickles_args = executor is not None and not isinstance(
+            executor, concurrent.futures.ThreadPoolExecutor
+        )
+
+        self.decode_inline: int = 0
+        self.decode_offloaded: int = 0
+        self.encode_inline: int = 0
+        self.encode_offloaded: int = 0
+
+    def _validate_args(self, threshold, executor):
+        if not isinstance(threshold, int):
+            raise ValueError(
+                """`threshold` should be of type:: `int` You entered: {0}""".format(type(threshold))
+            )
+        if threshold < 0:
+            raise ValueError(
+                """`threshold` should not be less than 0 You entered: {0}""".format(threshold)
+            )
+        if not isinstance(executor, (type(None), concurrent.futures.Executor)):
+            raise ValueError(
+                """`executor` should be of type:: `None` or `concurrent.futures.Executor` You entered: {0}""".format(
+                    type(executor)
+                )
+            )
+
+    async def _run(
+        self, offloaded: bool, func: typing.Callable[..., typing.Any], *args: typing.Any
+    ) -> typing.Any:
+        if not offloaded:
+            return func(*args)
+        if self._pickles_args:
+            args = tuple(bytes(arg) if isinstance(arg, memoryview) else arg for arg in args)
+        loop = asyncio.get_event_loop()
+        return await loop.run_in_executor(self.executor, func, *args)
+
+    async def decode(
+        self, size: int, func: typing.Callable[..., typing.Any], *args: typing.Any
+    ) -> typing.Any:
+        """
+        call `func(*args)`, which decodes an item of `size` bytes; in the pool if the item is large enough.
+        """
+        offloaded = size >= self.threshold
+        if offloaded:
+            self.decode_offloaded += 1
+        else:
+            self.decode_inline += 1
+        return await self._run(offloaded, func, *args)
+
+    async def encode(
+        self, size: int, func: typing.Callable[..., typing.Any], *args: typing.Any
+    ) -> typing.Any:
+        """
+        call `func(*args)`, which encodes items that are expected to be `size` bytes; in the pool if they are large enough.
+        """
+        offloaded = size >= self.threshold
+        if offloaded:
+            self.encode_offloaded += 1
+        else:
+            self.encode_inline += 1
+        return await self._run(offloaded, func, *args)
+
+    def metrics(self) -> typing.Dict[str, int]:
+        return {
+            "decode_inline": self.decode_inline,
+            "decode_offloaded": self.decode_offloaded,
+            "encode_inline": self.encode_inline,
+            "encode_offloaded": self.encode_offloaded,
+        }
@@ -0,0 +1,254 @@
+import os
+import time
+import pickle
+import typing
+import asyncio
+import functools
+import importlib
+import threading
+import contextvars
+import concurrent.futures
+
+try:
+    from multiprocessing import shared_memory, resource_tracker
+except ImportError:
+    # python < 3.8; large arguments and results are then sent through the pool's pipes like any other.
+    shared_memory = None  # type: ignore
+
+# the thread pools that tasks run in, by name. They are shared by every task that names the same pool.
+_THREAD_POOLS: typing.Dict[str, concurrent.futures.ThreadPoolExecutor] = {}
+_THREAD_POOLS_LOCK = threading.Lock()
+
+# the process pools that tasks run in, by name. They are shared by every task that names the same pool.
+_PROCESS_POOLS: typing.Dict[str, concurrent.futures.ProcessPoolExecutor] = {}
+_PROCESS_POOLS_LOCK = threading.Lock()
+
+# arguments and results that pickle to this many bytes, or more, are moved through shared memory.
+SHARED_MEMORY_THRESHOLD: int = 64 * 1024
+
+
+def thread_pool(name: str, size: int) -> concurrent.futures.ThreadPoolExecutor:
+    """
+    returns the thread pool called `name`; it is created, with `size` threads, the first time that it is asked for.
+    Its threads are named `wiji-<name>`, so that they are easy to spot in stack traces.
+
+    Raises:
+        ValueError: the pool already exists with a different size.
+    """
+    with _THREAD_POOLS_LOCK:
+        pool = _THREAD_POOLS.get(name)
+        if pool is None:
+            pool = concurrent.futures.ThreadPoolExecutor(
+                max_workers=size, thread_name_prefix="wiji-{0}".format(name)
+            )
+            _THREAD_POOLS[name] = pool
+        elif pool._max_workers != size:
+            raise ValueError(
+                "the thread pool: {0} already exists with a size of: {1} You entered: {2}".format(
+                    name, pool._max_workers, size
+                )
+            )
+        return pool
+
+
+def _timed(
+    submitted: float,
+    timings: typing.Dict[str, float],
+    func: typing.Callable[..., typing.Any],
+    args: typing.Tuple[typing.Any, ...],
+    kwargs: typing.Dict[str, typing.Any],
+) -> typing.Any:
+    started = time.perf_counter()
+    timings["pool_queue_wait"] = round(started - submitted, 4)
+    try:
+        return func(*args, **kwargs)
+    finally:
+        timings["pool_run"] = round(time.perf_counter() - started, 4)
+
+
+async def run_in_thread_pool(
+    pool: concurrent.futures.ThreadPoolExecutor,
+    func: typing.Callable[..., typing.Any],
+    args: typing.Tuple[typing.Any, ...],
+    kwargs: typing.Dict[str, typing.Any],
+    timings: typing.Dict[str, float],
+) -> typing.Any:
+    """
+    call `func(*args, **kwargs)` in `pool` and return its return value.
+    `func` runs in a copy of the current context, so that context variables, eg `wiji.task.TaskContext`, can be reached.
+
+    The time, in seconds, that the call waited for a free thread is added to `timings` as `pool_queue_wait`,
+    and the time that it ran for as `pool_run`; also when `func` raises.
+    """
+    context = contextvars.copy_context()
+    loop = asyncio.get_event_loop()
+    return await loop.run_in_executor(
+        pool,
+        functools.partial(context.run, _timed, time.perf_counter(), timings, func, args, kwargs),
+    )
+
+
+def _init_process(modules: typing.List[str]) -> None:
+    # import the app once, when the child process starts, rather than on its first task.
+    for module in modules:
+        importlib.import_module(module)
+
+
+def _warm_up() -> None:
+    pass
+
+
+def process_pool(
+    name: str, size: int, modules: typing.Union[None, typing.List[str]] = None
+) -> concurrent.futures.ProcessPoolExecutor:
+    """
+    returns the process pool called `name`; it is created, with `size` child processes, the first time that it is asked for.
+    The child processes are started right away, and each imports `modules` once as it starts.
+
+    Raises:
+        ValueError: the pool already exists with a different size.
+    """
+    with _PROCESS_POOLS_LOCK:
+        pool = _PROCESS_POOLS.get(name)
+        if pool is None:
+            pool = concurrent.futures.ProcessPoolExecutor(
+                max_workers=size, initializer=_init_process, initargs=(modules or [],)
+            )
+            for _ in range(size):
+                pool.submit(_warm_up)
+            _PROCESS_POOLS[name] = pool
+        elif pool._max_workers != size:  # type: ignore
+            raise ValueError(
+                "the process pool: {0} already exists with a size of: {1} You entered: {2}".format(
+                    name, pool._max_workers, size  # type: ignore
+                )
+            )
+        return pool
+
+
+def _dump(obj: typing.Any) -> typing.Tuple[typing.Any, ...]:
+    """
+    pickles `obj` into a form that can be sent to another process; a reference to shared memory if it is large.
+    """
+    data = pickle.dumps(obj, protocol=pickle.HIGHEST_PROTOCOL)
+    if shared_memory is None or len(data) < SHARED_MEMORY_THRESHOLD:
+        return ("bytes", data)
+    shm = shared_memory.SharedMemory(create=True, size=len(data))
+    if typing.TYPE_CHECKING:
+        assert isinstance(shm.buf, memoryview)
+    shm.buf[: len(data)] = data
+    shm.close()
+    _untrack(shm)
+    return ("shared_memory", shm.name, len(data))
+
+
+def _untrack(shm: "shared_memory.SharedMemory") -> None:
+    """
+    stop the resource tracker of this process from tracking `shm`, which was created by this process.
+    The process that loads `shm` is the one that frees it. Otherwise, if the two processes have different trackers,
+    the tracker of this process warns about a leak and tries to unlink `shm` again once this process exits.
+    """
+    if os.name == "posix":
+        # only posix shared memory is tracked; see `multiprocessing.shared_memory.SharedMemory`
+        resource_tracker.unregister(shm._name, "shared_memory")  # type: ignore
+
+
+def _load(ref: typing.Tuple[typing.Any, ...]) -> typing.Any:
+    """
+    the reverse of `_dump`. Shared memory is unpickled in place, and then freed.
+    """
+    if ref[0] == "bytes":
+        return pickle.loads(ref[1])
+    shm = shared_memory.SharedMemory(name=ref[1])
+    if typing.TYPE_CHECKING:
+        assert isinstance(shm.buf, memoryview)
+    try:
+        return pickle.loads(shm.buf[: ref[2]])
+    finally:
+        shm.close()
+        shm.unlink()
+
+
+def _call_in_process(
+    submitted: float, call: typing.Tuple[typing.Any, ...]
+) -> typing.Tuple[typing.Dict[str, float], typing.Tuple[typing.Any, ...]]:
+    started = time.monotonic()
+    process_time_start = time.process_time()
+    thread_time_start = time.thread_time()
+    try:
+        func, args, kwargs = _load(call)
+        outcome: typing.Tuple[bool, typing.Any] = (True, func(*args, **kwargs))
+    except Exception as e:
+        outcome = (False, e)
+    timings = {
+        "pool_queue_wait": round(started - submitted, 4),
+        "pool_run": round(time.monotonic() - started, 4),
+        "thread_time": round(time.thread_time() - thread_time_start, 4),
+        "process_time": round(time.process_time() - process_time_start, 4),
+    }
+    return timings, _dump(outcome)
+
+
+async def run_in_process_pool(
+    pool: concurrent.futures.ProcessPoolExecutor,
+    func: typing.Callable[..., typing.Any],
+    args: typing.Tuple[typing.Any, ...],
+    kwargs: typing.Dict[str, typing.Any],
+    timings: typing.Dict[str, float],
+) -> typing.Any:
+    """
+    call `func(*args, **kwargs)` in a child process of `pool` and return its return value.
+    `func`, its arguments and its return value should be picklable. Those that are large are moved through
+    shared memory, where it is available, rather than been copied through the pool's pipes.
+
+    Added to `timings` are; `pool_queue_wait` and `pool_run`, as for `run_in_thread_pool`, and `thread_time` and
+    `process_time`; the cpu time that the call took in the child process.
+    """
+    call = _dump((func, args, kwargs))
+    try:
+        future = pool.submit(_call_in_process, time.monotonic(), call)
+    except BaseException:
+        if call[0] == "shared_memory":
+            # the call never reached a child.
+            _free(call[1])
+        raise
+    try:
+        child_timings, result = await asyncio.wrap_future(future)
+    except BaseException:
+        # eg the caller was cancelled. A call that has not started is cancelled, and one that has
+        # runs to completion; either way, its shared memory is freed once it is done.
+        future.cancel()
+        future.add_done_callback(functools.partial(_free_unconsumed, call))
+        raise
+    timings.update(child_timings)
+    succeeded, value = _load(result)
+    if not succeeded:
+        raise value
+    return value
+
+
+def _free_unconsumed(
+    call: typing.Tuple[typing.Any, ...],
+    future: "concurrent.futures.Future[typing.Any]",
+) -> None:
+    """
+    frees the shared memory of a call to `_call_in_process` whose result was never loaded.
+    The child frees the arguments of a call that it ran; the rest is freed here.
+    """
+    if future.cancelled() or future.exception() is not None:
+        # the call never ran, or the child died; it may not have got to the arguments.
+        if call[0] == "shared_memory":
+            _free(call[1])
+        return
+    _, result = future.result()
+    if result[0] == "shared_memory":
+        _free(result[1])
+
+
+def _free(name: str) -> None:
+    try:
+        shm = shared_memory.SharedMemory(name=name)
+    except FileNotFoundError:
+        return
+    shm.close()
+    shm.unlink()
@@ -1,22 +1,321 @@
 import json
+import struct
 import typing
 import datetime
 
+from . import broker
+from . import serializer
+from . import compression
+
 if typing.TYPE_CHECKING:
     from . import task
 
 
+# version 2 items are binary. They start with these bytes, which can never start a version 1(JSON text) item.
+_V2_MAGIC = b"\xffW"
+# The header of a version 2 item is:
+#   magic, version, flags, codec, eta, expires, current_retries, max_retries, len(task_id), len(hook_metadata)
+#   followed by the task_id and the hook_metadata.
+# flags: the lowest 3 bits are the id of the codec that compressed the body; see `wiji.compression.CODECS`
+#        the 4th bit is set if the body is a claim check; the key of the actual body in a `wiji.blobstore.BaseBlobStore`
+#        the 5th bit is set if the task has an idempotency key. It then follows the hook_metadata, prefixed with its length.
+# codec is the `codec_id` of the serializer that encoded the body.
+# eta and expires are unix timestamps; an expires of 0 means the task never expires.
+# The header is followed by the body; [args, kwargs] as encoded by the serializer.
+_V2_HEADER = struct.Struct("!2sBBBddIIHI")
+_V2_FLAG_COMPRESSION = 0x07
+_V2_FLAG_CLAIM_CHECK = 0x08
+_V2_FLAG_IDEMPOTENCY_KEY = 0x10
+_V2_IDEMPOTENCY_KEY_LENGTH = struct.Struct("!H")
+
+
+def decode_task_body(
+    codec: int,
+    compression_codec: int,
+    body: typing.Union[bytes, memoryview],
+    the_compression: typing.Union[None, compression.Compression] = None,
+    the_serializer: typing.Union[None, serializer.BaseSerializer] = None,
+) -> typing.Tuple[typing.Any, typing.Any]:
+    """
+    decode the body of a version 2 item into its args and kwargs.
+    This is a module-level function so that it can be sent to a process pool; see `wiji.offload.Offload`
+
+    Parameters:
+        codec: the `codec_id` of the serializer that encoded `body`.
+        compression_codec: the id of the codec that compressed `body`, if any.
+        body: the body; it is handed over as is, so that a view into the item or into a blob store is not copied.
+        the_compression: if given, decompressing the body is recorded in its metrics.
+        the_serializer: the serializer of the task that the item was dequeued for.
+                        A body that was encoded by any other serializer is only decoded if that serializer
+                        was registered; see :func:`wiji.serializer.register <wiji.serializer.register>`
+
+    Raises:
+        ValueError: `codec` is neither the codec of `the_serializer` nor of a registered serializer.
+    """
+    if the_serializer is None or the_serializer.codec_id != codec:
+        # look the serializer up before decompressing, so that a body that is rejected is never decompressed.
+        the_serializer = serializer.get(codec)
+    if compression_codec != compression.NONE:
+        if the_compression is not None:
+            body = the_compression.decompress(compression_codec, body)
+        else:
+            body = compression.decompress(compression_codec, body)
+    args, kwargs = the_serializer.loads(body)
+    return args, kwargs
+
+
+class Envelope:
+    """
+    a decoded item, as dequeued from a broker.
+    Items of every protocol version are decoded into this same shape; see :func:`Protocol.decode <Protocol.decode>`
+
+    The header(task_id, eta, expires, retries and hook_metadata) is available as soon as the item is decoded.
+    The body(args and kwargs) can be left undecoded and is then only decoded the first time that `args` or `kwargs` is accessed.
+    This lets a worker skip, hold on to or requeue a task without paying for decoding a body that may be large.
+    """
+
+    # an Envelope is created for every item that is dequeued; slots keep that cheap.
+    __slots__ = (
+        "version",
+        "task_id",
+        "eta",
+        "expires",
+        "current_retries",
+        "max_retries",
+        "hook_metadata",
+        "_args",
+        "_kwargs",
+        "_body",
+        "codec",
+        "compression_codec",
+        "claim_check",
+        "idempotency_key",
+    )
+
+    def __init__(
+        self,
+        version: int,
+        task_id: str,
+        eta: float,
+        current_retries: int,
+        max_retries: int,
+        hook_metadata: str,
+        expires: typing.Union[None, float] = None,
+        args: typing.Union[None, typing.List[typing.Any]] = None,
+        kwargs: typing.Union[None, typing.Dict[str, typing.Any]] = None,
+        body: typing.Union[None, bytes, memoryview] = None,
+        codec: int = serializer.JsonSerializer.codec_id,
+        compression_codec: int = compression.NONE,
+        claim_check: typing.Union[None, str] = None,
+        idempotency_key: typing.Union[None, str] = None,
+    ) -> None:
+        """
+        Parameters:
+            eta: the time, as a unix timestamp in seconds, at which the task becomes due.
+            expires: the time, as a unix timestamp in seconds, after which the task should no longer be executed.
+            args: the decoded args. Only one of `args`/`kwargs` or `body` should be given.
+            kwargs: the decoded kwargs.
+            body: the undecoded body.
+            codec: the `codec_id` of the serializer that encoded `body`.
+            compression_codec: the id of the codec that compressed `body`, if any.
+            claim_check: the key under which the body is kept in a blob store. The body is then given later
+                         via :func:`resolve_claim_check <Envelope.resolve_claim_check>`
+            idempotency_key: the idempotency key of the task, if it has one.
+        """
+        self.version = version
+        self.task_id = task_id
+        self.eta = eta
+        self.expires = expires
+        self.current_retries = current_retries
+        self.max_retries = max_retries
+        self.hook_metadata = hook_metadata
+        self._args = args
+        self._kwargs = kwargs
+        self._body = body
+        self.codec = codec
+        self.compression_codec = compression_codec
+        self.claim_check = claim_check
+        self.idempotency_key = idempotency_key
+
+    def has_expired(self, now: float) -> bool:
+        return self.expires is not None and self.expires <= now
+
+    def resolve_claim_check(self, body: typing.Union[bytes, memoryview]) -> None:
+        """
+        hand over the body that was fetched from the blob store using :attr:`claim_check <Envelope.claim_check>`
+        """
+        self._body = body
+
+    def decode_body(
+        self,
+        the_compression: typing.Union[None, compression.Compression] = None,
+        the_serializer: typing.Union[None, serializer.BaseSerializer] = None,
+    ) -> None:
+        """
+        decode the body, if it has not been decoded yet.
+
+        Parameters:
+            the_compression: if given, decompressing the body is recorded in its metrics.
+            the_serializer: the serializer of the task that the item was dequeued for.
+                            see :func:`decode_task_body <decode_task_body>`
+        """
+        if self._body is None and self._args is None and self.claim_check is not None:
+            raise ValueError(
+                "the body of task: {0} is in a blob store under the key: {1} and has not been fetched.".format(
+                    self.task_id, self.claim_check
+                )
+            )
+        if self._body is not None:
+            self.set_decoded_body(
+                *decode_task_body(
+                    codec=self.codec,
+                    compression_codec=self.compression_codec,
+                    body=self._body,
+                    the_compression=the_compression,
+                    the_serializer=the_serializer,
+                )
+            )
+
+    @property
+    def undecoded_body(self) -> typing.Union[None, bytes, memoryview]:
+        """
+        the body, if it has not been decoded yet.
+        """
+        return self._body
+
+    def set_decoded_body(self, args: typing.Any, kwargs: typing.Any) -> None:
+        """
+        hand over the args and kwargs that the body was decoded into, eg by :func:`decode_task_body <decode_task_body>`
+        """
+        self._args = args
+        self._kwargs = kwargs
+        # the raw body is no longer needed.
+        self._body = None
+
+    @property
+    def args(self) -> typing.List[typing.Any]:
+        self.decode_body()
+        if typing.TYPE_CHECKING:
+            assert isinstance(self._args, list)
+        return self._args
+
+    @property
+    def kwargs(self) -> typing.Dict[str, typing.Any]:
+        self.decode_body()
+        if typing.TYPE_CHECKING:
+            assert isinstance(self._kwargs, dict)
+        return self._kwargs
+
+    def dictsy(self) -> typing.Dict[str, typing.Any]:
+        expires = None
+        if self.expires is not None:
+            expires = Protocol._eta_from_timestamp(self.expires)
+        return {
+            "version": self.version,
+            "task_options": {
+                "eta": Protocol._eta_from_timestamp(self.eta),
+                "task_id": self.task_id,
+                "current_retries": self.current_retries,
+                "max_retries": self.max_retries,
+                "hook_metadata": self.hook_metadata,
+                "expires": expires,
+                "idempotency_key": self.idempotency_key,
+                "args": self.args,
+                "kwargs": self.kwargs,
+            },
+        }
+
+
 class Protocol:
-    def __init__(self, version: int, task_options: "task.TaskOptions") -> None:
-        self._validate_protocol_args(version=version, task_options=task_options)
+    """
+    the format in which tasks are sent to, and received from, brokers.
+
+    There are two versions:
+      - version 1: a JSON text object. eta is an ISO 8601-formatted string.
+      - version 2: a compact binary frame. The task options are packed into a fixed header, eta is a unix timestamp
+                   and only the args and kwargs are encoded by the task's serializer; JSON by default.
+                   The encoded args and kwargs can also be compressed, or be kept in a blob store with only
+                   a reference to them in the item.
+                   Brokers need to be able to store `bytes` to use this version.
+
+    Workers decode both versions, so producers can move from one version to the other while workers are running.
+    """
+
+    SUPPORTED_VERSIONS: typing.Tuple[int, ...] = (1, 2)
+
+    __slots__ = ("version", "task_options", "the_serializer", "the_compression")
+
+    def __init__(
+        self,
+        version: int,
+        task_options: "task.TaskOptions",
+        validate: bool = True,
+        the_serializer: typing.Union[None, serializer.BaseSerializer] = None,
+        the_compression: typing.Union[None, compression.Compression] = None,
+    ) -> None:
+        """
+        Parameters:
+            version: the version of the protocol.
+            task_options: the options of the task to be sent over the protocol.
+            validate: whether to validate `task_options`. Internal callers that create the task options themselves
+                      already know them to be valid and can skip this.
+            the_serializer: the serializer used to encode the args and kwargs of the task. Defaults to JSON.
+                            Only version 2 can carry serializers other than JSON.
+            the_compression: compresses the encoded args and kwargs. Only version 2 can carry compressed items.
+        """
+        if the_serializer is None:
+            the_serializer = serializer.get(serializer.JsonSerializer.codec_id)
+        if validate:
+            self._validate_protocol_args(
+                version=version,
+                task_options=task_options,
+                the_serializer=the_serializer,
+                the_compression=the_compression,
+            )
         self.version = version
         self.task_options = task_options
+        self.the_serializer = the_serializer
+        self.the_compression = the_compression
 
-    def _validate_protocol_args(self, version: int, task_options: "task.TaskOptions"):
+    def _validate_protocol_args(
+        self,
+        version: int,
+        task_options: "task.TaskOptions",
+        the_serializer: serializer.BaseSerializer,
+        the_compression: typing.Union[None, compression.Compression],
+    ) -> None:
         if not isinstance(version, int):
             raise ValueError(
                 """`version` should be of type:: `int` You entered: {0}""".format(type(version))
             )
+        if version not in self.SUPPORTED_VERSIONS:
+            raise ValueError(
+                """`version` should be one of: {0} You entered: {1}""".format(
+                    self.SUPPORTED_VERSIONS, version
+                )
+            )
+
+        if not isinstance(the_serializer, serializer.BaseSerializer):
+            raise ValueError(
+                """`the_serializer` should be of type:: `wiji.serializer.BaseSerializer` You entered: {0}""".format(
+                    type(the_serializer)
+                )
+            )
+        if version == 1 and not isinstance(the_serializer, serializer.JsonSerializer):
+            raise ValueError(
+                """version 1 of the protocol only supports the `json` serializer You entered: {0}""".format(
+                    the_serializer.name
+                )
+            )
+
+        if not isinstance(the_compression, (type(None), compression.Compression)):
+            raise ValueError(
+                """`the_compression` should be of type:: `None` or `wiji.compression.Compression` You entered: {0}""".format(
+                    type(the_compression)
+                )
+            )
+        if version == 1 and the_compression is not None:
+            raise ValueError("""version 1 of the protocol does not support compression""")
 
         from . import task
 
@@ -61,6 +360,18 @@ class Protocol:
                     type(task_options.hook_metadata)
                 )
             )
+        if not isinstance(task_options.expires, (type(None), str)):
+            raise ValueError(
+                """`task.TaskOptions.expires` should be of type:: `None` or `str` You entered: {0}""".format(
+                    type(task_options.expires)
+                )
+            )
+        if not isinstance(task_options.idempotency_key, (type(None), str)):
+            raise ValueError(
+                """`task.TaskOptions.idempotency_key` should be of type:: `None` or `str` You entered: {0}""".format(
+                    type(task_options.idempotency_key)
+                )
+            )
         if not isinstance(task_options.args, tuple):
             raise ValueError(
                 """`task.TaskOptions.args` should be of type:: `tuple` You entered: {0}""".format(
@@ -93,5 +404,182 @@ class Protocol:
         dt = datetime.datetime.fromisoformat(eta)
         return dt
 
+    @staticmethod
+    def _eta_from_timestamp(eta: float) -> str:
+        """
+        converts eta as a unix timestamp to python's ISO 8601-formatted datetime.
+        """
+        return datetime.datetime.fromtimestamp(eta, tz=datetime.timezone.utc).isoformat()
+
     def json(self) -> str:
         return json.dumps({"version": self.version, "task_options": self.task_options.dictsy()})
+
+    def encode_body(self) -> typing.Tuple[int, bytes]:
+        """
+        returns the flags and the body of a version 2 item; the body is the encoded, and possibly compressed, args and kwargs.
+        """
+        task_options = self.task_options
+        body = self.the_serializer.dumps([task_options.args, task_options.kwargs])
+        flags = compression.NONE
+        if self.the_compression is not None:
+            flags, body = self.the_compression.compress(body)
+        return flags, body
+
+    def binary(
+        self,
+        flags: typing.Union[None, int] = None,
+        body: typing.Union[None, bytes] = None,
+        claim_check: typing.Union[None, str] = None,
+    ) -> bytes:
+        """
+        returns the task as a version 2 item.
+
+        Parameters:
+            flags: the flags returned by :func:`encode_body <Protocol.encode_body>`; together with `body`.
+                   If not given, the body is encoded here.
+            body: the body returned by :func:`encode_body <Protocol.encode_body>`
+            claim_check: the key under which `body` was put in a blob store. The item then carries only this key.
+        """
+        if flags is None or body is None:
+            flags, body = self.encode_body()
+        if claim_check is not None:
+            flags = flags | _V2_FLAG_CLAIM_CHECK
+            body = claim_check.encode("ascii")
+
+        task_options = self.task_options
+        task_id = task_options.task_id.encode("utf-8")
+        hook_metadata = task_options.hook_metadata.encode("utf-8")
+        idempotency_key = b""
+        if task_options.idempotency_key is not None:
+            flags = flags | _V2_FLAG_IDEMPOTENCY_KEY
+            key = task_options.idempotency_key.encode("utf-8")
+            idempotency_key = _V2_IDEMPOTENCY_KEY_LENGTH.pack(len(key)) + key
+        return b"".join(
+            [
+                _V2_HEADER.pack(
+                    _V2_MAGIC,
+                    2,
+                    flags,
+                    self.the_serializer.codec_id,
+                    task_options._eta_timestamp,
+                    task_options._expires_timestamp or 0.0,
+                    task_options.current_retries,
+                    task_options.max_retries,
+                    len(task_id),
+                    len(hook_metadata),
+                ),
+                task_id,
+                hook_metadata,
+                idempotency_key,
+                body,
+            ]
+        )
+
+    def encode(self) -> typing.Union[str, bytes]:
+        """
+        returns the task as an item of this protocol's version; ready to be enqueued in a broker.
+        """
+        if self.version == 2:
+            return self.binary()
+        return self.json()
+
+    @staticmethod
+    def is_binary(item: broker.Item) -> bool:
+        """
+        whether `item` is a version 2 item.
+        """
+        return isinstance(item, (bytes, bytearray, memoryview)) and item[:2] == _V2_MAGIC
+
+    @staticmethod
+    def decode(item: broker.Item) -> Envelope:
+        """
+        decode an item of any protocol version.
+        For version 2 items only the header is decoded here, the body is decoded once it is needed.
+        Version 1 items are JSON text and are thus decoded whole.
+
+        Raises:
+            KeyError: the item is missing a required field.
+            ValueError: the item is malformed.
+        """
+        if Protocol.is_binary(item):
+            return Protocol._decode_binary(item)  # type: ignore
+
+        if isinstance(item, memoryview):
+            # `json` does not take memoryviews; this decodes the text without an intermediate bytes copy.
+            item = str(item, "utf-8")
+        dequeued_item = json.loads(item)
+        version = dequeued_item["version"]
+        _task_options = dequeued_item["task_options"]
+        # items queued by older versions of wiji do not have an expiry, nor an idempotency key.
+        expires = _task_options.get("expires")
+        return Envelope(
+            version=version,
+            task_id=_task_options["task_id"],
+            eta=Protocol._from_isoformat(_task_options["eta"]).timestamp(),
+            expires=Protocol._from_isoformat(expires).timestamp() if expires else None,
+            current_retries=_task_options["current_retries"],
+            max_retries=_task_options["max_retries"],
+            hook_metadata=_task_options["hook_metadata"],
+            args=_task_options["args"],
+            kwargs=_task_options["kwargs"],
+            idempotency_key=_task_options.get("idempotency_key"),
+        )
+
+    @staticmethod
+    def _decode_binary(item: typing.Union[bytes, bytearray, memoryview]) -> Envelope:
+        try:
+            (
+                _,
+                version,
+                flags,
+                codec,
+                eta,
+                expires,
+                current_retries,
+                max_retries,
+                task_id_length,
+                hook_metadata_length,
+            ) = _V2_HEADER.unpack_from(item)
+        except struct.error as e:
+            raise ValueError("item is not a valid version 2 item: {0}".format(str(e))) from e
+        if version != 2:
+            raise ValueError("binary items should be of version 2 You entered: {0}".format(version))
+
+        view = memoryview(item)
+        header_end = _V2_HEADER.size
+        task_id_end = header_end + task_id_length
+        hook_metadata_end = task_id_end + hook_metadata_length
+        task_id = str(view[header_end:task_id_end], "utf-8")
+        hook_metadata = str(view[task_id_end:hook_metadata_end], "utf-8")
+        body_start = hook_metadata_end
+        idempotency_key = None
+        if flags & _V2_FLAG_IDEMPOTENCY_KEY:
+            try:
+                (idempotency_key_length,) = _V2_IDEMPOTENCY_KEY_LENGTH.unpack_from(
+                    view, hook_metadata_end
+                )
+            except struct.error as e:
+                raise ValueError("item is not a valid version 2 item: {0}".format(str(e))) from e
+            key_start = hook_metadata_end + _V2_IDEMPOTENCY_KEY_LENGTH.size
+            body_start = key_start + idempotency_key_length
+            idempotency_key = str(view[key_start:body_start], "utf-8")
+        body: typing.Union[None, memoryview] = view[body_start:]
+        claim_check = None
+        if flags & _V2_FLAG_CLAIM_CHECK:
+            claim_check = str(view[body_start:], "ascii")
+            body = None
+        return Envelope(
+            version=version,
+            task_id=task_id,
+            eta=eta,
+            expires=expires or None,
+            current_retries=current_retries,
+            max_retries=max_retries,
+            hook_metadata=hook_metadata,
+            # a view; the body is not copied until it is decoded.
+            body=body,
+            codec=codec,
+            compression_codec=flags & _V2_FLAG_COMPRESSION,
+            claim_check=claim_check,
+            idempotency_key=idempotency_key,
+        )
@@ -54,6 +54,31 @@ class BaseRateLimiter(abc.ABC):
         """
         raise NotImplementedError("`notify` method must be implemented.")
 
+    async def notify_many(
+        self,
+        task_name: str,
+        task_ids: typing.List[str],
+        queue_name: str,
+        state: "task.TaskState",
+        queuing_duration: typing.Union[None, typing.Dict[str, float]] = None,
+        queuing_exception: typing.Union[None, Exception] = None,
+    ) -> None:
+        """
+        called by `wiji.task.Task.delay_many` once it has finished queuing a batch of tasks to the broker.
+        `queuing_duration` is for the whole batch.
+
+        Implementing this method is optional. The default implementation calls :func:`notify <BaseRateLimiter.notify>` once per task.
+        """
+        for task_id in task_ids:
+            await self.notify(
+                task_name=task_name,
+                task_id=task_id,
+                queue_name=queue_name,
+                state=state,
+                queuing_duration=queuing_duration,
+                queuing_exception=queuing_exception,
+            )
+
 
 class SimpleRateLimiter(BaseRateLimiter):
     """
@@ -188,3 +213,27 @@ class SimpleRateLimiter(BaseRateLimiter):
                     "return_value": return_value,
                 },
             )
+
+    async def notify_many(
+        self,
+        task_name: str,
+        task_ids: typing.List[str],
+        queue_name: str,
+        state: "task.TaskState",
+        queuing_duration: typing.Union[None, typing.Dict[str, float]] = None,
+        queuing_exception: typing.Union[None, Exception] = None,
+    ) -> None:
+        if queue_name != task._watchdogTask.queue_name:
+            self.logger.log(
+                logging.DEBUG,
+                {
+                    "event": "wiji.SimpleRateLimiter.notify_many",
+                    "stage": "end",
+                    "state": state,
+                    "task_name": task_name,
+                    "num_tasks": len(task_ids),
+                    "queue_name": queue_name,
+                    "queuing_duration": queuing_duration,
+                    "queuing_exception": str(queuing_exception),
+                },
+            )
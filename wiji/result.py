@@ -0,0 +1,388 @@
+import abc
+import time
+import typing
+import asyncio
+import sqlite3
+import threading
+import collections
+
+from . import serializer
+
+
+class TaskExecutionError(Exception):
+    """
+    The task, whose result was asked for, raised an error when it was executed.
+    """
+
+    pass
+
+
+class BaseResultBackend(abc.ABC):
+    """
+    This is the interface that must be implemented to satisfy wiji's result backend.
+    User implementations should inherit this class and
+    implement the :func:`set <BaseResultBackend.set>` and :func:`get <BaseResultBackend.get>` methods with the type signatures shown.
+
+    Workers store the outcome of each task that they execute in the result backend, and producers fetch it from there
+    via :func:`TaskHandle.result <TaskHandle.result>`. Thus both the producers and the workers of a task need access
+    to the same result backend.
+
+    Results should be kept for no longer than :attr:`ttl <BaseResultBackend.ttl>` seconds,
+    and no more than :attr:`maxsize <BaseResultBackend.maxsize>` results should be kept; the oldest are evicted first.
+    """
+
+    # the duration, in seconds, for which results are kept.
+    ttl: float = 24 * 60 * 60.0
+    # the maximum number of results that are kept.
+    maxsize: int = 100_000
+    # how often :func:`wait <BaseResultBackend.wait>` checks for a result; for backends that can not notify waiters.
+    poll_interval: float = 0.5
+
+    @abc.abstractmethod
+    async def set(self, task_id: str, value: bytes) -> None:
+        """
+        store `value` as the result of the task with id `task_id`
+        """
+        raise NotImplementedError("`set` method must be implemented.")
+
+    @abc.abstractmethod
+    async def get(self, task_id: str) -> bytes:
+        """
+        return the result of the task with id `task_id`
+
+        Raises:
+            KeyError: there is no result for the task; eg because it has not been executed yet or it has expired.
+        """
+        raise NotImplementedError("`get` method must be implemented.")
+
+    async def wait(self, task_id: str, timeout: typing.Union[None, float] = None) -> bytes:
+        """
+        return the result of the task with id `task_id`; waiting for it for upto `timeout` seconds.
+        None means wait forever.
+
+        Implementing this method is optional. The default implementation polls :func:`get <BaseResultBackend.get>`
+        every :attr:`poll_interval <BaseResultBackend.poll_interval>` seconds.
+        Backends that can be notified of new results should override it.
+
+        Raises:
+            asyncio.TimeoutError: there was no result within `timeout` seconds.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            try:
+                return await self.get(task_id)
+            except KeyError:
+                pass
+            delay = self.poll_interval
+            if deadline is not None:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise asyncio.TimeoutError(
+                        "there was no result for the task: {0} within {1} seconds".format(
+                            task_id, timeout
+                        )
+                    )
+                delay = min(delay, remaining)
+            await asyncio.sleep(delay)
+
+
+class _Waiters:
+    """
+    futures of the callers that are waiting for results, by task id; so that they can be woken once a result is set.
+    """
+
+    def __init__(self) -> None:
+        self._futures: typing.Dict[str, typing.List["asyncio.Future[None]"]] = (
+            collections.defaultdict(list)
+        )
+
+    def add(self, task_id: str) -> "asyncio.Future[None]":
+        future = asyncio.get_event_loop().create_future()
+        self._futures[task_id].append(future)
+        return future
+
+    def remove(self, task_id: str, future: "asyncio.Future[None]") -> None:
+        futures = self._futures.get(task_id)
+        if futures is None:
+            return
+        if future in futures:
+            futures.remove(future)
+        if not futures:
+            del self._futures[task_id]
+
+    def wake(self, task_id: str) -> None:
+        for future in self._futures.pop(task_id, []):
+            if not future.done():
+                future.set_result(None)
+
+
+class InMemoryResultBackend(BaseResultBackend):
+    """
+    This is an implementation of BaseResultBackend that keeps results in memory.
+    It is only useful when the producers and the workers of a task are in the same process; eg in tests.
+    Callers waiting for a result are woken as soon as it is set.
+
+    example usage:
+
+    .. code-block:: python
+
+        class MyTask(wiji.task.Task):
+            the_broker = wiji.broker.InMemoryBroker()
+            queue_name = "MyQueue"
+            the_result_backend = wiji.result.InMemoryResultBackend()
+
+        handle = await MyTask().delay(1, b=2)
+        print(await handle.result(timeout=10.0))
+    """
+
+    def __init__(self, ttl: float = 24 * 60 * 60.0, maxsize: int = 100_000) -> None:
+        """
+        Parameters:
+            ttl: the duration, in seconds, for which results are kept.
+            maxsize: the maximum number of results that are kept.
+        """
+        _validate_args(ttl=ttl, maxsize=maxsize)
+        self.ttl = ttl
+        self.maxsize = maxsize
+        # task_id -> (expiry, value); in the order in which they were set, thus also in the order in which they expire.
+        self._results: "collections.OrderedDict[str, typing.Tuple[float, bytes]]" = (
+            collections.OrderedDict()
+        )
+        self._waiters = _Waiters()
+
+    def _evict(self, now: float) -> None:
+        results = self._results
+        while results and (len(results) > self.maxsize or next(iter(results.values()))[0] <= now):
+            results.popitem(last=False)
+
+    async def set(self, task_id: str, value: bytes) -> None:
+        now = time.monotonic()
+        self._results.pop(task_id, None)
+        self._results[task_id] = (now + self.ttl, value)
+        self._evict(now)
+        self._waiters.wake(task_id)
+
+    async def get(self, task_id: str) -> bytes:
+        self._evict(time.monotonic())
+        return self._results[task_id][1]
+
+    async def wait(self, task_id: str, timeout: typing.Union[None, float] = None) -> bytes:
+        try:
+            return await self.get(task_id)
+        except KeyError:
+            pass
+        future = self._waiters.add(task_id)
+        try:
+            await asyncio.wait_for(future, timeout=timeout)
+        finally:
+            self._waiters.remove(task_id, future)
+        return await self.get(task_id)
+
+
+class SqliteResultBackend(BaseResultBackend):
+    """
+    This is an implementation of BaseResultBackend that keeps results in an sqlite database.
+    The database file can be shared by the producers and workers that are on the same host.
+
+    Callers waiting for a result that is set by a worker in the same process are woken as soon as it is set.
+    Results set by other processes are polled for every `poll_interval` seconds.
+
+    example usage:
+
+    .. code-block:: python
+
+        class MyTask(wiji.task.Task):
+            the_broker = MyBroker()
+            queue_name = "MyQueue"
+            the_result_backend = wiji.result.SqliteResultBackend(path="/var/lib/myapp/wiji-results.sqlite")
+    """
+
+    def __init__(
+        self,
+        path: str,
+        ttl: float = 24 * 60 * 60.0,
+        maxsize: int = 100_000,
+        poll_interval: float = 0.5,
+    ) -> None:
+        """
+        Parameters:
+            path: the path of the database file. It is created if it does not exist.
+            ttl: the duration, in seconds, for which results are kept.
+            maxsize: the maximum number of results that are kept.
+            poll_interval: how often, in seconds, to check for results that are set by other processes.
+        """
+        if not isinstance(path, str):
+            raise ValueError(
+                """`path` should be of type:: `str` You entered: {0}""".format(type(path))
+            )
+        _validate_args(ttl=ttl, maxsize=maxsize)
+        if not isinstance(poll_interval, float):
+            raise ValueError(
+                """`poll_interval` should be of type:: `float` You entered: {0}""".format(
+                    type(poll_interval)
+                )
+            )
+        self.path = path
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self.poll_interval = poll_interval
+        self._waiters = _Waiters()
+
+        # the connection is used from the threads of the event loop's default executor, one at a time.
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+        with self._lock:
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS wiji_results "
+                "(task_id TEXT PRIMARY KEY, value BLOB NOT NULL, expires REAL NOT NULL)"
+            )
+            self._connection.execute(
+                "CREATE INDEX IF NOT EXISTS wiji_results_expires ON wiji_results (expires)"
+            )
+
+    def _set(self, task_id: str, value: bytes) -> None:
+        # wall clock time, since the database can be shared by processes.
+        now = time.time()
+        with self._lock:
+            self._connection.execute(
+                "INSERT OR REPLACE INTO wiji_results (task_id, value, expires) VALUES (?, ?, ?)",
+                (task_id, value, now + self.ttl),
+            )
+            self._connection.execute("DELETE FROM wiji_results WHERE expires <= ?", (now,))
+            self._connection.execute(
+                "DELETE FROM wiji_results WHERE task_id IN "
+                "(SELECT task_id FROM wiji_results ORDER BY expires DESC LIMIT -1 OFFSET ?)",
+                (self.maxsize,),
+            )
+
+    def _get(self, task_id: str) -> bytes:
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT value FROM wiji_results WHERE task_id = ? AND expires > ?",
+                (task_id, time.time()),
+            ).fetchone()
+        if row is None:
+            raise KeyError(task_id)
+        return typing.cast(bytes, row[0])
+
+    async def set(self, task_id: str, value: bytes) -> None:
+        loop = asyncio.get_event_loop()
+        await loop.run_in_executor(None, self._set, task_id, value)
+        self._waiters.wake(task_id)
+
+    async def get(self, task_id: str) -> bytes:
+        loop = asyncio.get_event_loop()
+        return await loop.run_in_executor(None, self._get, task_id)
+
+    async def wait(self, task_id: str, timeout: typing.Union[None, float] = None) -> bytes:
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            try:
+                return await self.get(task_id)
+            except KeyError:
+                pass
+            delay = self.poll_interval
+            if deadline is not None:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise asyncio.TimeoutError(
+                        "there was no result for the task: {0} within {1} seconds".format(
+                            task_id, timeout
+                        )
+                    )
+                delay = min(delay, remaining)
+            # woken early if the result is set by this process; otherwise check the database again.
+            future = self._waiters.add(task_id)
+            try:
+                await asyncio.wait([future], timeout=delay)
+            finally:
+                self._waiters.remove(task_id, future)
+
+
+def _validate_args(ttl: float, maxsize: int) -> None:
+    if not isinstance(ttl, float):
+        raise ValueError("""`ttl` should be of type:: `float` You entered: {0}""".format(type(ttl)))
+    if ttl <= 0:
+        raise ValueError("""`ttl` should be greater than 0 You entered: {0}""".format(ttl))
+    if not isinstance(maxsize, int):
+        raise ValueError(
+            """`maxsize` should be of type:: `int` You entered: {0}""".format(type(maxsize))
+        )
+    if maxsize <= 0:
+        raise ValueError("""`maxsize` should be greater than 0 You entered: {0}""".format(maxsize))
+
+
+# the states of a result, as stored in a result backend.
+_SUCCEEDED = "succeeded"
+_FAILED = "failed"
+# the task was retried, and thus its result is the result of the retry; which has a task id of its own.
+_RETRIED = "retried"
+
+
+def _encode_result(
+    the_serializer: serializer.BaseSerializer,
+    return_value: typing.Any,
+    execution_exception: typing.Union[None, Exception],
+    retried_as: typing.Union[None, str],
+) -> bytes:
+    if retried_as is not None:
+        return the_serializer.dumps([_RETRIED, retried_as])
+    if execution_exception is not None:
+        return the_serializer.dumps(
+            [_FAILED, "{0}: {1}".format(type(execution_exception).__name__, execution_exception)]
+        )
+    return the_serializer.dumps([_SUCCEEDED, return_value])
+
+
+class TaskHandle:
+    """
+    a handle to a task that has been queued; as returned by `wiji.task.Task.delay`
+    """
+
+    __slots__ = ("task_id", "the_result_backend", "the_serializer")
+
+    def __init__(
+        self,
+        task_id: str,
+        the_result_backend: typing.Union[None, BaseResultBackend],
+        the_serializer: serializer.BaseSerializer,
+    ) -> None:
+        self.task_id = task_id
+        self.the_result_backend = the_result_backend
+        self.the_serializer = the_serializer
+
+    def __repr__(self) -> str:
+        return "TaskHandle(task_id={0!r})".format(self.task_id)
+
+    async def result(self, timeout: typing.Union[None, float] = None) -> typing.Any:
+        """
+        returns the return value of the task, once it has been executed. If the task is retried, that of its last retry.
+
+        Parameters:
+            timeout: the duration, in seconds, to wait for the result. None means wait forever.
+
+        Raises:
+            ValueError: the task does not have a result backend.
+            asyncio.TimeoutError: the task was not executed within `timeout` seconds.
+            TaskExecutionError: the task raised an error.
+        """
+        if self.the_result_backend is None:
+            raise ValueError(
+                "the task: {0} does not have a result backend; see `wiji.task.Task.the_result_backend`".format(
+                    self.task_id
+                )
+            )
+        deadline = None if timeout is None else time.monotonic() + timeout
+        task_id = self.task_id
+        while True:
+            remaining = None if deadline is None else max(0.0, deadline - time.monotonic())
+            state, value = self.the_serializer.loads(
+                await self.the_result_backend.wait(task_id, timeout=remaining)
+            )
+            if state == _SUCCEEDED:
+                return value
+            if state == _FAILED:
+                raise TaskExecutionError(
+                    "the task: {0} raised an error. error: {1}".format(task_id, value)
+                )
+            task_id = value
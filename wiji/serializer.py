@@ -0,0 +1,158 @@
+import abc
+import json
+import pickle
+import typing
+import marshal
+
+
+class BaseSerializer(abc.ABC):
+    """
+    This is the interface that must be implemented to satisfy wiji's serializer.
+    User implementations should inherit this class, set the :attr:`codec_id <BaseSerializer.codec_id>` and
+    :attr:`name <BaseSerializer.name>` attributes and implement the :func:`dumps <BaseSerializer.dumps>` and
+    :func:`loads <BaseSerializer.loads>` methods with the type signatures shown.
+
+    A serializer encodes the args and kwargs of a task. The `codec_id` of the serializer is tagged in each item.
+    A worker decodes items that were encoded by its task's own serializer. It only decodes items that were encoded
+    by any other serializer if that serializer was registered with :func:`register <register>`; only
+    :class:`JsonSerializer <JsonSerializer>` is registered by default. Any other item is rejected.
+    """
+
+    # a number from 0 to 255 that identifies the serializer in each item. It should never change once items have been queued.
+    # 0 to 63 are reserved for serializers that ship with wiji.
+    codec_id: int
+    name: str
+
+    @abc.abstractmethod
+    def dumps(self, obj: typing.Any) -> bytes:
+        """
+        encode `obj`; which is a list of the task's args and kwargs.
+        """
+        raise NotImplementedError("`dumps` method must be implemented.")
+
+    @abc.abstractmethod
+    def loads(self, data: typing.Union[bytes, memoryview]) -> typing.Any:
+        """
+        decode `data` that was encoded by :func:`dumps <BaseSerializer.dumps>`
+        `data` may be a memoryview into the dequeued item or into a blob store; it should not be copied unless the
+        underlying codec requires it.
+        """
+        raise NotImplementedError("`loads` method must be implemented.")
+
+
+class JsonSerializer(BaseSerializer):
+    """
+    This is an implementation of BaseSerializer that uses JSON.
+    It is the default serializer.
+    """
+
+    codec_id = 1
+    name = "json"
+
+    def dumps(self, obj: typing.Any) -> bytes:
+        return json.dumps(obj, separators=(",", ":")).encode("utf-8")
+
+    def loads(self, data: typing.Union[bytes, memoryview]) -> typing.Any:
+        # decoding straight to text is one copy less than going through `bytes`
+        return json.loads(str(data, "utf-8"))
+
+
+class PickleSerializer(BaseSerializer):
+    """
+    This is an implementation of BaseSerializer that uses pickle.
+    It can encode most python objects, but decoding a pickle can execute arbitrary code.
+    Only use it if everyone who can write to the broker is trusted.
+    It is not registered by default; so only the workers of tasks that use it will decode pickled items.
+    """
+
+    codec_id = 2
+    name = "pickle"
+
+    def __init__(self, protocol: int = 4) -> None:
+        """
+        Parameters:
+            protocol: the pickle protocol to use. Every python version that runs producers or workers should support it.
+        """
+        if not isinstance(protocol, int):
+            raise ValueError(
+                """`protocol` should be of type:: `int` You entered: {0}""".format(type(protocol))
+            )
+        self.protocol = protocol
+
+    def dumps(self, obj: typing.Any) -> bytes:
+        return pickle.dumps(obj, protocol=self.protocol)
+
+    def loads(self, data: typing.Union[bytes, memoryview]) -> typing.Any:
+        return pickle.loads(data)  # nosec
+
+
+class MarshalSerializer(BaseSerializer):
+    """
+    This is an implementation of BaseSerializer that uses marshal.
+    It is fast but can only encode python's builtin types, and producers and workers should run the same python version.
+    It is not registered by default; see :class:`PickleSerializer <PickleSerializer>`
+    """
+
+    codec_id = 3
+    name = "marshal"
+
+    def dumps(self, obj: typing.Any) -> bytes:
+        return marshal.dumps(obj)
+
+    def loads(self, data: typing.Union[bytes, memoryview]) -> typing.Any:
+        return marshal.loads(data)  # nosec
+
+
+# codec_id -> serializer
+_REGISTRY: typing.Dict[int, BaseSerializer] = {}
+
+
+def register(serializer: BaseSerializer) -> None:
+    """
+    register a serializer, so that workers can decode items that were encoded with it
+    even if their task uses a different serializer.
+    Registering a serializer allows every worker in the process to decode its items; do not register a serializer
+    that can execute arbitrary code, like :class:`PickleSerializer <PickleSerializer>`, unless everyone who can write
+    to the brokers is trusted.
+
+    Raises:
+        ValueError: a different serializer is already registered with the same `codec_id`
+    """
+    if not isinstance(serializer, BaseSerializer):
+        raise ValueError(
+            """`serializer` should be of type:: `wiji.serializer.BaseSerializer` You entered: {0}""".format(
+                type(serializer)
+            )
+        )
+    if not isinstance(serializer.codec_id, int) or not (0 <= serializer.codec_id <= 255):
+        raise ValueError(
+            """`codec_id` should be an `int` from 0 to 255 You entered: {0}""".format(
+                serializer.codec_id
+            )
+        )
+    registered = _REGISTRY.get(serializer.codec_id)
+    if registered is not None and type(registered) is not type(serializer):
+        raise ValueError(
+            """`codec_id` {0} is already used by the serializer: {1}""".format(
+                serializer.codec_id, registered.name
+            )
+        )
+    _REGISTRY[serializer.codec_id] = serializer
+
+
+def get(codec_id: int) -> BaseSerializer:
+    """
+    returns the serializer registered with `codec_id`
+
+    Raises:
+        ValueError: no serializer is registered with `codec_id`
+    """
+    try:
+        return _REGISTRY[codec_id]
+    except KeyError:
+        raise ValueError(
+            """no serializer is registered with `codec_id`: {0}""".format(codec_id)
+        ) from None
+
+
+register(JsonSerializer())
@@ -1,16 +1,27 @@
+import os
 import abc
 import time
 import enum
-import uuid
 import typing
 import asyncio
 import logging
 import inspect
+import functools
+import contextvars
+import concurrent.futures
 
 from . import hook
 from . import logger
 from . import broker
 from . import protocol
+from . import serializer
+from . import ids
+from . import pool
+from . import dedup
+from . import result
+from . import offload
+from . import blobstore
+from . import compression
 from . import ratelimiter
 
 
@@ -38,18 +49,51 @@ class TaskQueueingError(Exception):
 
 @enum.unique
 class TaskState(enum.Enum):
-    QUEUEING: int = 1
-    QUEUED: int = 2
-    DEQUEUED: int = 3
-    EXECUTING: int = 4
-    EXECUTED: int = 5
+    QUEUEING = 1
+    QUEUED = 2
+    DEQUEUED = 3
+    EXECUTING = 4
+    EXECUTED = 5
+    EXPIRED = 6
+    DUPLICATE = 7
 
 
 class TaskOptions:
+    # a TaskOptions is created for every task that is queued; slots keep that cheap.
+    __slots__ = (
+        "eta",
+        "_eta_timestamp",
+        "expires",
+        "_expires_timestamp",
+        "task_id",
+        "current_retries",
+        "max_retries",
+        "hook_metadata",
+        "idempotency_key",
+        "args",
+        "kwargs",
+    )
+
     def __init__(
-        self, eta: float = 0.00, max_retries: int = 0, hook_metadata: typing.Union[None, str] = None
+        self,
+        eta: float = 0.00,
+        max_retries: int = 0,
+        hook_metadata: typing.Union[None, str] = None,
+        expires: typing.Union[None, float] = None,
+        idempotency_key: typing.Union[None, str] = None,
     ):
         """
+        Parameters:
+            eta: the duration, in seconds, after which the task becomes due.
+            max_retries: the maximum number of times that the task can be retried.
+            hook_metadata: any extra information that should be passed on to the hooks.
+            expires: the duration, in seconds, after which the task should no longer be executed.
+                     A worker that dequeues the task after that does not execute it, but reports it as `TaskState.EXPIRED`.
+                     None means the task never expires.
+            idempotency_key: identifies the logical job that the task does. Tasks queued with the same key are
+                             duplicates of each other and only the first is queued and executed;
+                             if the task has :attr:`the_dedup <Task.the_dedup>`. None means the task has no duplicates.
+
         this are the options that you can supply when calling `task.delay`
         ie, they are the config options that only apply to that `task.delay` invocation eg `eta`
 
@@ -58,11 +102,23 @@ class TaskOptions:
         Note that a `Task` class does not have a `TaskOptions` attribute at creation time, it gets one when `task.delay` is first called.
         """
         self._validate_task_options_args(
-            eta=eta, max_retries=max_retries, hook_metadata=hook_metadata
+            eta=eta,
+            max_retries=max_retries,
+            hook_metadata=hook_metadata,
+            expires=expires,
+            idempotency_key=idempotency_key,
         )
         if eta < 0.00:
             eta = 0.00
-        self.eta = protocol.Protocol._eta_to_isoformat(eta=eta)
+        now = time.time()
+        # the same eta as a unix timestamp; for brokers that support delayed delivery.
+        self._eta_timestamp: float = now + eta
+        self.eta = protocol.Protocol._eta_from_timestamp(eta=self._eta_timestamp)
+        self.expires: typing.Union[None, str] = None
+        self._expires_timestamp: typing.Union[None, float] = None
+        if expires is not None:
+            self._expires_timestamp = now + expires
+            self.expires = protocol.Protocol._eta_from_timestamp(eta=self._expires_timestamp)
         self.task_id = ""
         self.current_retries: int = 0
         self.max_retries = max_retries
@@ -73,15 +129,21 @@ class TaskOptions:
             self.hook_metadata = hook_metadata
         else:
             self.hook_metadata = ""
+        self.idempotency_key = idempotency_key
 
         self.args: tuple = ()
         self.kwargs: dict = {}
 
     def __str__(self):
-        return str(self.__dict__)
+        return str(self.dictsy())
 
     def _validate_task_options_args(
-        self, eta: float, max_retries: int, hook_metadata: typing.Union[None, str]
+        self,
+        eta: float,
+        max_retries: int,
+        hook_metadata: typing.Union[None, str],
+        expires: typing.Union[None, float],
+        idempotency_key: typing.Union[None, str],
     ) -> None:
         if not isinstance(eta, float):
             raise ValueError(
@@ -99,19 +161,159 @@ class TaskOptions:
                     type(hook_metadata)
                 )
             )
+        if not isinstance(expires, (type(None), float)):
+            raise ValueError(
+                """`expires` should be of type:: `None` or `float` You entered: {0}""".format(
+                    type(expires)
+                )
+            )
+        if not isinstance(idempotency_key, (type(None), str)):
+            raise ValueError(
+                """`idempotency_key` should be of type:: `None` or `str` You entered: {0}""".format(
+                    type(idempotency_key)
+                )
+            )
+        if idempotency_key is not None and not 0 < len(idempotency_key.encode("utf-8")) <= 1024:
+            raise ValueError(
+                """`idempotency_key` should be between 1 and 1024 bytes long You entered: {0}""".format(
+                    idempotency_key
+                )
+            )
 
-    def dictsy(self):
+    def dictsy(self) -> typing.Dict[str, typing.Any]:
         return {
             "eta": self.eta,
             "task_id": self.task_id,
             "current_retries": self.current_retries,
             "max_retries": self.max_retries,
             "hook_metadata": self.hook_metadata,
+            "expires": self.expires,
+            "idempotency_key": self.idempotency_key,
             "args": self.args,
             "kwargs": self.kwargs,
         }
 
 
+class TaskContext:
+    """
+    the state of one execution of a task; as opposed to the state of the `Task` instance, which is shared by all its executions.
+    The worker sets it up before calling the task's `run` method and it can be reached from within `run`
+    via :attr:`Task.context <Task.context>`
+
+    It is kept in a context variable, so executions of the same `Task` instance that overlap never see each other's context.
+    """
+
+    __slots__ = (
+        "task_id",
+        "eta",
+        "current_retries",
+        "max_retries",
+        "hook_metadata",
+        "retrying",
+        "retried_as",
+    )
+
+    def __init__(
+        self,
+        task_id: str = "",
+        eta: float = 0.0,
+        current_retries: int = 0,
+        max_retries: int = 0,
+        hook_metadata: str = "",
+    ) -> None:
+        """
+        Parameters:
+            task_id: the id of the task that is been executed.
+            eta: the time, as a unix timestamp in seconds, at which the task became due.
+            current_retries: the number of times that the task has been retried so far.
+            max_retries: the maximum number of times that the task can be retried.
+            hook_metadata: any extra information that was passed on to the hooks.
+        """
+        self.task_id = task_id
+        self.eta = eta
+        self.current_retries = current_retries
+        self.max_retries = max_retries
+        self.hook_metadata = hook_metadata
+        # set by `Task.retry` once the task has been queued again.
+        self.retrying: bool = False
+        # the task id of the retry.
+        self.retried_as: typing.Union[None, str] = None
+
+    def __str__(self) -> str:
+        return str({name: getattr(self, name) for name in self.__slots__})
+
+
+# the context of the execution of a task that is running in the current asyncio.Task; None outside of an execution.
+_TASK_CONTEXT: "contextvars.ContextVar[typing.Union[None, TaskContext]]" = contextvars.ContextVar(
+    "wiji_task_context", default=None
+)
+
+
+def _clocks() -> typing.Tuple[float, float, float, float]:
+    """
+    returns the current reading of each of the clocks that hooks are given durations for.
+    """
+    return (time.thread_time(), time.perf_counter(), time.monotonic(), time.process_time())
+
+
+def _durations(clocks_start: typing.Tuple[float, float, float, float]) -> typing.Dict[str, float]:
+    """
+    returns the time, in seconds, that has passed on each clock since `clocks_start`; as passed on to hooks.
+    """
+    thread_time, perf_counter, monotonic, process_time = _clocks()
+    return {
+        "thread_time": round(thread_time - clocks_start[0], 4),
+        "perf_counter": round(perf_counter - clocks_start[1], 4),
+        "monotonic": round(monotonic - clocks_start[2], 4),
+        "process_time": round(process_time - clocks_start[3], 4),
+    }
+
+
+def _estimate_size(value: typing.Any, limit: int) -> int:
+    """
+    returns a cheap, rough, estimate of the number of bytes that `value` takes up once it is encoded.
+    Only strings and bytes are counted by their length; the walk stops as soon as the estimate reaches `limit`.
+    """
+    size = 0
+    stack = [value]
+    while stack and size < limit:
+        value = stack.pop()
+        if isinstance(value, (str, bytes, bytearray)):
+            size += len(value)
+        elif isinstance(value, memoryview):
+            size += value.nbytes
+        elif isinstance(value, dict):
+            # containers count for a byte too, so that the walk ends even if they refer to themselves.
+            size += 1
+            stack.extend(value.keys())
+            stack.extend(value.values())
+        elif isinstance(value, (list, tuple, set, frozenset)):
+            size += 1
+            stack.extend(value)
+        else:
+            size += 8
+    return size
+
+
+def _pool_name(name: typing.Union[None, str], size: int) -> str:
+    """
+    returns the name of the pool that a task runs in; tasks that do not name their pool share one per size.
+    """
+    if name is None:
+        return "default-{0}".format(size)
+    return name
+
+
+def _encode_protocols(
+    protos: typing.List[protocol.Protocol],
+) -> typing.List[typing.Any]:
+    """
+    returns, for each protocol; the whole item for version 1 and the flags and body for version 2.
+    This is a module-level function so that it can be sent to a process pool; see `wiji.offload.Offload`
+    """
+    return [proto.encode() if proto.version == 1 else proto.encode_body() for proto in protos]
+
+
 class Task(abc.ABC):
     """
     usage:
@@ -137,6 +339,60 @@ class Task(abc.ABC):
     the_hook: typing.Union[None, hook.BaseHook] = None
     the_ratelimiter: typing.Union[None, ratelimiter.BaseRateLimiter] = None
 
+    # the version of `wiji.protocol.Protocol` used to send this task's items to the broker.
+    # None means use the broker's :attr:`protocol_version <wiji.broker.BaseBroker.protocol_version>`
+    protocol_version: typing.Union[None, int] = None
+
+    # the serializer used to encode the args and kwargs of this task. The default is JSON.
+    # serializers other than JSON need version 2 of the protocol, which is then used regardless of the broker's `protocol_version`
+    the_serializer: typing.Union[None, serializer.BaseSerializer] = None
+
+    # compresses the args and kwargs of large items; see `wiji.compression.Compression`
+    # None means use the broker's :attr:`the_compression <wiji.broker.BaseBroker.the_compression>`
+    # compression needs version 2 of the protocol, which is then used regardless of the broker's `protocol_version`
+    the_compression: typing.Union[None, compression.Compression] = None
+
+    # args and kwargs that are larger than the blob store's threshold are put in the blob store,
+    # and only a reference to them is sent through the broker. Workers of this task need access to the same blob store.
+    # a blob store needs version 2 of the protocol, which is then used regardless of the broker's `protocol_version`
+    the_blob_store: typing.Union[None, blobstore.BaseBlobStore] = None
+
+    # workers store the return value of every task that they execute in the result backend,
+    # and producers can then wait for it via the handle that `delay` returns. see `wiji.result.TaskHandle`
+    # the return values should be serializable by `the_serializer`
+    the_result_backend: typing.Union[None, result.BaseResultBackend] = None
+
+    # suppresses duplicate tasks; those that are queued with an idempotency key that has already been seen.
+    # see :attr:`TaskOptions.idempotency_key <TaskOptions.idempotency_key>` and `wiji.dedup.Dedup`
+    # Workers that dequeue a duplicate do not execute it, but report it as `TaskState.DUPLICATE`.
+    the_dedup: typing.Union[None, dedup.Dedup] = None
+
+    # decides whether large items are encoded by producers, and decoded by workers, away from the event loop.
+    # None means use `wiji.offload.Offload` with its defaults.
+    the_offload: typing.Union[None, offload.Offload] = None
+
+    # generates the id of every task that is queued. None means use `wiji.ids.UlidGenerator`; time ordered ids.
+    the_task_id_generator: typing.Union[None, ids.BaseTaskIdGenerator] = None
+
+    # how `run` is executed. One of:
+    #   - "async": `run` is a coroutine that is awaited on the event loop. This is the default.
+    #   - "thread": `run` is called in a thread pool, so that it can block(eg on network or disk IO) without
+    #     blocking the event loop. `run` should then be a plain function, ie `def run` rather than `async def run`
+    #   - "process": `run` is called in a process pool, so that cpu-bound work runs on other cores and does not
+    #     hold up the event loop. `run` should be a plain function and the task class should be defined at the top
+    #     level of a module. The args, kwargs and return value of `run` should be picklable.
+    execution_mode: str = "async"
+    # the thread pool used by the "thread" execution mode. Tasks that name the same pool share its threads;
+    # thus `thread_pool_size` bounds how many of them can run at the same time.
+    # None means a pool named after its size, eg "default-4"; which is shared by the tasks that leave out the name
+    # and ask for the same size.
+    thread_pool_name: typing.Union[None, str] = None
+    thread_pool_size: int = 4
+    # the process pool used by the "process" execution mode; it is named and shared like the thread pools are.
+    # A `process_pool_size` of None means as many processes as there are cpus.
+    process_pool_name: typing.Union[None, str] = None
+    process_pool_size: typing.Union[None, int] = None
+
     # `drain_duration` is the duration(in seconds) that a worker should wait
     # after getting a termination signal(SIGTERM, SIGQUIT etc).
     # during this duration, the worker does not consumer anymore tasks from the broker,
@@ -207,13 +463,105 @@ class Task(abc.ABC):
         else:
             self.the_ratelimiter = ratelimiter.SimpleRateLimiter(log_handler=self.logger)
 
+        if self.the_serializer is not None:
+            self.the_serializer = self.the_serializer
+        else:
+            self.the_serializer = serializer.get(serializer.JsonSerializer.codec_id)
+
+        if self.the_offload is not None:
+            self.the_offload = self.the_offload
+        else:
+            self.the_offload = offload.Offload()
+
+        if self.the_task_id_generator is not None:
+            self.the_task_id_generator = self.the_task_id_generator
+        else:
+            self.the_task_id_generator = ids.UlidGenerator()
+
+        # the call plan of `run`; it is worked out once here rather than on every call to `delay`.
+        self._run_signature: inspect.Signature = inspect.signature(self.run)
+        # if `run` takes `*args` and `**kwargs` and nothing else, any call binds and type-checking can be skipped.
+        run_parameter_kinds = [p.kind for p in self._run_signature.parameters.values()]
+        self._run_takes_anything: bool = run_parameter_kinds == [
+            inspect.Parameter.VAR_POSITIONAL,
+            inspect.Parameter.VAR_KEYWORD,
+        ]
+
+        self._thread_pool: typing.Union[None, concurrent.futures.ThreadPoolExecutor] = None
+        if self.execution_mode == "thread":
+            self._thread_pool = pool.thread_pool(
+                name=_pool_name(self.thread_pool_name, self.thread_pool_size),
+                size=self.thread_pool_size,
+            )
+
         self._checked_broker: bool = False
-        self._RETRYING: bool = False
         self._LOOP: typing.Union[None, asyncio.events.AbstractEventLoop] = None
 
+    @property
+    def context(self) -> typing.Union[None, TaskContext]:
+        """
+        the :class:`TaskContext <TaskContext>` of the execution that is running; None outside of an execution.
+        """
+        return _TASK_CONTEXT.get()
+
+    @property
+    def current_retries(self) -> int:
+        """
+        the number of times that the task that is been executed has been retried so far.
+        """
+        context = _TASK_CONTEXT.get()
+        return context.current_retries if context is not None else 0
+
+    @property
+    def max_retries(self) -> int:
+        """
+        the maximum number of times that the task that is been executed can be retried.
+        """
+        context = _TASK_CONTEXT.get()
+        return context.max_retries if context is not None else 0
+
     async def __call__(self, *args, **kwargs):
+        return await self._call_run(args, kwargs, {})
+
+    async def _call_run(
+        self,
+        args: typing.Sequence[typing.Any],
+        kwargs: typing.Dict[str, typing.Any],
+        timings: typing.Dict[str, float],
+    ) -> typing.Any:
+        """
+        calls `run` as dictated by the :attr:`execution_mode <Task.execution_mode>` and returns its return value.
+        Timings of the execution mode, if any, are added to `timings`;
+        see `wiji.pool.run_in_thread_pool` and `wiji.pool.run_in_process_pool`
+        """
+        if self._thread_pool is not None:
+            return await pool.run_in_thread_pool(
+                self._thread_pool, self.run, tuple(args), kwargs, timings
+            )
+        if self.execution_mode == "process":
+            return await pool.run_in_process_pool(
+                self._process_pool(),
+                functools.partial(_run_in_process, type(self), _TASK_CONTEXT.get()),
+                tuple(args),
+                kwargs,
+                timings,
+            )
         return await self.run(*args, **kwargs)
 
+    def _process_pool(self) -> concurrent.futures.ProcessPoolExecutor:
+        """
+        returns the process pool of the "process" execution mode; starting it if need be.
+        It is started lazily, rather than in `__init__`, so that producers of the task do not start one.
+        """
+        size = self.process_pool_size
+        if size is None:
+            size = os.cpu_count() or 1
+        return pool.process_pool(
+            name=_pool_name(self.process_pool_name, size),
+            size=size,
+            modules=[type(self).__module__],
+        )
+
     def __str__(self):
         return str(
             {
@@ -298,6 +646,128 @@ class Task(abc.ABC):
                 )
             )
 
+        if not hasattr(self, "protocol_version"):
+            raise ValueError(
+                "Task: {0} should have attribute `protocol_version`".format(self._debug_task_name)
+            )
+        if self.protocol_version is not None and (
+            self.protocol_version not in protocol.Protocol.SUPPORTED_VERSIONS
+        ):
+            raise ValueError(
+                "Task: {0}. `protocol_version` should be one of: {1} You entered: {2}".format(
+                    self._debug_task_name,
+                    (None,) + protocol.Protocol.SUPPORTED_VERSIONS,
+                    self.protocol_version,
+                )
+            )
+
+        if not hasattr(self, "the_serializer"):
+            raise ValueError(
+                "Task: {0} should have attribute `the_serializer`".format(self._debug_task_name)
+            )
+        if not isinstance(self.the_serializer, (type(None), serializer.BaseSerializer)):
+            raise ValueError(
+                "Task: {0}. `the_serializer` should be of type:: `None` or `wiji.serializer.BaseSerializer` You entered: {1}".format(
+                    self._debug_task_name, type(self.the_serializer)
+                )
+            )
+        if (
+            self.protocol_version == 1
+            and self.the_serializer is not None
+            and not isinstance(self.the_serializer, serializer.JsonSerializer)
+        ):
+            raise ValueError(
+                "Task: {0}. `protocol_version` 1 only supports the `json` serializer You entered: {1}".format(
+                    self._debug_task_name, self.the_serializer.name
+                )
+            )
+
+        if not hasattr(self, "the_compression"):
+            raise ValueError(
+                "Task: {0} should have attribute `the_compression`".format(self._debug_task_name)
+            )
+        if not isinstance(self.the_compression, (type(None), compression.Compression)):
+            raise ValueError(
+                "Task: {0}. `the_compression` should be of type:: `None` or `wiji.compression.Compression` You entered: {1}".format(
+                    self._debug_task_name, type(self.the_compression)
+                )
+            )
+        if not isinstance(self.the_broker.the_compression, (type(None), compression.Compression)):
+            raise ValueError(
+                "Task: {0}. `the_broker.the_compression` should be of type:: `None` or `wiji.compression.Compression` You entered: {1}".format(
+                    self._debug_task_name, type(self.the_broker.the_compression)
+                )
+            )
+        if self.protocol_version == 1 and self._compression() is not None:
+            raise ValueError(
+                "Task: {0}. `protocol_version` 1 does not support compression".format(
+                    self._debug_task_name
+                )
+            )
+
+        if not hasattr(self, "the_blob_store"):
+            raise ValueError(
+                "Task: {0} should have attribute `the_blob_store`".format(self._debug_task_name)
+            )
+        if not isinstance(self.the_blob_store, (type(None), blobstore.BaseBlobStore)):
+            raise ValueError(
+                "Task: {0}. `the_blob_store` should be of type:: `None` or `wiji.blobstore.BaseBlobStore` You entered: {1}".format(
+                    self._debug_task_name, type(self.the_blob_store)
+                )
+            )
+        if self.protocol_version == 1 and self.the_blob_store is not None:
+            raise ValueError(
+                "Task: {0}. `protocol_version` 1 does not support a blob store".format(
+                    self._debug_task_name
+                )
+            )
+
+        if not hasattr(self, "the_result_backend"):
+            raise ValueError(
+                "Task: {0} should have attribute `the_result_backend`".format(self._debug_task_name)
+            )
+        if not isinstance(self.the_result_backend, (type(None), result.BaseResultBackend)):
+            raise ValueError(
+                "Task: {0}. `the_result_backend` should be of type:: `None` or `wiji.result.BaseResultBackend` You entered: {1}".format(
+                    self._debug_task_name, type(self.the_result_backend)
+                )
+            )
+
+        if not hasattr(self, "the_dedup"):
+            raise ValueError(
+                "Task: {0} should have attribute `the_dedup`".format(self._debug_task_name)
+            )
+        if not isinstance(self.the_dedup, (type(None), dedup.Dedup)):
+            raise ValueError(
+                "Task: {0}. `the_dedup` should be of type:: `None` or `wiji.dedup.Dedup` You entered: {1}".format(
+                    self._debug_task_name, type(self.the_dedup)
+                )
+            )
+
+        if not hasattr(self, "the_offload"):
+            raise ValueError(
+                "Task: {0} should have attribute `the_offload`".format(self._debug_task_name)
+            )
+        if not isinstance(self.the_offload, (type(None), offload.Offload)):
+            raise ValueError(
+                "Task: {0}. `the_offload` should be of type:: `None` or `wiji.offload.Offload` You entered: {1}".format(
+                    self._debug_task_name, type(self.the_offload)
+                )
+            )
+
+        if not hasattr(self, "the_task_id_generator"):
+            raise ValueError(
+                "Task: {0} should have attribute `the_task_id_generator`".format(
+                    self._debug_task_name
+                )
+            )
+        if not isinstance(self.the_task_id_generator, (type(None), ids.BaseTaskIdGenerator)):
+            raise ValueError(
+                "Task: {0}. `the_task_id_generator` should be of type:: `None` or `wiji.ids.BaseTaskIdGenerator` You entered: {1}".format(
+                    self._debug_task_name, type(self.the_task_id_generator)
+                )
+            )
+
         if not hasattr(self, "drain_duration"):
             raise ValueError(
                 "Task: {0} should have attribute `drain_duration`".format(self._debug_task_name)
@@ -342,13 +812,71 @@ class Task(abc.ABC):
                 )
             )
 
-        if not asyncio.iscoroutinefunction(self.run):
+        if self.execution_mode not in ["async", "thread", "process"]:
+            raise ValueError(
+                "Task: {0}. `execution_mode` should be one of; 'async', 'thread', 'process'. You entered: {1}".format(
+                    self._debug_task_name, self.execution_mode
+                )
+            )
+        if not isinstance(self.thread_pool_name, (type(None), str)):
+            raise ValueError(
+                "Task: {0}. `thread_pool_name` should be of type:: `None` or `str` You entered: {1}".format(
+                    self._debug_task_name, type(self.thread_pool_name)
+                )
+            )
+        if not isinstance(self.thread_pool_size, int):
+            raise ValueError(
+                "Task: {0}. `thread_pool_size` should be of type:: `int` You entered: {1}".format(
+                    self._debug_task_name, type(self.thread_pool_size)
+                )
+            )
+        if self.thread_pool_size <= 0:
+            raise ValueError(
+                "Task: {0}. `thread_pool_size` should be greater than 0. You entered: {1}".format(
+                    self._debug_task_name, self.thread_pool_size
+                )
+            )
+
+        if not isinstance(self.process_pool_name, (type(None), str)):
+            raise ValueError(
+                "Task: {0}. `process_pool_name` should be of type:: `None` or `str` You entered: {1}".format(
+                    self._debug_task_name, type(self.process_pool_name)
+                )
+            )
+        if not isinstance(self.process_pool_size, (type(None), int)):
+            raise ValueError(
+                "Task: {0}. `process_pool_size` should be of type:: `None` or `int` You entered: {1}".format(
+                    self._debug_task_name, type(self.process_pool_size)
+                )
+            )
+        if self.process_pool_size is not None and self.process_pool_size <= 0:
+            raise ValueError(
+                "Task: {0}. `process_pool_size` should be greater than 0. You entered: {1}".format(
+                    self._debug_task_name, self.process_pool_size
+                )
+            )
+
+        if self.execution_mode in ["thread", "process"]:
+            if inspect.iscoroutinefunction(self.run):
+                raise ValueError(
+                    "Task: {0}. In the '{1}' execution mode, the method `run` should be a plain function, not a python coroutine.".format(
+                        self._debug_task_name, self.execution_mode
+                    )
+                )
+            if self.execution_mode == "process" and "<locals>" in type(self).__qualname__:
+                # the child processes find the task class by importing it.
+                raise ValueError(
+                    "Task: {0}. In the 'process' execution mode, the task class should be defined at the top level of a module.".format(
+                        self._debug_task_name
+                    )
+                )
+        elif not asyncio.iscoroutinefunction(self.run):
             raise ValueError(
                 "Task: {0}. The method `run` of a class derived from `wiji.task.Task` should be a python coroutine.".format(
                     self._debug_task_name
                 )
             )
-        if not inspect.iscoroutinefunction(self.run):
+        elif not inspect.iscoroutinefunction(self.run):
             raise ValueError(
                 "Task: {0}. The method `run` of a class derived from `wiji.task.Task` should be a python coroutine.".format(
                     self._debug_task_name
@@ -504,25 +1032,176 @@ class Task(abc.ABC):
                 },
             )
 
+    async def _notify_hook_many(
+        self,
+        task_ids: typing.List[str],
+        state: TaskState,
+        hook_metadata: typing.List[str],
+        queuing_duration: typing.Union[None, typing.Dict[str, float]] = None,
+        queuing_exception: typing.Union[None, Exception] = None,
+    ) -> None:
+        try:
+            if typing.TYPE_CHECKING:
+                # make mypy happy: https://github.com/python/mypy/issues/4805
+                assert isinstance(self.task_name, str)
+                assert isinstance(self.the_hook, hook.BaseHook)
+            await self.the_hook.notify_many(
+                task_name=self.task_name,
+                queue_name=self.queue_name,
+                task_ids=task_ids,
+                state=state,
+                hook_metadata=hook_metadata,
+                queuing_duration=queuing_duration,
+                queuing_exception=queuing_exception,
+            )
+        except Exception as e:
+            self._log(
+                logging.ERROR,
+                {
+                    "event": "wiji.Task._notify_hook_many",
+                    "stage": "end",
+                    "state": "task hook error",
+                    "error": str(e),
+                },
+            )
+
+    async def _notify_ratelimiter_many(
+        self,
+        task_ids: typing.List[str],
+        state: TaskState,
+        queuing_duration: typing.Union[None, typing.Dict[str, float]] = None,
+        queuing_exception: typing.Union[None, Exception] = None,
+    ) -> None:
+        try:
+            if typing.TYPE_CHECKING:
+                assert isinstance(self.the_ratelimiter, ratelimiter.BaseRateLimiter)
+                assert isinstance(self.task_name, str)
+            await self.the_ratelimiter.notify_many(
+                task_name=self.task_name,
+                task_ids=task_ids,
+                queue_name=self.queue_name,
+                state=state,
+                queuing_duration=queuing_duration,
+                queuing_exception=queuing_exception,
+            )
+        except Exception as e:
+            self._log(
+                logging.ERROR,
+                {
+                    "event": "wiji.Task._notify_ratelimiter_many",
+                    "stage": "end",
+                    "state": "task ratelimiter error",
+                    "error": str(e),
+                },
+            )
+
     @abc.abstractmethod
     async def run(self, *args: typing.Any, **kwargs: typing.Any) -> typing.Any:
         raise NotImplementedError(
             "Task: {0}. `run` method must be implemented.".format(self._debug_task_name)
         )
 
-    async def delay(self, *args: typing.Any, **kwargs: typing.Any) -> None:
+    async def delay(self, *args: typing.Any, **kwargs: typing.Any) -> result.TaskHandle:
         """
         Parameters:
             args: The positional arguments to pass on to the task.
             kwargs: The keyword arguments to pass on to the task.
+
+        Returns:
+            a handle to the queued task; which can be used to wait for the task's return value.
+            see :attr:`the_result_backend <Task.the_result_backend>`
+            If the task is a duplicate, it is not queued and the handle is that of the task it duplicates.
+            see :attr:`the_dedup <Task.the_dedup>`
         """
         # _get_task_options should be called first
         task_options = self._get_task_options(*args, **kwargs)
-        args = task_options.args
-        kwargs = task_options.kwargs
+        self._check_call(task_options)
+        task_id = None
+        if self.the_dedup is not None and task_options.idempotency_key is not None:
+            task_id = await self._claim(task_options)
+        if task_id is None:
+            task_id = task_options.task_id
+            try:
+                await self._delay(task_options)
+            except Exception:
+                await self._release([task_options])
+                raise
+        if typing.TYPE_CHECKING:
+            assert isinstance(self.the_serializer, serializer.BaseSerializer)
+        return result.TaskHandle(
+            task_id=task_id,
+            the_result_backend=self.the_result_backend,
+            the_serializer=self.the_serializer,
+        )
+
+    async def _claim(self, task_options: TaskOptions) -> typing.Union[None, str]:
+        """
+        returns the id of the task that `task_options` duplicates; None if it is not a duplicate.
+        If the dedup store can not be reached, the task is queued; errors are logged rather than raised.
+        """
+        if typing.TYPE_CHECKING:
+            assert isinstance(self.the_dedup, dedup.Dedup)
+        try:
+            duplicate_of = await self.the_dedup.claim(
+                dedup.QUEUED,
+                "{0}:{1}".format(self.task_name, task_options.idempotency_key),
+                task_options.task_id,
+            )
+        except Exception as e:
+            self._log(
+                logging.ERROR,
+                {
+                    "event": "wiji.Task.delay",
+                    "stage": "end",
+                    "state": "checking for duplicate task failed",
+                    "idempotency_key": task_options.idempotency_key,
+                    "error": str(e),
+                },
+            )
+            return None
+        if duplicate_of is not None:
+            self._log(
+                logging.INFO,
+                {
+                    "event": "wiji.Task.delay",
+                    "stage": "end",
+                    "state": "duplicate task not queued",
+                    "idempotency_key": task_options.idempotency_key,
+                    "duplicate_of": duplicate_of,
+                },
+            )
+        return duplicate_of
 
-        self._validate_delay_args(*args, **kwargs)
-        self._type_check(self.run, *args, **kwargs)
+    async def _release(self, batch: typing.List[TaskOptions]) -> None:
+        """
+        forget the idempotency keys of tasks that could not be queued; so that they can be queued again.
+        """
+        if self.the_dedup is None:
+            return
+        for task_options in batch:
+            if task_options.idempotency_key is not None:
+                try:
+                    await self.the_dedup.release(
+                        dedup.QUEUED, "{0}:{1}".format(self.task_name, task_options.idempotency_key)
+                    )
+                except Exception as e:
+                    # the error that the task could not be queued with is what the caller needs to see.
+                    self._log(
+                        logging.ERROR,
+                        {
+                            "event": "wiji.Task.delay",
+                            "stage": "end",
+                            "state": "releasing duplicate task check failed",
+                            "idempotency_key": task_options.idempotency_key,
+                            "error": str(e),
+                        },
+                    )
+
+    async def _delay(self, task_options: TaskOptions) -> None:
+        """
+        queue a task whose arguments have already been checked with :func:`_check_call <Task._check_call>`.
+        This is the fast path for trusted internal callers like `retry`; they skip straight to queuing.
+        """
         if not self._checked_broker:
             # needed so that broker can setup queue_name etc
             await self._broker_check(from_worker=False)
@@ -534,18 +1213,21 @@ class Task(abc.ABC):
         )
 
         queuing_exception = None
-        thread_time_start = time.thread_time()
-        perf_counter_start = time.perf_counter()
-        monotonic_start = time.monotonic()
-        process_time_start = time.process_time()
+        clocks_start = _clocks()
         try:
-            proto = protocol.Protocol(version=1, task_options=task_options)
-            await self.the_broker.enqueue(queue_name=self.queue_name, item=proto.json())
+            item = (await self._encode([task_options]))[0]
+            if self.the_broker.delayed_delivery:
+                # let the broker hold on to the task until it is due.
+                await self.the_broker.enqueue(
+                    queue_name=self.queue_name, item=item, eta=task_options._eta_timestamp
+                )
+            else:
+                await self.the_broker.enqueue(queue_name=self.queue_name, item=item)
         except TypeError as e:
             self._log(logging.ERROR, {"event": "wiji.Task.delay", "stage": "end", "error": str(e)})
             raise TypeError(
-                "Task: {0}. All the task arguments passed into `delay` should be JSON serializable.".format(
-                    self._debug_task_name
+                "Task: {0}. All the task arguments passed into `delay` should be {1} serializable.".format(
+                    self._debug_task_name, self._serializer_label()
                 )
             ) from e
         except Exception as e:
@@ -563,16 +1245,7 @@ class Task(abc.ABC):
                 "Task: {0}. publishing to the broker failed.".format(self._debug_task_name)
             ) from e
         finally:
-            thread_time_end = time.thread_time()
-            perf_counter_end = time.perf_counter()
-            monotonic_end = time.monotonic()
-            process_time_end = time.process_time()
-            queuing_duration = {
-                "thread_time": float("{0:.4f}".format(thread_time_end - thread_time_start)),
-                "perf_counter": float("{0:.4f}".format(perf_counter_end - perf_counter_start)),
-                "monotonic": float("{0:.4f}".format(monotonic_end - monotonic_start)),
-                "process_time": float("{0:.4f}".format(process_time_end - process_time_start)),
-            }
+            queuing_duration = _durations(clocks_start)
             # this cannot raise an error since the method handles that error
             await self._notify_hook(
                 task_id=task_options.task_id,
@@ -588,8 +1261,174 @@ class Task(abc.ABC):
                 queuing_exception=queuing_exception,
             )
 
-    def synchronous_delay(self, *args: typing.Any, **kwargs: typing.Any) -> None:
-        self._get_loop().run_until_complete(self.delay(*args, **kwargs))
+    def synchronous_delay(self, *args: typing.Any, **kwargs: typing.Any) -> result.TaskHandle:
+        return self._get_loop().run_until_complete(self.delay(*args, **kwargs))
+
+    async def delay_many(
+        self,
+        calls: typing.Union[
+            typing.Iterable[
+                typing.Tuple[typing.Sequence[typing.Any], typing.Dict[str, typing.Any]]
+            ],
+            typing.AsyncIterable[
+                typing.Tuple[typing.Sequence[typing.Any], typing.Dict[str, typing.Any]]
+            ],
+        ],
+        batch_size: int = 500,
+    ) -> int:
+        """
+        queue many tasks in one go.
+        This behaves like calling `delay` once for each call, but the calls are validated, serialized and handed to the broker
+        in batches using :func:`enqueue_many <wiji.broker.BaseBroker.enqueue_many>`;
+        hooks and the ratelimiter are notified once per batch rather than once per task.
+
+        Parameters:
+            calls: an iterable, or async iterable, of `(args, kwargs)` pairs; one pair for each task to queue.
+                   `kwargs` may contain a `wiji.task.TaskOptions` just like in `delay`.
+                   only one batch of calls is held in memory at a time, so `calls` can be a lazy stream of any length.
+            batch_size: the number of tasks to hand to the broker at a time.
+
+        Returns:
+            the number of tasks that were queued. Duplicates are not queued; see :attr:`the_dedup <Task.the_dedup>`
+
+        Raises:
+            TaskQueueingError: publishing a batch to the broker failed.
+                               The batches that came before it have already been queued.
+
+        usage:
+            await task.delay_many(((i,), {"b": 10}) for i in range(1_000_000))
+        """
+        self._validate_delay_many_args(batch_size=batch_size)
+        if not self._checked_broker:
+            # needed so that broker can setup queue_name etc
+            await self._broker_check(from_worker=False)
+
+        num_queued = 0
+        batch: typing.List[TaskOptions] = []
+        async for call in self._iterate_calls(calls):
+            task_options = self._prepare_call(call)
+            if (
+                self.the_dedup is not None
+                and task_options.idempotency_key is not None
+                and await self._claim(task_options) is not None
+            ):
+                continue
+            batch.append(task_options)
+            if len(batch) >= batch_size:
+                await self._enqueue_batch(batch)
+                num_queued += len(batch)
+                batch = []
+        if batch:
+            await self._enqueue_batch(batch)
+            num_queued += len(batch)
+        return num_queued
+
+    def _validate_delay_many_args(self, batch_size: int) -> None:
+        if not isinstance(batch_size, int):
+            raise ValueError(
+                "Task: {0}. `batch_size` should be of type:: `int` You entered: {1}".format(
+                    self._debug_task_name, type(batch_size)
+                )
+            )
+        if batch_size < 1:
+            raise ValueError(
+                "Task: {0}. `batch_size` should not be less than 1 You entered: {1}".format(
+                    self._debug_task_name, batch_size
+                )
+            )
+
+    @staticmethod
+    async def _iterate_calls(
+        calls: typing.Union[typing.Iterable[typing.Any], typing.AsyncIterable[typing.Any]]
+    ) -> typing.AsyncIterator[typing.Any]:
+        if hasattr(calls, "__aiter__"):
+            async for call in calls:
+                yield call
+        else:
+            for call in calls:
+                yield call
+
+    def _prepare_call(self, call: typing.Any) -> TaskOptions:
+        """
+        validate one of the calls passed to `delay_many` and return its task options.
+        """
+        try:
+            args, kwargs = call
+            args, kwargs = tuple(args), dict(kwargs)
+        except (TypeError, ValueError) as e:
+            raise ValueError(
+                "Task: {0}. each call passed into `delay_many` should be a pair of `(args, kwargs)` You entered: {1}".format(
+                    self._debug_task_name, call
+                )
+            ) from e
+
+        # _get_task_options should be called first
+        task_options = self._get_task_options(*args, **kwargs)
+        self._check_call(task_options)
+        return task_options
+
+    async def _enqueue_batch(self, batch: typing.List[TaskOptions]) -> None:
+        task_ids = [task_options.task_id for task_options in batch]
+        await self._notify_hook_many(
+            task_ids=task_ids,
+            state=TaskState.QUEUEING,
+            hook_metadata=[task_options.hook_metadata for task_options in batch],
+        )
+
+        queuing_exception = None
+        clocks_start = _clocks()
+        try:
+            items = await self._encode(batch)
+            if self.the_broker.delayed_delivery:
+                # let the broker hold on to the tasks until they are due.
+                await self.the_broker.enqueue_many(
+                    queue_name=self.queue_name,
+                    items=items,
+                    etas=[task_options._eta_timestamp for task_options in batch],
+                )
+            else:
+                await self.the_broker.enqueue_many(queue_name=self.queue_name, items=items)
+        except TypeError as e:
+            await self._release(batch)
+            self._log(
+                logging.ERROR, {"event": "wiji.Task.delay_many", "stage": "end", "error": str(e)}
+            )
+            raise TypeError(
+                "Task: {0}. All the task arguments passed into `delay_many` should be {1} serializable.".format(
+                    self._debug_task_name, self._serializer_label()
+                )
+            ) from e
+        except Exception as e:
+            queuing_exception = e
+            await self._release(batch)
+            self._log(
+                logging.ERROR,
+                {
+                    "event": "wiji.Task.delay_many",
+                    "stage": "end",
+                    "state": "task queueing error",
+                    "error": str(e),
+                },
+            )
+            raise TaskQueueingError(
+                "Task: {0}. publishing to the broker failed.".format(self._debug_task_name)
+            ) from e
+        finally:
+            queuing_duration = _durations(clocks_start)
+            # this cannot raise an error since the method handles that error
+            await self._notify_hook_many(
+                task_ids=task_ids,
+                state=TaskState.QUEUED,
+                hook_metadata=[task_options.hook_metadata for task_options in batch],
+                queuing_duration=queuing_duration,
+                queuing_exception=queuing_exception,
+            )
+            await self._notify_ratelimiter_many(
+                task_ids=task_ids,
+                state=TaskState.QUEUED,
+                queuing_duration=queuing_duration,
+                queuing_exception=queuing_exception,
+            )
 
     async def retry(self, *args: typing.Any, **kwargs: typing.Any) -> None:
         """
@@ -602,23 +1441,109 @@ class Task(abc.ABC):
 
         This method takes the same parameters as the `delay` method.
         It also behaves the same as `delay`
+
+        The retries so far are counted in the :attr:`context <Task.context>` of the execution that calls `retry`,
+        and the count is carried along with the task that is queued again.
         """
         # _get_task_options should be called first
-        self._get_task_options(*args, **kwargs)
-        self._validate_delay_args(*args, **kwargs)
+        task_options = self._get_task_options(*args, **kwargs)
+        self._check_call(task_options)
 
-        if self.current_retries >= self.max_retries:
-            self._RETRYING = False
+        context = _TASK_CONTEXT.get()
+        current_retries = context.current_retries if context is not None else 0
+        if current_retries >= task_options.max_retries:
+            if context is not None:
+                context.retrying = False
             raise WijiMaxRetriesExceededError(
                 "Task: {0}. The task has reached its max_retries count of: {1}".format(
-                    self._debug_task_name, self.max_retries
+                    self._debug_task_name, task_options.max_retries
                 )
             )
 
-        self.current_retries += 1
-        await self.delay(*args, **kwargs)
+        task_options.current_retries = current_retries + 1
+        await self._delay(task_options)
+
+        if context is not None:
+            context.retrying = True
+            context.retried_as = task_options.task_id
+
+    def _protocol_version(self) -> int:
+        if self.protocol_version is not None:
+            return self.protocol_version
+        if not isinstance(self.the_serializer, serializer.JsonSerializer):
+            # only version 2 can tag the serializer in the item.
+            return 2
+        if self._compression() is not None or self.the_blob_store is not None:
+            # only version 2 can carry compressed items and claim checks.
+            return 2
+        return self.the_broker.protocol_version
+
+    def _compression(self) -> typing.Union[None, compression.Compression]:
+        if self.the_compression is not None:
+            return self.the_compression
+        return self.the_broker.the_compression
+
+    async def _encode(self, batch: typing.List[TaskOptions]) -> typing.List[broker.Item]:
+        """
+        encode task options into items that are ready to be enqueued.
+        Bodies that are large enough are put in the blob store, if the task has one.
 
-        self._RETRYING = True
+        Raises:
+            TypeError: the args or kwargs can not be encoded by the task's serializer.
+        """
+        version = self._protocol_version()
+        the_compression = self._compression()
+        # the task options were validated when they were created.
+        protos = [
+            protocol.Protocol(
+                version=version,
+                task_options=task_options,
+                validate=False,
+                the_serializer=self.the_serializer,
+                the_compression=the_compression,
+            )
+            for task_options in batch
+        ]
+        if typing.TYPE_CHECKING:
+            assert isinstance(self.the_offload, offload.Offload)
+        try:
+            # the size of an item is only known once it is encoded, so it is estimated from the args and kwargs.
+            size = _estimate_size(
+                [(task_options.args, task_options.kwargs) for task_options in batch],
+                self.the_offload.threshold,
+            )
+            encoded = await self.the_offload.encode(size, _encode_protocols, protos)
+        except TypeError:
+            raise
+        except Exception as e:
+            # serializers fail in different ways; eg pickle raises `PicklingError` and marshal raises `ValueError`
+            raise TypeError(str(e)) from e
+
+        items: typing.List[broker.Item] = []
+        if version == 1:
+            items = encoded
+        else:
+            for proto, (flags, body) in zip(protos, encoded):
+                claim_check = None
+                if self.the_blob_store is not None and len(body) >= self.the_blob_store.threshold:
+                    claim_check = await self.the_blob_store.put(body)
+                items.append(proto.binary(flags=flags, body=body, claim_check=claim_check))
+        return items
+
+    def _serializer_label(self) -> str:
+        if isinstance(self.the_serializer, serializer.JsonSerializer):
+            return "JSON"
+        if typing.TYPE_CHECKING:
+            assert isinstance(self.the_serializer, serializer.BaseSerializer)
+        return "`{0}`".format(self.the_serializer.name)
+
+    def _check_call(self, task_options: TaskOptions) -> None:
+        """
+        validate and type-check the arguments of a call to `delay` using the call plan of `run`.
+        """
+        self._validate_delay_args(*task_options.args, **task_options.kwargs)
+        if not self._run_takes_anything:
+            self._run_signature.bind(*task_options.args, **task_options.kwargs)
 
     def _validate_delay_args(self, *args: typing.Any, **kwargs: typing.Any) -> None:
         for a in args:
@@ -629,21 +1554,6 @@ class Task(abc.ABC):
                     )
                 )
 
-    @staticmethod
-    def _type_check(func, *args: typing.Any, **kwargs: typing.Any) -> inspect.BoundArguments:
-        """
-        Check that `delay` is called with right arguments/signature.
-        ie, the right arguments for the user implemented `run` method.
-
-        if you have a func like:
-            def foo(a, b, *args, c, d=10, **kwargs):
-                pass
-        you can type-check like:
-            Task._type_check(foo, 1, 4)
-        """
-        sig = inspect.signature(func)
-        return sig.bind(*args, **kwargs)
-
     def _get_task_options(self, *args: typing.Any, **kwargs: typing.Any) -> TaskOptions:
         task_options = None
         for k, v in list(kwargs.items()):
@@ -657,17 +1567,36 @@ class Task(abc.ABC):
 
         # every invocation of `my_task.delay()` is counted as unique and
         # should have a unique task_id even if it is a retry of a previous request
-        task_options.task_id = str(uuid.uuid4())
+        if typing.TYPE_CHECKING:
+            assert isinstance(self.the_task_id_generator, ids.BaseTaskIdGenerator)
+        task_options.task_id = self.the_task_id_generator.generate()
         task_options.args = args
         task_options.kwargs = kwargs
+        return task_options
 
-        # set retries
-        self.max_retries = task_options.max_retries
-        if not hasattr(self, "current_retries"):
-            # if `current_retries` exists, don't ovveride it
-            self.current_retries = task_options.current_retries
 
-        return task_options
+# the instances of the task classes that have run in this process; when it is a child process of a process pool.
+_PROCESS_TASKS: typing.Dict[typing.Type[Task], Task] = {}
+
+
+def _run_in_process(
+    task_class: typing.Type[Task],
+    context: typing.Union[None, TaskContext],
+    *args: typing.Any,
+    **kwargs: typing.Any,
+) -> typing.Any:
+    """
+    calls the `run` method of `task_class` in a child process of a process pool; see `Task.execution_mode`
+    The task class is instantiated once per child process.
+    """
+    the_task = _PROCESS_TASKS.get(task_class)
+    if the_task is None:
+        the_task = _PROCESS_TASKS[task_class] = task_class()
+    token = _TASK_CONTEXT.set(context)
+    try:
+        return the_task.run(*args, **kwargs)
+    finally:
+        _TASK_CONTEXT.reset(token)
 
 
 class _watchdogTask(Task):
@@ -680,7 +1609,9 @@ class _watchdogTask(Task):
     This task is always scheduled in the in-memory broker(`wiji.broker.InMemoryBroker`).
     """
 
-    the_broker: broker.InMemoryBroker = broker.InMemoryBroker()
+    # the queue is bounded so that the watchdog producer can never run ahead of the watchdog worker
+    # and grow the queue without limit. see: https://github.com/komuw/wiji/issues/71
+    the_broker: broker.InMemoryBroker = broker.InMemoryBroker(maxsize=2_000)
     queue_name: str = "__WatchDogTaskQueue__"
     loglevel: str = "WARNING"
     drain_duration: float = 1.0
@@ -6,11 +6,19 @@ import string
 import typing
 import logging
 import asyncio
-import datetime
+import heapq
+import itertools
+import collections
 
 from . import task
+from . import dedup
+from . import broker
 from . import protocol
 from . import watchdog
+from . import backoff
+from . import offload
+from . import result
+from . import serializer
 from . import ratelimiter
 
 
@@ -27,14 +35,52 @@ class Worker:
         worker_id: typing.Union[None, str] = None,
         use_watchdog: bool = False,
         watchdog_duration: float = 0.1,
+        concurrency: int = 1,
+        prefetch_count: int = 0,
+        prefetch_bytes: typing.Union[None, int] = None,
+        ack_batch_size: int = 1,
+        ack_flush_interval: float = 1.0,
+        max_delayed_tasks: int = 1_000,
+        delayed_tasks_horizon: float = 300.0,
+        the_backoff: typing.Union[None, backoff.BaseBackoff] = None,
     ) -> None:
         """
+        Parameters:
+            the_task: the task whose queue this worker consumes from.
+            worker_id: a unique identifier for this worker.
+            use_watchdog: whether to run a watchdog that reports blocking calls on the eventloop.
+            watchdog_duration: the duration, in seconds, after which the watchdog reports a blocked eventloop.
+            concurrency: the maximum number of tasks that this worker will execute concurrently.
+            prefetch_count: the maximum number of items that this worker will dequeue ahead of time and hold in memory.
+                            the items are fetched in the background using :func:`dequeue_many <wiji.broker.BaseBroker.dequeue_many>`
+                            A value of 0 disables prefetching; items are then dequeued one at a time.
+            prefetch_bytes: the maximum combined size of the prefetched items. None means there is no size limit.
+            ack_batch_size: the number of executed tasks to acknowledge to the broker in one
+                            :func:`done_many <wiji.broker.BaseBroker.done_many>` call.
+                            A value of 1 disables batching; each task is then acknowledged with
+                            :func:`done <wiji.broker.BaseBroker.done>` as soon as it is executed.
+            ack_flush_interval: the maximum duration, in seconds, that an acknowledgement can wait in a batch before it is sent to the broker.
+            max_delayed_tasks: the maximum number of not-yet-due tasks(ie, whose eta is in the future) that this worker will hold in memory
+                               and execute once they are due. Any more than that are handed back to the broker.
+                               A value of 0 means that all not-yet-due tasks are handed back to the broker.
+            delayed_tasks_horizon: not-yet-due tasks are only held in memory if they are due within this duration(in seconds).
+                                   tasks due later than that are handed back to the broker.
+            the_backoff: decides how long to sleep whenever polling the broker returns no items or fails.
+                         If None, a :class:`SimpleBackoff <wiji.backoff.SimpleBackoff>` is used.
         """
         self._validate_worker_args(
             the_task=the_task,
             worker_id=worker_id,
             use_watchdog=use_watchdog,
             watchdog_duration=watchdog_duration,
+            concurrency=concurrency,
+            prefetch_count=prefetch_count,
+            prefetch_bytes=prefetch_bytes,
+            ack_batch_size=ack_batch_size,
+            ack_flush_interval=ack_flush_interval,
+            max_delayed_tasks=max_delayed_tasks,
+            delayed_tasks_horizon=delayed_tasks_horizon,
+            the_backoff=the_backoff,
         )
 
         self._PID = os.getpid()
@@ -53,6 +99,45 @@ class Worker:
 
         self.use_watchdog = use_watchdog
         self.watchdog_duration = watchdog_duration
+        self.concurrency = concurrency
+
+        # tasks that have been dequeued and are currently been executed by this worker.
+        self._in_flight: typing.Set["asyncio.Future[None]"] = set()
+        # created lazily inside `consume_tasks` so that it is bound to the running eventloop.
+        self._concurrency_slots: typing.Union[None, asyncio.Semaphore] = None
+        # dedup key -> (stop_event, renewer) of the leases held on the idempotency keys of executing tasks.
+        self._leases: typing.Dict[str, typing.Tuple[asyncio.Event, asyncio.Future]] = {}
+
+        self.prefetch_count = prefetch_count
+        self.prefetch_bytes = prefetch_bytes
+        # how long, in seconds, a single broker fetch should wait for items to become available.
+        self._dequeue_timeout: float = 1.0
+        self._prefetched: typing.Deque[broker.Item] = collections.deque()
+        self._prefetched_bytes: int = 0
+        self._prefetcher: typing.Union[None, asyncio.Future] = None
+        self._prefetch_available: typing.Union[None, asyncio.Event] = None
+        self._prefetch_space: typing.Union[None, asyncio.Event] = None
+
+        self.ack_batch_size = ack_batch_size
+        self.ack_flush_interval = ack_flush_interval
+        self._pending_acks: typing.List[typing.Tuple[broker.Item, task.TaskState]] = []
+        self._ack_flusher: typing.Union[None, asyncio.Future] = None
+        # set to False by `shutdown` once the last batch has been flushed; tasks that finish after that are acked one by one.
+        self._batching_acks: bool = ack_batch_size > 1
+
+        self.max_delayed_tasks = max_delayed_tasks
+        self.delayed_tasks_horizon = delayed_tasks_horizon
+        # heap of (eta_timestamp, sequence_number, delayed_task) for tasks whose eta is in the future.
+        # the sequence number keeps tasks with the same eta in FIFO order.
+        self._delayed: typing.List[typing.Tuple[float, int, typing.Dict[str, typing.Any]]] = []
+        self._delayed_sequence = itertools.count()
+        self._delayed_scheduler: typing.Union[None, "asyncio.Future[None]"] = None
+        self._delayed_wakeup: typing.Union[None, asyncio.Event] = None
+
+        if the_backoff is not None:
+            self.the_backoff: backoff.BaseBackoff = the_backoff
+        else:
+            self.the_backoff = backoff.SimpleBackoff()
 
         self.watchdog = None
         if self.use_watchdog:
@@ -73,6 +158,14 @@ class Worker:
         worker_id: typing.Union[None, str],
         use_watchdog: bool,
         watchdog_duration: float,
+        concurrency: int,
+        prefetch_count: int,
+        prefetch_bytes: typing.Union[None, int],
+        ack_batch_size: int,
+        ack_flush_interval: float,
+        max_delayed_tasks: int,
+        delayed_tasks_horizon: float,
+        the_backoff: typing.Union[None, backoff.BaseBackoff],
     ) -> None:
         if not isinstance(the_task, task.Task):
             raise ValueError(
@@ -98,6 +191,84 @@ class Worker:
                     the_task._debug_task_name, type(watchdog_duration)
                 )
             )
+        if not isinstance(concurrency, int):
+            raise ValueError(
+                "Task: {0}. `concurrency` should be of type:: `int` You entered: {1}".format(
+                    the_task._debug_task_name, type(concurrency)
+                )
+            )
+        if concurrency < 1:
+            raise ValueError(
+                "Task: {0}. `concurrency` should not be less than 1 You entered: {1}".format(
+                    the_task._debug_task_name, concurrency
+                )
+            )
+        if not isinstance(prefetch_count, int):
+            raise ValueError(
+                "Task: {0}. `prefetch_count` should be of type:: `int` You entered: {1}".format(
+                    the_task._debug_task_name, type(prefetch_count)
+                )
+            )
+        if prefetch_count < 0:
+            raise ValueError(
+                "Task: {0}. `prefetch_count` should not be less than 0 You entered: {1}".format(
+                    the_task._debug_task_name, prefetch_count
+                )
+            )
+        if not isinstance(prefetch_bytes, (type(None), int)):
+            raise ValueError(
+                "Task: {0}. `prefetch_bytes` should be of type:: `None` or `int` You entered: {1}".format(
+                    the_task._debug_task_name, type(prefetch_bytes)
+                )
+            )
+        if not isinstance(ack_batch_size, int):
+            raise ValueError(
+                "Task: {0}. `ack_batch_size` should be of type:: `int` You entered: {1}".format(
+                    the_task._debug_task_name, type(ack_batch_size)
+                )
+            )
+        if ack_batch_size < 1:
+            raise ValueError(
+                "Task: {0}. `ack_batch_size` should not be less than 1 You entered: {1}".format(
+                    the_task._debug_task_name, ack_batch_size
+                )
+            )
+        if not isinstance(ack_flush_interval, float):
+            raise ValueError(
+                "Task: {0}. `ack_flush_interval` should be of type:: `float` You entered: {1}".format(
+                    the_task._debug_task_name, type(ack_flush_interval)
+                )
+            )
+        if ack_flush_interval <= 0:
+            raise ValueError(
+                "Task: {0}. `ack_flush_interval` should be greater than 0 You entered: {1}".format(
+                    the_task._debug_task_name, ack_flush_interval
+                )
+            )
+        if not isinstance(max_delayed_tasks, int):
+            raise ValueError(
+                "Task: {0}. `max_delayed_tasks` should be of type:: `int` You entered: {1}".format(
+                    the_task._debug_task_name, type(max_delayed_tasks)
+                )
+            )
+        if max_delayed_tasks < 0:
+            raise ValueError(
+                "Task: {0}. `max_delayed_tasks` should not be less than 0 You entered: {1}".format(
+                    the_task._debug_task_name, max_delayed_tasks
+                )
+            )
+        if not isinstance(delayed_tasks_horizon, float):
+            raise ValueError(
+                "Task: {0}. `delayed_tasks_horizon` should be of type:: `float` You entered: {1}".format(
+                    the_task._debug_task_name, type(delayed_tasks_horizon)
+                )
+            )
+        if not isinstance(the_backoff, (type(None), backoff.BaseBackoff)):
+            raise ValueError(
+                "Task: {0}. `the_backoff` should be of type:: `None` or `wiji.backoff.BaseBackoff` You entered: {1}".format(
+                    the_task._debug_task_name, type(the_backoff)
+                )
+            )
 
     def _log(self, level: typing.Union[str, int], log_data: dict) -> None:
         try:
@@ -105,29 +276,18 @@ class Worker:
         except Exception:
             pass
 
-    @staticmethod
-    def _retry_after(current_retries: int) -> int:
-        """
-        returns the number of seconds to retry after.
-        retries will happen in this sequence;
-        0.5min, 1min, 2min, 4min, 8min, 16min, 32min, 16min, 16min, 16min ...
-        """
-        # TODO:
-        # 1. give users ability to bring their own retry algorithms.
-        if current_retries < 0:
-            current_retries = 0
-
-        jitter = random.randint(60, 180)  # 1min-3min
-        if current_retries in [0, 1]:
-            return int(0.5 * 60)  # 0.5min
-        elif current_retries == 2:
-            return 1 * 60
-        elif current_retries >= 6:
-            return (16 * 60) + jitter  # 16 minutes + jitter
-        else:
-            return (60 * (2 ** current_retries)) + jitter
+    async def _notify_broker(
+        self, item: broker.Item, queue_name: str, state: task.TaskState
+    ) -> None:
+        if self._batching_acks:
+            self._pending_acks.append((item, state))
+            if len(self._pending_acks) >= self.ack_batch_size:
+                await self._flush_acks()
+            return
 
-    async def _notify_broker(self, item: str, queue_name: str, state: task.TaskState) -> None:
+        await self._ack(item=item, queue_name=queue_name, state=state)
+
+    async def _ack(self, item: broker.Item, queue_name: str, state: task.TaskState) -> None:
         try:
             await self.the_task.the_broker.done(queue_name=queue_name, item=item, state=state)
         except Exception as e:
@@ -141,28 +301,83 @@ class Worker:
                 },
             )
 
+    async def _flush_acks(self) -> None:
+        """
+        acknowledge all pending items to the broker in one batch.
+        If the batch fails, each item is acknowledged individually so that a single bad item
+        does not prevent the others from been acknowledged. Items that still fail are left
+        unacknowledged on the broker, exactly as happens with unbatched acknowledgements.
+        """
+        if not self._pending_acks:
+            return
+        # swap out the batch before awaiting so that acks added while we flush go into the next batch.
+        batch, self._pending_acks = self._pending_acks, []
+        try:
+            await self.the_task.the_broker.done_many(
+                queue_name=self.the_task.queue_name, items_with_states=batch
+            )
+        except Exception as e:
+            self._log(
+                logging.ERROR,
+                {
+                    "event": "wiji.Worker._flush_acks",
+                    "stage": "end",
+                    "state": "broker done_many error. falling back to done",
+                    "batch_size": len(batch),
+                    "error": str(e),
+                },
+            )
+            for item, state in batch:
+                await self._ack(item=item, queue_name=self.the_task.queue_name, state=state)
+
+    async def _flush_acks_periodically(self) -> None:
+        """
+        In loop; flushes pending acknowledgements so that none waits longer than `ack_flush_interval`
+        """
+        while not self.SHOULD_SHUT_DOWN:
+            await asyncio.sleep(self.ack_flush_interval)
+            await self._flush_acks()
+
     async def run_task(self, *task_args: typing.Any, **task_kwargs: typing.Any) -> None:
-        task_options = task_kwargs.pop("task_options", {})
+        task_options: typing.Union[None, protocol.Envelope] = task_kwargs.pop("task_options", None)
+        task_id: typing.Any = None
+        hook_metadata: typing.Any = None
+        context = task.TaskContext()
+        if task_options is not None:
+            task_id = task_options.task_id
+            hook_metadata = task_options.hook_metadata
+            context = task.TaskContext(
+                task_id=task_options.task_id,
+                eta=task_options.eta,
+                current_retries=task_options.current_retries,
+                max_retries=task_options.max_retries,
+                hook_metadata=task_options.hook_metadata,
+            )
+        # every execution runs in its own asyncio.Task, and thus has its own copy of the context variable.
+        # it is reset anyway, for callers that call `run_task` directly.
+        context_token = task._TASK_CONTEXT.set(context)
         await self.the_task._notify_hook(
-            task_id=task_options.get("task_id"),
-            state=task.TaskState.EXECUTING,
-            hook_metadata=task_options.get("hook_metadata"),
+            task_id=task_id, state=task.TaskState.EXECUTING, hook_metadata=hook_metadata
         )
         if self.watchdog is not None:
             self.watchdog.notify_alive_before()
 
         return_value = None
         execution_exception = None
-        thread_time_start = time.thread_time()
-        perf_counter_start = time.perf_counter()
-        monotonic_start = time.monotonic()
-        process_time_start = time.process_time()
+        # timings of the execution mode, eg how long `run` waited for a thread in the thread pool.
+        execution_mode_timings: typing.Dict[str, float] = {}
+        clocks_start = task._clocks()
         try:
-            return_value = await self.the_task.run(*task_args, **task_kwargs)
-            if self.the_task.the_chain and not self.the_task._RETRYING:
+            return_value = await self.the_task._call_run(
+                task_args, task_kwargs, execution_mode_timings
+            )
+            if task_options is not None:
+                # only now that `run` has succeeded is the task remembered as executed.
+                await self._record(task_options)
+            if self.the_task.the_chain and not context.retrying:
                 # enqueue the chained task using the return_value
                 await self.the_task.the_chain.delay(return_value)
-            if self.the_task._RETRYING:
+            if context.retrying:
                 # task is been retried
                 self._log(
                     logging.INFO,
@@ -171,8 +386,8 @@ class Worker:
                         "state": "Task is been retried.",
                         "stage": "end",
                         "task_name": self.the_task.task_name,
-                        "current_retries": task_options.get("current_retries"),
-                        "max_retries": task_options.get("max_retries"),
+                        "current_retries": context.current_retries,
+                        "max_retries": context.max_retries,
                     },
                 )
         except Exception as e:
@@ -186,34 +401,210 @@ class Worker:
                     "error": str(e),
                 },
             )
+            if task_options is not None:
+                # the task can be executed again.
+                await self._release(task_options)
         finally:
-            thread_time_end = time.thread_time()
-            perf_counter_end = time.perf_counter()
-            monotonic_end = time.monotonic()
-            process_time_end = time.process_time()
-            execution_duration = {
-                "thread_time": float("{0:.4f}".format(thread_time_end - thread_time_start)),
-                "perf_counter": float("{0:.4f}".format(perf_counter_end - perf_counter_start)),
-                "monotonic": float("{0:.4f}".format(monotonic_end - monotonic_start)),
-                "process_time": float("{0:.4f}".format(process_time_end - process_time_start)),
-            }
+            execution_duration = task._durations(clocks_start)
+            execution_duration.update(execution_mode_timings)
+            if self.the_task.the_result_backend is not None and task_id is not None:
+                await self._store_result(
+                    task_id=task_id,
+                    return_value=return_value,
+                    execution_exception=execution_exception,
+                    retried_as=context.retried_as,
+                )
             await self.the_task._notify_ratelimiter(
-                task_id=task_options.get("task_id"),
+                task_id=task_id,
                 state=task.TaskState.EXECUTED,
                 execution_duration=execution_duration,
                 execution_exception=execution_exception,
                 return_value=return_value,
             )
             await self.the_task._notify_hook(
-                task_id=task_options.get("task_id"),
+                task_id=task_id,
                 state=task.TaskState.EXECUTED,
-                hook_metadata=task_options.get("hook_metadata"),
+                hook_metadata=hook_metadata,
                 execution_duration=execution_duration,
                 execution_exception=execution_exception,
                 return_value=return_value,
             )
             if self.watchdog is not None:
                 self.watchdog.notify_alive_after()
+            task._TASK_CONTEXT.reset(context_token)
+
+    def _dedup_key(self, envelope: protocol.Envelope) -> typing.Union[None, str]:
+        """
+        returns the key under which the execution of the task is checked for duplicates; None if it is not checked.
+        Retries are executed regardless.
+        """
+        if (
+            self.the_task.the_dedup is None
+            or envelope.idempotency_key is None
+            or envelope.current_retries > 0
+        ):
+            return None
+        return "{0}:{1}".format(self.the_task.task_name, envelope.idempotency_key)
+
+    async def _claim(self, envelope: protocol.Envelope) -> typing.Union[None, str]:
+        """
+        returns the id of the task whose execution `envelope` duplicates; None if it is not a duplicate.
+        The key is only claimed for a lease, which is renewed until the task is recorded as executed or is released.
+        If the dedup store can not be reached, the task is executed; errors are logged rather than raised.
+        """
+        key = self._dedup_key(envelope)
+        if key is None:
+            return None
+        if typing.TYPE_CHECKING:
+            assert isinstance(self.the_task.the_dedup, dedup.Dedup)
+        try:
+            duplicate_of = await self.the_task.the_dedup.claim(
+                dedup.EXECUTED, key, envelope.task_id, ttl=self.the_task.the_dedup.lease
+            )
+            if duplicate_of is None:
+                stop = asyncio.Event()
+                self._leases[key] = (
+                    stop,
+                    asyncio.ensure_future(self._renew_lease(key, envelope.task_id, stop)),
+                )
+            return duplicate_of
+        except Exception as e:
+            self._log(
+                logging.ERROR,
+                {
+                    "event": "wiji.Worker._claim",
+                    "stage": "end",
+                    "state": "checking for duplicate task failed",
+                    "task_id": envelope.task_id,
+                    "error": str(e),
+                },
+            )
+            return None
+
+    async def _renew_lease(self, key: str, task_id: str, stop: asyncio.Event) -> None:
+        """
+        renew the lease on `key` until `stop` is set.
+        """
+        if typing.TYPE_CHECKING:
+            assert isinstance(self.the_task.the_dedup, dedup.Dedup)
+        lease = self.the_task.the_dedup.lease
+        while True:
+            try:
+                await asyncio.wait_for(stop.wait(), timeout=lease / 3)
+                return
+            except asyncio.TimeoutError:
+                pass
+            try:
+                await self.the_task.the_dedup.record(dedup.EXECUTED, key, task_id, ttl=lease)
+            except Exception as e:
+                self._log(
+                    logging.ERROR,
+                    {
+                        "event": "wiji.Worker._renew_lease",
+                        "stage": "end",
+                        "state": "renewing duplicate task check failed",
+                        "task_id": task_id,
+                        "error": str(e),
+                    },
+                )
+
+    async def _end_lease(self, key: str) -> None:
+        """
+        stop renewing the lease on `key`. A renewal that is under way is waited for,
+        so that it can not overwrite what is done with the key afterwards.
+        """
+        held = self._leases.pop(key, None)
+        if held is not None:
+            stop, renewer = held
+            stop.set()
+            await renewer
+
+    async def _record(self, envelope: protocol.Envelope) -> None:
+        """
+        remember the task as executed, for the whole `ttl` of the dedup; rather than only for a lease.
+        """
+        key = self._dedup_key(envelope)
+        if key is None:
+            return
+        if typing.TYPE_CHECKING:
+            assert isinstance(self.the_task.the_dedup, dedup.Dedup)
+        await self._end_lease(key)
+        try:
+            await self.the_task.the_dedup.record(dedup.EXECUTED, key, envelope.task_id)
+        except Exception as e:
+            self._log(
+                logging.ERROR,
+                {
+                    "event": "wiji.Worker._record",
+                    "stage": "end",
+                    "state": "recording executed task failed",
+                    "task_id": envelope.task_id,
+                    "error": str(e),
+                },
+            )
+
+    async def _release(self, envelope: protocol.Envelope) -> None:
+        key = self._dedup_key(envelope)
+        if key is None:
+            return
+        if typing.TYPE_CHECKING:
+            assert isinstance(self.the_task.the_dedup, dedup.Dedup)
+        await self._end_lease(key)
+        try:
+            await self.the_task.the_dedup.release(dedup.EXECUTED, key)
+        except Exception as e:
+            self._log(
+                logging.ERROR,
+                {
+                    "event": "wiji.Worker._release",
+                    "stage": "end",
+                    "state": "releasing duplicate task check failed",
+                    "task_id": envelope.task_id,
+                    "error": str(e),
+                },
+            )
+
+    async def _store_result(
+        self,
+        task_id: str,
+        return_value: typing.Any,
+        execution_exception: typing.Union[None, Exception],
+        retried_as: typing.Union[None, str],
+    ) -> None:
+        """
+        stores the outcome of a task in the task's result backend; errors are logged rather than raised.
+        """
+        if typing.TYPE_CHECKING:
+            assert isinstance(self.the_task.the_result_backend, result.BaseResultBackend)
+            assert isinstance(self.the_task.the_serializer, serializer.BaseSerializer)
+        try:
+            try:
+                value = result._encode_result(
+                    self.the_task.the_serializer, return_value, execution_exception, retried_as
+                )
+            except Exception as e:
+                value = result._encode_result(
+                    self.the_task.the_serializer,
+                    None,
+                    TypeError(
+                        "the return value should be {0} serializable. error: {1}".format(
+                            self.the_task._serializer_label(), e
+                        )
+                    ),
+                    None,
+                )
+            await self.the_task.the_result_backend.set(task_id, value)
+        except Exception as e:
+            self._log(
+                logging.ERROR,
+                {
+                    "event": "wiji.Worker._store_result",
+                    "stage": "end",
+                    "state": "storing task result failed",
+                    "task_id": task_id,
+                    "error": str(e),
+                },
+            )
 
     async def consume_tasks(
         self, TESTING: bool = False
@@ -226,11 +617,21 @@ class Worker:
         """
         # this can exit with error
         await self.the_task._broker_check(from_worker=True)
+        if self.the_task.execution_mode == "process":
+            # start the child processes before there is work for them.
+            self.the_task._process_pool()
 
         if self.watchdog is not None:
             self.watchdog.start()
 
-        dequeue_retry_count = 0
+        self._concurrency_slots = asyncio.Semaphore(self.concurrency)
+        if self.prefetch_count > 0 and (self._prefetcher is None or self._prefetcher.done()):
+            self._prefetch_available = asyncio.Event()
+            self._prefetch_space = asyncio.Event()
+            self._prefetcher = asyncio.ensure_future(self._prefetch_tasks())
+        if self.ack_batch_size > 1 and (self._ack_flusher is None or self._ack_flusher.done()):
+            self._ack_flusher = asyncio.ensure_future(self._flush_acks_periodically())
+
         while True:
             self._log(logging.INFO, {"event": "wiji.Worker.consume_tasks", "stage": "start"})
             if self.SHOULD_SHUT_DOWN:
@@ -244,15 +645,25 @@ class Worker:
                 )
                 return None
 
+            # wait for a free slot before dequeuing so that we never take more tasks
+            # off the broker than we can execute.
+            await self._concurrency_slots.acquire()
+            if self.SHOULD_SHUT_DOWN:
+                self._concurrency_slots.release()
+                continue
+
             try:
                 if typing.TYPE_CHECKING:
                     # make mypy happy
                     # https://github.com/python/mypy/issues/4805
                     assert isinstance(self.the_task.the_ratelimiter, ratelimiter.BaseRateLimiter)
 
-                # rate limit ourselves
+                # rate limit ourselves.
+                # this happens before the dequeue so that the worker never holds on to a dequeued item
+                # while it waits on the ratelimiter.
                 await self.the_task.the_ratelimiter.limit()
             except Exception as e:
+                self._concurrency_slots.release()
                 self._log(
                     logging.ERROR,
                     {
@@ -265,22 +676,24 @@ class Worker:
                 continue
 
             try:
-                _dequeued_item: str = await self.the_task.the_broker.dequeue(
-                    queue_name=self.the_task.queue_name
-                )
-                dequeued_item: dict = json.loads(_dequeued_item)
+                _item = await self._dequeue()
+                if _item is None:
+                    # no item yet; go back round the loop so that a shutdown is noticed.
+                    self._concurrency_slots.release()
+                    continue
+                _dequeued_item: broker.Item = _item
             except Exception as e:
-                poll_queue_interval = self._retry_after(dequeue_retry_count)
-                dequeue_retry_count += 1
+                self._concurrency_slots.release()
+                poll_queue_interval = self.the_backoff.error(e)
                 self._log(
                     logging.ERROR,
                     {
                         "event": "wiji.Worker.consume_tasks",
                         "stage": "end",
-                        "state": "dequeue tasks failed. sleeping for {0}minutes".format(
-                            poll_queue_interval / 60
+                        "state": "dequeue tasks failed. sleeping for {0}seconds".format(
+                            poll_queue_interval
                         ),
-                        "dequeue_retry_count": dequeue_retry_count,
+                        "backoff": self.the_backoff.metrics(),
                         "error": str(e),
                     },
                 )
@@ -288,31 +701,23 @@ class Worker:
                 continue
 
             # dequeue succeded
-            dequeue_retry_count = 0
             try:
-                _ = dequeued_item["version"]
-                _task_options = dequeued_item["task_options"]
-                task_id = _task_options["task_id"]
-                task_eta = _task_options["eta"]
-                task_current_retries = _task_options["current_retries"]
-                task_max_retries = _task_options["max_retries"]
-                task_hook_metadata = _task_options["hook_metadata"]
-                task_args = _task_options["args"]
-                task_kwargs = _task_options["kwargs"]
-
-                task_kwargs.update(
-                    {
-                        "task_options": {
-                            "task_id": task_id,
-                            "eta": task_eta,
-                            "current_retries": task_current_retries,
-                            "max_retries": task_max_retries,
-                            "hook_metadata": task_hook_metadata,
-                        }
-                    }
-                )
-            except KeyError as e:
-                e = KeyError("enqueued message/object is missing required field: {}".format(str(e)))
+                # items of every protocol version are decoded into the same shape.
+                # Where the protocol allows it, only the header is decoded; the args and kwargs are decoded
+                # just before the task is executed.
+                # decoding a version 2 header is cheap, whereas version 1 items are decoded whole.
+                size = 0 if protocol.Protocol.is_binary(_dequeued_item) else len(_dequeued_item)
+                if typing.TYPE_CHECKING:
+                    assert isinstance(self.the_task.the_offload, offload.Offload)
+                envelope = await self.the_task.the_offload.decode(
+                    size, protocol.Protocol.decode, _dequeued_item
+                )
+            except Exception as e:
+                self._concurrency_slots.release()
+                if isinstance(e, KeyError):
+                    e = KeyError(
+                        "enqueued message/object is missing required field: {}".format(str(e))
+                    )
                 self._log(
                     logging.ERROR,
                     {
@@ -324,30 +729,419 @@ class Worker:
                 )
                 continue
 
-            await self.the_task._notify_hook(
-                task_id=task_id, state=task.TaskState.DEQUEUED, hook_metadata=task_hook_metadata
+            # the task is executed in its own asyncio.Task so that upto `self.concurrency`
+            # tasks can be in flight at any one time. Each in-flight task still goes through the
+            # DEQUEUED -> EXECUTING -> EXECUTED hooks, ratelimiter and broker `done` in that order.
+            in_flight = self._spawn(
+                self._process_task(_dequeued_item=_dequeued_item, envelope=envelope)
+            )
+
+            if TESTING:
+                # offer escape hatch for tests to come out of endless loop
+                await in_flight
+                if isinstance(_dequeued_item, str):
+                    dequeued_item: typing.Dict[str, typing.Any] = json.loads(_dequeued_item)
+                    return dequeued_item
+                return envelope.dictsy()
+
+    async def _dequeue(self) -> typing.Union[None, broker.Item]:
+        """
+        returns the next item to be processed.
+        If prefetching is enabled, the item is taken from the prefetch buffer, otherwise it is polled from the broker.
+        returns None if no item became available within `self._dequeue_timeout` or if the worker started shutting down
+        while waiting for an item.
+        """
+        if self.prefetch_count <= 0:
+            # long-poll so that an idle worker still notices `SHOULD_SHUT_DOWN` promptly.
+            poll_start = time.monotonic()
+            item = await self.the_task.the_broker.poll(
+                queue_name=self.the_task.queue_name, timeout=self._dequeue_timeout
+            )
+            if item is None:
+                await self._backoff_when_idle(waited=time.monotonic() - poll_start)
+            return item
+
+        if typing.TYPE_CHECKING:
+            assert isinstance(self._prefetch_available, asyncio.Event)
+            assert isinstance(self._prefetch_space, asyncio.Event)
+        while not self._prefetched:
+            if self.SHOULD_SHUT_DOWN:
+                return None
+            self._prefetch_available.clear()
+            await self._prefetch_available.wait()
+
+        item = self._prefetched.popleft()
+        self._prefetched_bytes -= len(item)
+        self._prefetch_space.set()
+        return item
+
+    async def _backoff_when_idle(self, waited: float) -> None:
+        """
+        sleep for as long as `self.the_backoff` asks after a poll of the broker returned no items.
+        """
+        delay = self.the_backoff.idle(waited=waited)
+        if delay > 0 and not self.SHOULD_SHUT_DOWN:
+            self._log(
+                logging.DEBUG,
+                {
+                    "event": "wiji.Worker._backoff_when_idle",
+                    "stage": "end",
+                    "state": "no tasks available. sleeping for {0}seconds".format(delay),
+                    "backoff": self.the_backoff.metrics(),
+                },
             )
+            await asyncio.sleep(delay)
 
-            now = datetime.datetime.now(tz=datetime.timezone.utc)
-            if protocol.Protocol._from_isoformat(task_eta) <= now:
-                await self.run_task(*task_args, **task_kwargs)
-                await self._notify_broker(
-                    item=_dequeued_item,
+    def _prefetch_is_full(self) -> bool:
+        if len(self._prefetched) >= self.prefetch_count:
+            return True
+        if self.prefetch_bytes is not None and self._prefetched_bytes >= self.prefetch_bytes:
+            return True
+        return False
+
+    async def _prefetch_tasks(self) -> None:
+        """
+        In loop; keeps the prefetch buffer topped up with items from the broker.
+        When the worker shuts down, any items that are still in the buffer are handed back to the broker.
+        """
+        if typing.TYPE_CHECKING:
+            assert isinstance(self._prefetch_available, asyncio.Event)
+            assert isinstance(self._prefetch_space, asyncio.Event)
+
+        while not self.SHOULD_SHUT_DOWN:
+            if self._prefetch_is_full():
+                self._prefetch_space.clear()
+                await self._prefetch_space.wait()
+                continue
+
+            try:
+                poll_start = time.monotonic()
+                items = await self.the_task.the_broker.dequeue_many(
                     queue_name=self.the_task.queue_name,
-                    state=task.TaskState.EXECUTED,
+                    max_items=self.prefetch_count - len(self._prefetched),
+                    timeout=self._dequeue_timeout,
+                )
+            except Exception as e:
+                poll_queue_interval = self.the_backoff.error(e)
+                self._log(
+                    logging.ERROR,
+                    {
+                        "event": "wiji.Worker._prefetch_tasks",
+                        "stage": "end",
+                        "state": "dequeue tasks failed. sleeping for {0}seconds".format(
+                            poll_queue_interval
+                        ),
+                        "backoff": self.the_backoff.metrics(),
+                        "error": str(e),
+                    },
+                )
+                await asyncio.sleep(poll_queue_interval)
+                continue
+
+            if not items:
+                await self._backoff_when_idle(waited=time.monotonic() - poll_start)
+                continue
+
+            for item in items:
+                self._prefetched.append(item)
+                self._prefetched_bytes += len(item)
+            self._prefetch_available.set()
+
+        await self._return_prefetched()
+
+    async def _return_prefetched(self) -> None:
+        """
+        hand back to the broker the items that were prefetched but never executed.
+        """
+        while self._prefetched:
+            item = self._prefetched.popleft()
+            self._prefetched_bytes -= len(item)
+            try:
+                await self.the_task.the_broker.enqueue(
+                    queue_name=self.the_task.queue_name, item=item
+                )
+            except Exception as e:
+                self._log(
+                    logging.ERROR,
+                    {
+                        "event": "wiji.Worker._return_prefetched",
+                        "stage": "end",
+                        "state": "returning prefetched item to broker failed",
+                        "error": str(e),
+                    },
                 )
-            else:
-                # respect eta
-                task_kwargs.pop("task_options", None)
-                await self.the_task.delay(*task_args, **task_kwargs)
+
+    async def _return_polled(self) -> None:
+        """
+        hand back to the broker an item that a timed out poll dequeued after the worker stopped polling.
+        """
+        try:
+            item = self.the_task.the_broker.cancel_poll(queue_name=self.the_task.queue_name)
+        except Exception as e:
+            self._log(
+                logging.ERROR,
+                {
+                    "event": "wiji.Worker._return_polled",
+                    "stage": "end",
+                    "state": "cancelling broker poll failed",
+                    "error": str(e),
+                },
+            )
+            return
+        if item is not None:
+            await self._requeue(item=item)
+
+    def _spawn(self, coro: typing.Awaitable[None]) -> "asyncio.Future[None]":
+        """
+        run `coro` as an in-flight task.
+        The caller should have acquired a concurrency slot; it is released once `coro` completes.
+        """
+        in_flight = asyncio.ensure_future(coro)
+        self._in_flight.add(in_flight)
+        in_flight.add_done_callback(self._task_done)
+        return in_flight
+
+    def _task_done(self, in_flight: "asyncio.Future[None]") -> None:
+        """
+        called once an in-flight task has completed so as to free up its concurrency slot.
+        """
+        self._in_flight.discard(in_flight)
+        if self._concurrency_slots is not None:
+            self._concurrency_slots.release()
+
+    async def _process_task(self, _dequeued_item: broker.Item, envelope: protocol.Envelope) -> None:
+        await self._guarded(
+            self._dispatch_task(_dequeued_item=_dequeued_item, envelope=envelope), envelope
+        )
+
+    async def _guarded(self, work: typing.Awaitable[None], envelope: protocol.Envelope) -> None:
+        """
+        await `work`, which processes the task in `envelope`; its errors are logged rather than raised.
+        """
+        try:
+            await work
+        except Exception as e:
+            # an in-flight task should never bring down the worker
+            self._log(
+                logging.ERROR,
+                {
+                    "event": "wiji.Worker.consume_tasks",
+                    "stage": "end",
+                    "state": "consume_tasks error",
+                    "task_id": envelope.task_id,
+                    "error": str(e),
+                },
+            )
+
+    async def _dispatch_task(
+        self, _dequeued_item: broker.Item, envelope: protocol.Envelope
+    ) -> None:
+        """
+        execute the task if it is due, otherwise hold it locally or hand it back to the broker.
+        """
+        await self.the_task._notify_hook(
+            task_id=envelope.task_id,
+            state=task.TaskState.DEQUEUED,
+            hook_metadata=envelope.hook_metadata,
+        )
+
+        now = time.time()
+        eta = now
+        if not self.the_task.the_broker.delayed_delivery:
+            # brokers with delayed delivery only hand out tasks that are due.
+            eta = envelope.eta
+
+        if eta <= now or envelope.has_expired(now):
+            self.the_backoff.success()
+            await self._execute_task(_dequeued_item=_dequeued_item, envelope=envelope)
+        elif (
+            len(self._delayed) < self.max_delayed_tasks and eta - now <= self.delayed_tasks_horizon
+        ):
+            # respect eta; hold the task locally and execute it once it is due.
+            self.the_backoff.success()
+            if self._delayed_scheduler is None or self._delayed_scheduler.done():
+                # started lazily, most workers never see a task with an eta.
+                self._delayed_wakeup = asyncio.Event()
+                self._delayed_scheduler = asyncio.ensure_future(self._schedule_delayed_tasks())
+            if typing.TYPE_CHECKING:
+                assert isinstance(self._delayed_wakeup, asyncio.Event)
+            heapq.heappush(
+                self._delayed,
+                (
+                    eta,
+                    next(self._delayed_sequence),
+                    {"_dequeued_item": _dequeued_item, "envelope": envelope},
+                ),
+            )
+            self._delayed_wakeup.set()
+        else:
+            # respect eta; the task is due too far in the future to hold it, hand it back to the broker as is.
+            await self._requeue(item=_dequeued_item)
+            # a broker without delayed delivery hands the same task straight back; so, as for an empty poll,
+            # back off before taking more work. The concurrency slot is held meanwhile.
+            await self._backoff_when_idle(waited=0.0)
+        self._log(
+            logging.INFO,
+            {"event": "wiji.Worker.consume_tasks", "stage": "end", "task_id": envelope.task_id},
+        )
+
+    async def _execute_task(self, _dequeued_item: broker.Item, envelope: protocol.Envelope) -> None:
+        if envelope.has_expired(time.time()):
+            # the task is past its deadline; its body is never decoded.
+            await self.the_task._notify_hook(
+                task_id=envelope.task_id,
+                state=task.TaskState.EXPIRED,
+                hook_metadata=envelope.hook_metadata,
+            )
             self._log(
                 logging.INFO,
-                {"event": "wiji.Worker.consume_tasks", "stage": "end", "task_id": task_id},
+                {
+                    "event": "wiji.Worker._execute_task",
+                    "stage": "end",
+                    "state": "task expired",
+                    "task_id": envelope.task_id,
+                },
             )
-            if TESTING:
-                # offer escape hatch for tests to come out of endless loop
-                task_kwargs.pop("task_options", None)
-                return dequeued_item
+            await self._notify_broker(
+                item=_dequeued_item,
+                queue_name=self.the_task.queue_name,
+                state=task.TaskState.EXPIRED,
+            )
+            return
+
+        duplicate_of = None
+        if self.the_task.the_dedup is not None:
+            duplicate_of = await self._claim(envelope)
+        if duplicate_of is not None:
+            # the same logical job has already been executed; its body is never decoded.
+            if self.the_task.the_result_backend is not None and duplicate_of != envelope.task_id:
+                # the handle of this task gets the result of the task that it duplicates.
+                await self._store_result(
+                    task_id=envelope.task_id,
+                    return_value=None,
+                    execution_exception=None,
+                    retried_as=duplicate_of,
+                )
+            await self.the_task._notify_hook(
+                task_id=envelope.task_id,
+                state=task.TaskState.DUPLICATE,
+                hook_metadata=envelope.hook_metadata,
+            )
+            self._log(
+                logging.INFO,
+                {
+                    "event": "wiji.Worker._execute_task",
+                    "stage": "end",
+                    "state": "duplicate task not executed",
+                    "task_id": envelope.task_id,
+                    "duplicate_of": duplicate_of,
+                },
+            )
+            await self._notify_broker(
+                item=_dequeued_item,
+                queue_name=self.the_task.queue_name,
+                state=task.TaskState.DUPLICATE,
+            )
+            return
+
+        try:
+            if envelope.claim_check is not None and self.the_task.the_blob_store is not None:
+                # the body was kept out of the broker; fetch it only now that the task is about to run.
+                envelope.resolve_claim_check(
+                    await self.the_task.the_blob_store.get(envelope.claim_check)
+                )
+            body = envelope.undecoded_body
+            if body is not None:
+                if typing.TYPE_CHECKING:
+                    assert isinstance(self.the_task.the_offload, offload.Offload)
+                # decompressing is recorded in the metrics of the task's compression, if it has one.
+                # only the task's own serializer, and those that were explicitly registered, may decode the body.
+                envelope.set_decoded_body(
+                    *await self.the_task.the_offload.decode(
+                        len(body),
+                        protocol.decode_task_body,
+                        envelope.codec,
+                        envelope.compression_codec,
+                        body,
+                        self.the_task._compression(),
+                        self.the_task.the_serializer,
+                    )
+                )
+                del body
+            task_args = envelope.args
+            task_kwargs = envelope.kwargs
+        except Exception as e:
+            self._log(
+                logging.ERROR,
+                {
+                    "event": "wiji.Worker._execute_task",
+                    "stage": "end",
+                    "state": "decoding task body failed",
+                    "task_id": envelope.task_id,
+                    "error": str(e),
+                },
+            )
+            await self._release(envelope)
+            return
+
+        # the envelope already carries the task options; it is handed over as is rather than copied into a dict.
+        await self.run_task(*task_args, task_options=envelope, **task_kwargs)
+        await self._notify_broker(
+            item=_dequeued_item, queue_name=self.the_task.queue_name, state=task.TaskState.EXECUTED
+        )
+
+    async def _requeue(self, item: broker.Item) -> None:
+        """
+        hand back an item to the broker, unchanged.
+        The item keeps its task_id, eta and retries and no QUEUEING/QUEUED hooks are fired since it is not a new task.
+        """
+        try:
+            await self.the_task.the_broker.enqueue(queue_name=self.the_task.queue_name, item=item)
+        except Exception as e:
+            self._log(
+                logging.ERROR,
+                {
+                    "event": "wiji.Worker._requeue",
+                    "stage": "end",
+                    "state": "handing back item to broker failed",
+                    "error": str(e),
+                },
+            )
+
+    async def _schedule_delayed_tasks(self) -> None:
+        """
+        In loop; executes the tasks held in `self._delayed` as soon as each becomes due.
+        When the worker shuts down, the tasks that are still held are handed back to the broker.
+        """
+        if typing.TYPE_CHECKING:
+            assert isinstance(self._delayed_wakeup, asyncio.Event)
+            assert isinstance(self._concurrency_slots, asyncio.Semaphore)
+
+        while not self.SHOULD_SHUT_DOWN:
+            self._delayed_wakeup.clear()
+            if not self._delayed:
+                await self._delayed_wakeup.wait()
+                continue
+
+            due_in = self._delayed[0][0] - time.time()
+            if due_in > 0:
+                # sleep until the earliest task is due, or until an even earlier one is added.
+                try:
+                    await asyncio.wait_for(self._delayed_wakeup.wait(), timeout=due_in)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            await self._concurrency_slots.acquire()
+            if self.SHOULD_SHUT_DOWN:
+                self._concurrency_slots.release()
+                break
+            _, _, delayed_task = heapq.heappop(self._delayed)
+            self._spawn(self._guarded(self._execute_task(**delayed_task), delayed_task["envelope"]))
+
+        while self._delayed:
+            _, _, delayed_task = heapq.heappop(self._delayed)
+            await self._requeue(item=delayed_task["_dequeued_item"])
 
     async def shutdown(self) -> None:
         """
@@ -365,17 +1159,65 @@ class Worker:
         self.SHOULD_SHUT_DOWN = True
         if self.watchdog is not None:
             self.watchdog.stop()
+        if self._prefetcher is not None:
+            # wake up the prefetcher and any consumer waiting on it, so that they can notice the shutdown.
+            if typing.TYPE_CHECKING:
+                assert isinstance(self._prefetch_available, asyncio.Event)
+                assert isinstance(self._prefetch_space, asyncio.Event)
+            self._prefetch_available.set()
+            self._prefetch_space.set()
+        if self._delayed_wakeup is not None:
+            self._delayed_wakeup.set()
 
-        # half spent waiting for the broker, the other half just sleeping
+        # half spent draining in-flight tasks, the other half waiting for the broker
         wait_duration = self.the_task.drain_duration / 2
+        # prefetched and delayed items need to be handed back before the broker is shut down.
+        handing_back = {
+            i for i in [self._prefetcher, self._delayed_scheduler] if i is not None and not i.done()
+        }
+        if handing_back:
+            await asyncio.wait(handing_back, timeout=wait_duration)
+        await self._return_polled()
+
+        # wait so that worker can finish executing any tasks it had already dequeued.
+        # we need to use asyncio primitives so that we do not block eventloop.
+        # this way, we do not prevent any other workers in the same loop from also shutting down cleanly.
+        if self._in_flight:
+            _, pending = await asyncio.wait(set(self._in_flight), timeout=wait_duration)
+            if pending:
+                self._log(
+                    logging.WARNING,
+                    {
+                        "event": "wiji.Worker.shutdown",
+                        "stage": "end",
+                        "state": "drain_duration elapsed with tasks still executing",
+                        "in_flight": len(pending),
+                    },
+                )
+        else:
+            await asyncio.sleep(wait_duration)
+
+        # acknowledge executed tasks before the broker goes away.
+        if self._ack_flusher is not None:
+            self._ack_flusher.cancel()
+            try:
+                await self._ack_flusher
+            except asyncio.CancelledError:
+                pass
+        # tasks that are still executing are acked one by one, rather than into a batch that is never flushed.
+        self._batching_acks = False
+        await self._flush_acks()
+
         try:
             # asyncio.wait takes a python set as a first argument
             # after expiration of timeout, asyncio.wait does not cancel the task;
             # thus the broker shutdown can still continue on its own if it can.
             await asyncio.wait(
                 {
-                    self.the_task.the_broker.shutdown(
-                        queue_name=self.the_task.queue_name, duration=wait_duration
+                    asyncio.ensure_future(
+                        self.the_task.the_broker.shutdown(
+                            queue_name=self.the_task.queue_name, duration=wait_duration
+                        )
                     )
                 },
                 timeout=wait_duration,
@@ -390,9 +1232,4 @@ class Worker:
                     "error": str(e),
                 },
             )
-
-        # sleep so that worker can finish executing any tasks it had already dequeued.
-        # we need to use asyncio.sleep so that we do not block eventloop.
-        # this way, we do not prevent any other workers in the same loop from also shutting down cleanly.
-        await asyncio.sleep(wait_duration)
         self.SUCCESFULLY_SHUT_DOWN = True